@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark for CSV export of batched Muse data.
+
+Builds EventBatches shaped like a Muse session (EEG at 220 Hz, accelerometer
+at 50 Hz, battery now and then) and writes them to a temporary directory
+with rows formatted one at a time (how CSVFileWriter used to format them),
+with CSVFileWriter, and with CSVWideFileWriter, then reports rows per
+second, next to the time to write and fsync the same number of bytes.
+
+    python scripts/bench_csv.py
+    python scripts/bench_csv.py -s 3600
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SRCDIR = os.path.realpath(os.path.join(CWD, os.pardir, 'src'))
+sys.path.insert(0, SRCDIR)
+
+import event_batch
+import output_handler
+
+# Rows per second of each path: (path, types, rate)
+STREAMS = [('/muse/eeg', 'ffff', 220), ('/muse/acc', 'fff', 50), ('/muse/batt', 'iiii', 1)]
+
+
+def session_batches(seconds):
+    "One EventBatch per second of a session."
+    batches = []
+    for second in range(seconds):
+        events = []
+        for path, types, rate in STREAMS:
+            # float32 samples widened to double, as read from .muse files
+            values = np.random.rand(rate, len(types)).astype(np.float32).astype(np.float64) * 1000
+            for row in range(rate):
+                args = [int(x) for x in values[row]] if types[0] == 'i' else values[row].tolist()
+                events.append([1.4e9 + second + float(row) / rate, path, types, args, 0])
+        events.sort(key=lambda event: event[0])
+        batches.append(event_batch.EventBatch.from_events(events))
+    return batches
+
+
+class RowCSVFileWriter(output_handler.CSVFileWriter):
+    "CSVFileWriter formatting every row on its own."
+    @staticmethod
+    def format_column(column):
+        if not column.is_numeric():
+            return [output_handler.CSVFileWriter.format_msg(msg) for msg in column.events()]
+        separator = ", " + column.path + ", "
+        return [("%.6f" % timestamp) + separator + ", ".join([str(x) for x in row]) + "\n"
+                for timestamp, row in zip(column.timestamps.tolist(), column.values.tolist())]
+
+
+def time_writer(writer_class, batches, directory):
+    writer = writer_class(os.path.join(directory, 'out.csv'))
+    writer.set_options(False, None)
+    start = time.time()
+    for batch in batches:
+        writer.receive_batch(batch)
+    writer.receive_msg('done')
+    elapsed = time.time() - start
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    return elapsed, size
+
+
+def time_disk(size, directory):
+    block = 'x' * (1024 * 1024)
+    start = time.time()
+    with open(os.path.join(directory, 'raw'), 'wb') as file_handle:
+        for _ in range(size // len(block) + 1):
+            file_handle.write(block)
+        file_handle.flush()
+        os.fsync(file_handle.fileno())
+    return time.time() - start
+
+
+def run(seconds):
+    batches = session_batches(seconds)
+    rows = sum(len(batch) for batch in batches)
+    print('session: %d s  rows: %d' % (seconds, rows))
+    for name, writer_class in [('row at a time', RowCSVFileWriter), ('block (-C)', output_handler.CSVFileWriter),
+                               ('wide (--csv-wide)', output_handler.CSVWideFileWriter)]:
+        directory = tempfile.mkdtemp()
+        try:
+            elapsed, size = time_writer(writer_class, batches, directory)
+            disk = time_disk(size, directory)
+        finally:
+            shutil.rmtree(directory)
+        print('  %-18s %.2fs  %.0f rows/s  %.1f MB/s  (write + fsync of %.1f MB: %.2fs)'
+              % (name, elapsed, rows / elapsed, size / elapsed / 1e6, size / 1e6, disk))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Rows per second of the CSV writers.')
+    parser.add_argument('-s', '--seconds', type=int, default=600,
+                        help='Length of the session in seconds.')
+    args = parser.parse_args()
+    run(args.seconds)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark for writing several output formats at once.
+
+Converts a .muse file to OSC-replay, CSV, Muse and Matlab files in one run,
+first with every writer in the output thread and then with each writer in
+its own process (muse-player --output-processes), and reports both times.
+
+    python scripts/bench_fanout.py
+    python scripts/bench_fanout.py -f recording.muse -r 3 -b
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SRCDIR = os.path.realpath(os.path.join(CWD, os.pardir, 'src'))
+sys.path.insert(0, SRCDIR)
+
+import Queue
+import utilities
+from input_handler import MuseProtoBufFileReader
+from output_handler import OutputHandler, OSCFileWriter, CSVFileWriter, ProtoBufFileWriter, MatlabWriter
+from process_fanout import ProcessFanout
+
+DEFAULT_INPUT = os.path.realpath(os.path.join(CWD, os.pardir, 'test_data', 'muselab_recording.muse'))
+
+OUTPUTS = [('oscreplay', OSCFileWriter, 'out.osc'),
+           ('csv', CSVFileWriter, 'out.csv'),
+           ('muse', ProtoBufFileWriter, 'out.muse'),
+           ('matlab', MatlabWriter, 'out.mat')]
+
+
+def convert(input_file, directory, processes, batch):
+    queue = Queue.Queue()
+    reader = MuseProtoBufFileReader(queue, batch=batch)
+    output_handler = OutputHandler(queue)
+    fanout = ProcessFanout()
+    for name, writer_class, file_name in OUTPUTS:
+        path = os.path.join(directory, file_name)
+        if processes:
+            fanout.add_writer(name, writer_class, (path,))
+        else:
+            output_handler.add_listener(writer_class(path))
+    if processes:
+        fanout.start_writers(False, None)
+        output_handler.add_listener(fanout)
+
+    start = time.time()
+    parse_thread = threading.Thread(target=reader.parse_files, args=[[input_file], False, True, False])
+    parse_thread.daemon = True
+    parse_thread.start()
+    output_handler.start(None)
+    parse_thread.join()
+    return time.time() - start
+
+
+def run(input_file, repeats, batch):
+    utilities.DisplayPlayback.output_timing = False
+    directory = tempfile.mkdtemp(prefix='bench_fanout')
+    try:
+        for processes in (False, True):
+            times = [convert(input_file, directory, processes, batch) for _ in range(repeats)]
+            print('%-22s best %.2fs  mean %.2fs' % ('writer processes:' if processes else 'output thread:',
+                                                    min(times), sum(times) / len(times)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Convert a .muse file to four formats, serially and in writer processes.')
+    parser.add_argument('-f', '--file', default=DEFAULT_INPUT,
+                        help='Input .muse file (default: test_data/muselab_recording.muse).')
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help='Conversions per mode.')
+    parser.add_argument('-b', '--batch', action='store_true', default=False,
+                        help='Move the data one chunk at a time (muse-player -b).')
+    args = parser.parse_args()
+    run(args.file, args.repeats, args.batch)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Benchmark for the -i/--filter path check of the output listeners.
+
+Runs the check for a stream of messages on typical Muse paths, with the
+patterns searched one at a time by every listener (how filters used to be
+evaluated), with the compiled, memoized path_filter.PathFilter checked by
+every listener, and with one verdict per message shared by the listeners
+(what OutputHandler.start does), and reports the cost per message.
+
+    python scripts/bench_filter.py
+    python scripts/bench_filter.py -m 1000000 -l 4 -p /muse/eeg /muse/acc /muse/elements/alpha
+"""
+from __future__ import print_function
+
+import os
+import re
+import sys
+import time
+from argparse import ArgumentParser
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SRCDIR = os.path.realpath(os.path.join(CWD, os.pardir, 'src'))
+sys.path.insert(0, SRCDIR)
+
+import path_filter
+
+# Message mix of a Muse 2016 session: mostly EEG, then accelerometer and elements.
+PATHS = (['/muse/eeg'] * 22 + ['/muse/acc'] * 5 + ['/muse/eeg/quantization', '/muse/drlref',
+         '/muse/elements/alpha_absolute', '/muse/elements/beta_absolute',
+         '/muse/elements/horseshoe', '/muse/elements/touching_forehead', '/muse/batt'])
+
+
+def search_each_pattern(filters, path):
+    for pattern in filters:
+        if re.search(pattern, path):
+            return True
+    return False
+
+
+def compiled_filter(filters, path):
+    # what OutputHandler.path_contains_filter does with the filter given to set_options
+    return filters is None or filters.matches(path)
+
+
+def time_shared_verdict(filters, messages, listeners):
+    # OutputHandler.broadcast_message: one check, then a look at the verdict per listener
+    paths = [PATHS[i % len(PATHS)] for i in range(messages)]
+    start = time.time()
+    for path in paths:
+        verdict = filters.matches(path)
+        for _ in range(listeners):
+            if not verdict:
+                continue
+    return time.time() - start
+
+
+def time_checks(check, filters, messages, listeners):
+    paths = [PATHS[i % len(PATHS)] for i in range(messages)]
+    start = time.time()
+    for path in paths:
+        for _ in range(listeners):
+            check(filters, path)
+    return time.time() - start
+
+
+def run(messages, listeners, patterns):
+    compiled = path_filter.compile_filter(patterns)
+    before = time_checks(search_each_pattern, patterns, messages, listeners)
+    after = time_checks(compiled_filter, compiled, messages, listeners)
+    shared = time_shared_verdict(compiled, messages, listeners)
+    print('patterns: %d  listeners: %d  messages: %d' % (len(patterns), listeners, messages))
+    print('  re.search per pattern: %.2fs  %.2f us/message' % (before, before / messages * 1e6))
+    print('  compiled + memoized:   %.2fs  %.2f us/message' % (after, after / messages * 1e6))
+    print('  one verdict, shared:   %.2fs  %.2f us/message' % (shared, shared / messages * 1e6))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Per-message cost of the output path filters.')
+    parser.add_argument('-m', '--messages', type=int, default=200000,
+                        help='Number of messages to filter.')
+    parser.add_argument('-l', '--listeners', type=int, default=4,
+                        help='Number of output listeners checking every message.')
+    parser.add_argument('-p', '--patterns', nargs='+',
+                        default=['/muse/elements/alpha', '/muse/elements/beta', '/muse/eeg$', '/muse/acc$'],
+                        help='Filter patterns, as given to -i.')
+    args = parser.parse_args()
+    run(args.messages, args.listeners, args.patterns)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Benchmark for merging several .muse files in MuseProtoBufFileReader.
+
+Writes N synthetic Muse v2 streams with interleaved EEG timestamps to a
+temporary directory, replays them as fast as possible and reports the merge
+throughput.
+
+    python scripts/bench_merge.py -n 40 -s 2000
+    python scripts/bench_merge.py -n 8 -s 20000 -w 4
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SRCDIR = os.path.realpath(os.path.join(CWD, os.pardir, 'src'))
+sys.path.insert(0, SRCDIR)
+
+import Queue
+import utilities
+from Muse_v2 import MuseDataCollection, MuseData, EEG
+from input_handler import MuseProtoBufFileReader
+
+SAMPLE_RATE_HZ = 220.0
+SAMPLES_PER_CHUNK = 3000
+
+
+def write_chunk(file_handle, collection):
+    data_bytes = collection.SerializeToString()
+    file_handle.write(struct.pack("i", len(data_bytes)))
+    file_handle.write(struct.pack("h", 2))
+    file_handle.write(data_bytes)
+
+
+def write_synthetic_stream(path, stream_index, streams, samples):
+    collection = MuseDataCollection()
+    with open(path, 'wb') as file_handle:
+        for sample in range(samples):
+            muse_data = collection.collection.add()
+            # offset every stream so the merge has to interleave all of them
+            muse_data.timestamp = 1400000000.0 + (sample * streams + stream_index) / SAMPLE_RATE_HZ
+            muse_data.config_id = 0
+            muse_data.datatype = MuseData.EEG
+            eeg = muse_data.Extensions[EEG.museData]
+            eeg.values.extend([800.0, 810.0, 820.0, 830.0])
+            if len(collection.collection) >= SAMPLES_PER_CHUNK:
+                write_chunk(file_handle, collection)
+                collection = MuseDataCollection()
+        write_chunk(file_handle, collection)
+
+
+def drain(queue, counts):
+    while True:
+        msg = queue.get()
+        if 'done' in msg:
+            return
+        counts[0] += 1
+
+
+def run(streams, samples, workers):
+    utilities.DisplayPlayback.output_timing = False
+    directory = tempfile.mkdtemp(prefix='bench_merge')
+    try:
+        file_names = []
+        for stream_index in range(streams):
+            path = os.path.join(directory, 'stream%03d.muse' % stream_index)
+            write_synthetic_stream(path, stream_index, streams, samples)
+            file_names.append(path)
+
+        queue = Queue.Queue()
+        counts = [0]
+        consumer = threading.Thread(target=drain, args=[queue, counts])
+        consumer.daemon = True
+        consumer.start()
+
+        reader = MuseProtoBufFileReader(queue, workers=workers)
+        start = time.time()
+        reader.parse_files(file_names, verbose=False, as_fast_as_possible=True)
+        consumer.join()
+        elapsed = time.time() - start
+    finally:
+        shutil.rmtree(directory)
+
+    print('streams: %d  workers: %d  events: %d  time: %.2fs  rate: %.0f events/s' %
+          (streams, workers, counts[0], elapsed, counts[0] / elapsed))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Merge N synthetic .muse streams.')
+    parser.add_argument('-n', '--streams', type=int, default=40,
+                        help='Number of synthetic .muse files to merge.')
+    parser.add_argument('-s', '--samples', type=int, default=2000,
+                        help='EEG samples per file.')
+    parser.add_argument('-w', '--workers', type=int, default=0,
+                        help='Decoding worker processes (0 decodes in the parsing threads).')
+    args = parser.parse_args()
+    run(args.streams, args.samples, args.workers)
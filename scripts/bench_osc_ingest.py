@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Load test for receiving OSC (muse-player -l).
+
+Runs an OSCListener on a local UDP port and sends it EEG messages over the
+loopback at increasing rates, doubling the rate each step, until messages
+are lost or the sender cannot keep up. Prints the received rate of every
+step and the highest rate that was received without loss.
+
+    python scripts/bench_osc_ingest.py
+    python scripts/bench_osc_ingest.py -b -s 5 --max-rate 500000
+"""
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SRCDIR = os.path.realpath(os.path.join(CWD, os.pardir, 'src'))
+sys.path.insert(0, SRCDIR)
+
+import Queue
+import liblo
+from event_batch import EventBatch
+from input_handler import OSCListener
+
+# Time the last messages of a step get to arrive before they are counted
+SETTLE_TIME = 0.5
+
+
+class Counter(object):
+    "Drains the listener queue, counting the events."
+    def __init__(self, queue):
+        self.queue = queue
+        self.events = 0
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            self.events += len(item) if isinstance(item, EventBatch) else 1
+
+
+def send_at_rate(address, message, rate, seconds):
+    "Sends message at rate per second for seconds, returns how many were sent."
+    sent = 0
+    start = time.time()
+    while True:
+        elapsed = time.time() - start
+        if elapsed >= seconds:
+            return sent
+        due = int(rate * elapsed)
+        while sent < due:
+            liblo.send(address, message)
+            sent += 1
+        time.sleep(0.0005)
+
+
+def run(port, batch, seconds, start_rate, max_rate, tolerance):
+    queue = Queue.Queue()
+    listener = OSCListener(queue, 'udp:%d' % port, batch)
+    listener_thread = threading.Thread(target=listener.start)
+    listener_thread.daemon = True
+    listener_thread.start()
+    counter = Counter(queue)
+    time.sleep(0.2)
+
+    address = liblo.Address('osc.udp://localhost:%d' % port)
+    message = liblo.Message('/muse/eeg', 850.0, 851.0, 852.0, 853.0)
+    sustained = 0
+    rate = start_rate
+    while rate <= max_rate:
+        received_before = counter.events
+        sent = send_at_rate(address, message, rate, seconds)
+        time.sleep(SETTLE_TIME)
+        received = counter.events - received_before
+        loss = 1.0 - float(received) / sent if sent else 0.0
+        print('target %8d msgs/s  sent %8d msgs/s  received %8d msgs/s  loss %6.2f%%' % (
+            rate, sent / seconds, received / seconds, 100 * loss))
+        if loss > tolerance or sent < 0.9 * rate * seconds:
+            break
+        sustained = rate
+        rate *= 2
+    listener.done = True
+    listener_thread.join(1)
+    print('max sustained rate: %d msgs/s%s' % (sustained, ' (batch)' if batch else ''))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Find the highest OSC message rate OSCListener receives without loss.')
+    parser.add_argument('-p', '--port', type=int, default=7890,
+                        help='Local UDP port to listen on.')
+    parser.add_argument('-b', '--batch', action='store_true', default=False,
+                        help='Queue the messages of each wakeup as one batch (muse-player -l -b).')
+    parser.add_argument('-s', '--seconds', type=float, default=2.0,
+                        help='Duration of each rate step.')
+    parser.add_argument('--start-rate', type=int, default=1000,
+                        help='Messages per second of the first step.')
+    parser.add_argument('--max-rate', type=int, default=1000000,
+                        help='Highest rate to try.')
+    parser.add_argument('--tolerance', type=float, default=0.001,
+                        help='Fraction of messages that may be lost in a sustained step.')
+    args = parser.parse_args()
+    run(args.port, args.batch, args.seconds, args.start_rate, args.max_rate, args.tolerance)
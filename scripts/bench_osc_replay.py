@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark for parsing OSC-replay (.osc) files.
+
+Parses every line of an OSC-replay file with the parser that used
+shlex.split on every line, and with oscFileReader.parse_line and its
+tokenizer, checks that both give the same events (by repr, so NaN
+arguments compare equal) and reports the parse throughput of each.
+
+    python scripts/bench_osc_replay.py
+    python scripts/bench_osc_replay.py -f capture.osc -r 5
+"""
+from __future__ import print_function
+
+import os
+import shlex
+import sys
+import time
+from argparse import ArgumentParser
+
+CWD = os.path.dirname(os.path.realpath(__file__))
+SRCDIR = os.path.realpath(os.path.join(CWD, os.pardir, 'src'))
+sys.path.insert(0, SRCDIR)
+
+from input_handler import oscFileReader
+
+DEFAULT_INPUT = os.path.realpath(os.path.join(CWD, os.pardir, 'test_data', 'raw_20sec.osc'))
+
+
+def parse_line_shlex(line):
+    "oscFileReader.parse_line as it was before the tokenizer."
+    info = shlex.split(line.strip())
+    if not info:
+        return []
+    if 'Marker' in info[1]:
+        return [float(info[0]), 'muse/annotation', 's', [info[1]], 0]
+    type_list = info[2]
+    all_types = type_list
+    values = []
+    remaining = len(info[3:])
+    index = 3
+    while remaining > 0:
+        for osc_type in type_list:
+            if 'f' in osc_type or 'd' in osc_type:
+                value = float(info[index])
+            elif 'i' in osc_type:
+                value = int(info[index])
+            elif 's' in osc_type:
+                value = line.split("'")[index - 2]
+            index += 1
+            remaining -= 1
+            values.append(value)
+        if remaining > 0:
+            type_list = info[index]
+            all_types += type_list
+            index += 1
+            remaining -= 1
+    return [float(info[0]), info[1], all_types, values, 0]
+
+
+def time_parse(parse, lines, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        events = [parse(line) for line in lines]
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, events
+
+
+def run(file_name, repeats):
+    with open(file_name, 'rb') as file_handle:
+        lines = file_handle.readlines()
+    size = sum(len(line) for line in lines) / 1e6
+    before, expected = time_parse(parse_line_shlex, lines, repeats)
+    after, events = time_parse(oscFileReader().parse_line, lines, repeats)
+    if repr(events) != repr(expected):
+        print('Error: the parsers disagree')
+        return 1
+    print('%s: %d lines, %.1f MB' % (os.path.basename(file_name), len(lines), size))
+    print('  shlex.split: %.2fs  %8d lines/s  %.2f MB/s' % (before, len(lines) / before, size / before))
+    print('  tokenizer:   %.2fs  %8d lines/s  %.2f MB/s' % (after, len(lines) / after, size / after))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compare the OSC-replay line parsers on a file.')
+    parser.add_argument('-f', '--file', default=DEFAULT_INPUT,
+                        help='Input .osc file (default: test_data/raw_20sec.osc).')
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help='Parses per parser, the best time is reported.')
+    args = parser.parse_args()
+    sys.exit(run(args.file, args.repeats))
@@ -0,0 +1,335 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Bulk conversion of recordings.
+
+    muse-player batch recordings/ -t mat csv -d converted/
+
+converts every .muse (and OSC-replay .osc or binary .oscb) file found under
+the given directories or globs in one invocation. -t oscbinary and
+-t oscreplay convert OSC-replay files between the text and binary forms.
+With -z the text outputs (csv, oscreplay) are written compressed, and
+compressed inputs (.muse.gz, .osc.bz2, .oscb.xz, ...) are read as they
+are. Files are converted in parallel in a pool of worker processes, so the
+interpreter start-up and the scipy, h5py and hdf5storage imports are paid
+once per worker rather than once per file. Outputs that are newer than
+their input are skipped; a failed conversion leaves none, so the next run
+tries it again. A summary of every file (events, recording
+duration, conversion time, throughput and the Matlab input/output event
+count check that muse-player does) is written as CSV.
+"""
+
+import csv
+import fnmatch
+import glob
+import multiprocessing
+import os
+import Queue
+import signal
+import sys
+import threading
+import time
+import traceback
+from argparse import ArgumentParser
+
+import compressed_file
+import osc_binary
+import utilities
+from bounded_channel import DEFAULT_CAPACITY
+from input_handler import MuseProtoBufFileReader, MuseOSCFileReader
+from output_handler import OutputHandler, MatlabWriter, CSVFileWriter, OSCFileWriter, OSCBinaryFileWriter, ProtoBufFileWriter
+
+# Output format: (file extension, writer class)
+FORMATS = {
+    'mat': ('.mat', MatlabWriter),
+    'csv': ('.csv', CSVFileWriter),
+    'oscreplay': ('.osc', OSCFileWriter),
+    'oscbinary': ('.oscb', OSCBinaryFileWriter),
+    'muse': ('.muse', ProtoBufFileWriter),
+}
+
+# Formats written compressed with -z
+TEXT_FORMATS = ['csv', 'oscreplay']
+
+INPUT_PATTERNS = ['*.muse', '*.osc', '*.oscb'] + [pattern + suffix for pattern in ['*.muse', '*.osc', '*.oscb']
+                                                  for suffix in compressed_file.COMPRESSIONS]
+
+SUMMARY_FIELDS = ['input', 'status', 'events', 'duration_s', 'conversion_s', 'events_per_s',
+                  'data_in', 'data_out', 'outputs']
+
+
+class SummaryWriter(OutputHandler):
+    "Listener that counts the events of a conversion and the time span they cover."
+    def __init__(self):
+        self.events = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+    def set_options(self, verbose, filters):
+        pass
+
+    def receive_msg(self, msg):
+        if "done" in msg:
+            return
+        self.add(1, msg[0], msg[0])
+
+    def receive_batch(self, batch):
+        timestamps = batch.timestamps()
+        self.add(len(batch), timestamps.min(), timestamps.max())
+
+    def add(self, count, first, last):
+        self.events += count
+        if self.first_timestamp is None or first < self.first_timestamp:
+            self.first_timestamp = first
+        if self.last_timestamp is None or last > self.last_timestamp:
+            self.last_timestamp = last
+
+    def duration(self):
+        if self.first_timestamp is None:
+            return 0.0
+        return float(self.last_timestamp - self.first_timestamp)
+
+
+def find_inputs(sources):
+    "Expand directories (recursively) and globs into a sorted list of recordings."
+    inputs = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for directory, _, file_names in os.walk(source):
+                for pattern in INPUT_PATTERNS:
+                    for file_name in fnmatch.filter(file_names, pattern):
+                        inputs.add(os.path.join(directory, file_name))
+        else:
+            inputs.update(path for path in glob.glob(source) if os.path.isfile(path))
+    return sorted(inputs)
+
+
+def common_directory(paths):
+    "The deepest directory holding every one of paths, compared by path components."
+    common = None
+    for path in paths:
+        parts = os.path.dirname(os.path.abspath(path)).split(os.sep)
+        if common is None:
+            common = parts
+            continue
+        length = 0
+        while length < min(len(common), len(parts)) and common[length] == parts[length]:
+            length += 1
+        common = common[:length]
+    return os.sep.join(common) or os.sep
+
+
+def output_paths(input_file, formats, root, output_dir, compress=None):
+    """
+    Return the output file of each format for input_file.
+
+    Outputs go next to the input, or under output_dir mirroring the input's
+    place below root. compress ('gz', 'bz2' or 'xz') is appended to the
+    text outputs.
+    """
+    base = compressed_file.splitext(input_file)[0]
+    if output_dir:
+        base = os.path.join(os.path.abspath(output_dir), os.path.relpath(base, root))
+    paths = []
+    for output_format in formats:
+        extension = FORMATS[output_format][0]
+        if compress and output_format in TEXT_FORMATS:
+            extension += '.' + compress
+        path = base + extension
+        if os.path.abspath(path) == os.path.abspath(input_file):
+            path = base + '.converted' + extension
+        paths.append((output_format, path))
+    return paths
+
+
+def is_up_to_date(input_file, outputs):
+    input_mtime = os.path.getmtime(input_file)
+    for _, path in outputs:
+        if not os.path.exists(path) or os.path.getmtime(path) < input_mtime:
+            return False
+    return True
+
+
+def remove_outputs(outputs):
+    "Deletes what a failed conversion wrote, so it is not taken for up to date."
+    for output_format, path in outputs:
+        paths = [path]
+        if output_format == 'oscbinary':
+            paths.append(osc_binary.index_file_name(path))
+        for written in paths:
+            if os.path.exists(written):
+                try:
+                    os.remove(written)
+                except OSError, err:
+                    print "Could not remove " + written + ": " + str(err)
+
+
+def init_worker():
+    # Control-C is handled by the main process, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    utilities.DisplayPlayback.output_timing = False
+
+
+def parse_input(reader, input_file, queue, failure):
+    """
+    Replays input_file with reader into queue, ending it with 'done' even
+    when the reader fails, so the writers never wait for it. The error
+    (exc_info, SystemExit included) is appended to failure.
+    """
+    try:
+        reader.parse_files([input_file], False, True, False)
+    except BaseException:
+        failure.append(sys.exc_info())
+    finally:
+        queue.put(["done"])
+
+
+def convert(job):
+    "Convert one recording to every requested format. Runs in a pool worker."
+    input_file, outputs, options = job
+    row = dict((field, '') for field in SUMMARY_FIELDS)
+    row['input'] = input_file
+    row['outputs'] = ' '.join(path for _, path in outputs)
+    try:
+        for _, path in outputs:
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        queue = Queue.Queue()
+        if compressed_file.splitext(input_file)[1].startswith('.osc'):
+            reader = MuseOSCFileReader(queue, options['capacity'])
+        else:
+            reader = MuseProtoBufFileReader(queue, options['capacity'], options['batch'])
+        output_handler = OutputHandler(queue)
+        writers = {}
+        for output_format, path in outputs:
+            if output_format == 'mat':
+                writers[output_format] = MatlabWriter(path, options['stream_matlab'])
+            else:
+                writers[output_format] = FORMATS[output_format][1](path)
+            output_handler.add_listener(writers[output_format])
+        summary = SummaryWriter()
+        output_handler.add_listener(summary)
+
+        # (1) Replay the input as fast as possible into the writers
+        started = time.time()
+        failure = []
+        parse_thread = threading.Thread(target=parse_input, args=[reader, input_file, queue, failure])
+        parse_thread.daemon = True
+        parse_thread.start()
+        output_handler.start(options['filters'])
+        parse_thread.join()
+        elapsed = time.time() - started
+        if failure:
+            raise failure[0][0], failure[0][1], failure[0][2]
+
+        # (2) Summarize
+        row['status'] = 'converted'
+        row['events'] = summary.events
+        row['duration_s'] = '%.3f' % summary.duration()
+        row['conversion_s'] = '%.3f' % elapsed
+        row['events_per_s'] = '%.0f' % (summary.events / elapsed if elapsed > 0 else 0)
+        if 'mat' in writers and isinstance(reader, MuseProtoBufFileReader):
+            row['data_in'] = reader.added_to_queue_events
+            row['data_out'] = writers['mat'].data_written
+            if row['data_in'] != row['data_out']:
+                row['status'] = 'size mismatch'
+    except BaseException:
+        row['status'] = 'failed: ' + traceback.format_exc().strip().splitlines()[-1]
+        remove_outputs(outputs)
+    return row
+
+
+def write_summary(rows, summary_file):
+    with open(summary_file, 'wb') as file_handle:
+        writer = csv.DictWriter(file_handle, SUMMARY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def run(argv):
+    parser = ArgumentParser(prog="muse-player.py batch",
+                            description="Convert many recordings in parallel.")
+    parser.add_argument("sources", nargs='+', metavar="DIR_OR_GLOB",
+                        help="Directories (searched recursively for .muse, .osc and .oscb files, compressed or not) or glob patterns.")
+    parser.add_argument("-t", "--to", dest="formats", nargs='+', required=True,
+                        choices=sorted(FORMATS.keys()),
+                        help="Output format(s).")
+    parser.add_argument("-d", "--output-dir",
+                        help="Write outputs under this directory, mirroring the input tree (default: next to each input).")
+    parser.add_argument("-p", "--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="Number of worker processes (default: %(default)s).")
+    parser.add_argument("--force", action="store_true", default=False,
+                        help="Convert even if the outputs are newer than the input.")
+    parser.add_argument("--summary", metavar="FILE",
+                        help="Per-file summary CSV (default: batch_summary.csv in the output directory).")
+    parser.add_argument("-b", "--batch", action="store_true", default=False,
+                        help="Move Muse file (version 2) data through the pipeline one chunk at a time.")
+    parser.add_argument("--queue-capacity", type=int, default=DEFAULT_CAPACITY, metavar="N",
+                        help="Maximum number of events buffered between parsing and writing.")
+    parser.add_argument("--stream-matlab", action="store_true", default=False,
+                        help="Append Matlab output to the file as it arrives instead of keeping it in memory.")
+    parser.add_argument("-i", "--filter", dest="filters", nargs='+',
+                        help="Filter data by path. e.g. -i /muse/elements/alpha /muse/eeg")
+    parser.add_argument("-z", "--compress", choices=[suffix[1:] for suffix in compressed_file.COMPRESSIONS],
+                        help="Compress the csv and oscreplay outputs while writing them (out.csv.gz, ...).")
+    args = parser.parse_args(argv)
+
+    inputs = find_inputs(args.sources)
+    if not inputs:
+        print >>sys.stderr, "No recordings found in: " + " ".join(args.sources)
+        return 1
+    root = common_directory(inputs)
+    options = {'capacity': args.queue_capacity, 'batch': args.batch, 'filters': args.filters,
+               'stream_matlab': args.stream_matlab}
+
+    # (1) Schedule the conversions, largest first to balance the pool
+    rows = []
+    jobs = []
+    planned = [(input_file, output_paths(os.path.abspath(input_file), args.formats, root, args.output_dir, args.compress))
+               for input_file in inputs]
+    # outputs of an earlier run written next to their inputs are not recordings
+    produced = set(path for _, outputs in planned for _, path in outputs)
+    for input_file, outputs in planned:
+        if os.path.abspath(input_file) in produced:
+            continue
+        if os.path.getsize(input_file) == 0:
+            rows.append({'input': os.path.abspath(input_file), 'status': 'empty file'})
+            continue
+        if not args.force and is_up_to_date(input_file, outputs):
+            rows.append({'input': os.path.abspath(input_file), 'status': 'up to date',
+                         'outputs': ' '.join(path for _, path in outputs)})
+            continue
+        jobs.append((os.path.abspath(input_file), outputs, options))
+    jobs.sort(key=lambda job: os.path.getsize(job[0]), reverse=True)
+    up_to_date = len([row for row in rows if row['status'] == 'up to date'])
+    print "%d file(s) to convert, %d up to date" % (len(jobs), up_to_date)
+
+    # (2) Convert
+    started = time.time()
+    if jobs:
+        pool = multiprocessing.Pool(max(1, min(args.processes, len(jobs))), init_worker)
+        try:
+            for row in pool.imap_unordered(convert, jobs):
+                print "  %s: %s (%s events, %ss)" % (row['input'], row['status'], row['events'], row['conversion_s'])
+                rows.append(row)
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            print "Aborted."
+            return 1
+        pool.join()
+    elapsed = time.time() - started
+
+    # (3) Summary
+    rows.sort(key=lambda row: row['input'])
+    summary_file = args.summary or os.path.join(args.output_dir or '.', 'batch_summary.csv')
+    if os.path.dirname(summary_file) and not os.path.isdir(os.path.dirname(summary_file)):
+        os.makedirs(os.path.dirname(summary_file))
+    write_summary(rows, summary_file)
+    converted = [row for row in rows if row['status'] == 'converted']
+    total_events = sum(row['events'] for row in converted)
+    print "Converted %d file(s), %d events in %.1fs. Summary: %s" % (len(converted), total_events, elapsed, summary_file)
+    failed = [row for row in rows if row['status'] not in ('converted', 'up to date', 'empty file')]
+    return 1 if failed else 0
@@ -0,0 +1,100 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Bounded, blocking hand-off between producer and consumer threads.
+
+This module is used by the file readers to pass events from the parser
+threads to the merger and from the merger to the playback loop without
+spinning on time.sleep(0).
+"""
+
+import collections
+import threading
+import time
+
+DEFAULT_CAPACITY = 30000
+
+
+class BoundedChannel(object):
+    """
+    FIFO with a fixed capacity that blocks on condition variables.
+
+    put() blocks while the channel is full and get() blocks while it is
+    empty. A capacity of 0 or None makes the channel unbounded. Capacity is
+    counted in events: an item that carries several events (an EventBatch)
+    is put with its size.
+
+    The channel records tuning counters: the highest number of queued events
+    seen (high_water_mark) and how often and for how long producers and
+    consumers had to wait.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._items = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self.high_water_mark = 0
+        self.put_blocked_count = 0
+        self.put_blocked_time = 0.0
+        self.get_blocked_count = 0
+        self.get_blocked_time = 0.0
+
+    def _is_full(self):
+        return bool(self.capacity) and self._size >= self.capacity
+
+    def put(self, item, size=1):
+        with self._lock:
+            if self._is_full():
+                self.put_blocked_count += 1
+                blocked_at = time.time()
+                while self._is_full():
+                    self._not_full.wait()
+                self.put_blocked_time += time.time() - blocked_at
+            self._items.append((item, size))
+            self._size += size
+            if self._size > self.high_water_mark:
+                self.high_water_mark = self._size
+            self._not_empty.notify()
+
+    def get(self):
+        with self._lock:
+            if not self._items:
+                self.get_blocked_count += 1
+                blocked_at = time.time()
+                while not self._items:
+                    self._not_empty.wait()
+                self.get_blocked_time += time.time() - blocked_at
+            item, size = self._items.popleft()
+            self._size -= size
+            self._not_full.notify()
+            return item
+
+    def qsize(self):
+        with self._lock:
+            return self._size
+
+    def empty(self):
+        with self._lock:
+            return not self._items
+
+    def stats(self):
+        "Return the tuning counters as a dict."
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'queued': self._size,
+                'high_water_mark': self.high_water_mark,
+                'put_blocked_count': self.put_blocked_count,
+                'put_blocked_time': self.put_blocked_time,
+                'get_blocked_count': self.get_blocked_count,
+                'get_blocked_time': self.get_blocked_time,
+            }
+
+    @staticmethod
+    def format_stats(name, stats):
+        return ('%s: high water mark %d/%s, producer blocked %d times (%.2fs), '
+                'consumer blocked %d times (%.2fs)') % (
+                    name, stats['high_water_mark'], stats['capacity'] or 'unbounded',
+                    stats['put_blocked_count'], stats['put_blocked_time'],
+                    stats['get_blocked_count'], stats['get_blocked_time'])
@@ -0,0 +1,143 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Text outputs written compressed.
+
+A file name ending in .gz, .bz2 or .xz selects the compression. Writes are
+collected into BLOCK_SIZE blocks and handed through a BoundedChannel to a
+thread that compresses them (zlib and bz2 release the interpreter lock while
+they compress), so the output thread only blocks when the compressor is
+QUEUE_BLOCKS blocks behind. Python 2 has no lzma module, so .xz is written
+by an xz process unless backports.lzma is installed. input_stream reads the
+files back.
+"""
+
+import bz2
+import gzip
+import os
+import subprocess
+import threading
+
+from bounded_channel import BoundedChannel
+
+try:
+    from backports import lzma
+except ImportError:
+    lzma = None
+
+COMPRESSIONS = ['.gz', '.bz2', '.xz']
+
+# Bytes collected before a block goes to the compressor thread
+BLOCK_SIZE = 1024 * 1024
+
+# Blocks queued for the compressor thread before writes wait for it
+QUEUE_BLOCKS = 16
+
+
+def compression(file_name):
+    "The compression suffix of file_name ('.gz', '.bz2', '.xz') or None."
+    suffix = os.path.splitext(file_name)[1].lower()
+    return suffix if suffix in COMPRESSIONS else None
+
+
+def splitext(file_name):
+    "Like os.path.splitext, keeping the compression with the extension: out.csv.gz is ('out', '.csv.gz')."
+    suffix = compression(file_name)
+    if suffix is None:
+        return os.path.splitext(file_name)
+    root, extension = os.path.splitext(file_name[:-len(suffix)])
+    return root, extension + file_name[-len(suffix):]
+
+
+def open_output(file_name, buffer_size=-1):
+    "file_name opened for writing, compressed if its name asks for it."
+    suffix = compression(file_name)
+    if suffix is None:
+        return open(file_name, 'w', buffer_size)
+    return CompressedWriter(file_name, suffix)
+
+
+class _XZProcessFile(object):
+    "Writes through an xz process into file_name."
+    def __init__(self, file_name):
+        with open(file_name, 'wb') as output:
+            try:
+                self.process = subprocess.Popen(['xz', '-c'], stdin=subprocess.PIPE, stdout=output)
+            except OSError:
+                raise IOError("Writing .xz files needs the xz program or backports.lzma")
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise IOError("xz exited with status %d" % self.process.returncode)
+
+
+class CompressedWriter(object):
+    """
+    File-like writer compressing on a thread of its own.
+
+    A compressor error is raised as IOError by the next write or by close.
+    """
+    def __init__(self, file_name, suffix):
+        self.name = file_name
+        if suffix == '.gz':
+            self.__file = gzip.GzipFile(file_name, 'wb')
+        elif suffix == '.bz2':
+            self.__file = bz2.BZ2File(file_name, 'wb')
+        elif lzma is not None:
+            self.__file = lzma.open(file_name, 'wb')
+        else:
+            self.__file = _XZProcessFile(file_name)
+        self.__block = []
+        self.__block_size = 0
+        self.__blocks = BoundedChannel(QUEUE_BLOCKS)
+        self.__error = None
+        self.closed = False
+        self.__thread = threading.Thread(target=self.__compress)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __compress(self):
+        while True:
+            block = self.__blocks.get()
+            if block is None:
+                break
+            if self.__error is None:
+                try:
+                    self.__file.write(block)
+                except (IOError, OSError), err:
+                    self.__error = err
+        try:
+            self.__file.close()
+        except (IOError, OSError), err:
+            self.__error = self.__error or err
+
+    def __check(self):
+        if self.__error is not None:
+            raise IOError("Compressing %s failed: %s" % (self.name, self.__error))
+
+    def write(self, data):
+        self.__check()
+        self.__block.append(data)
+        self.__block_size += len(data)
+        if self.__block_size >= BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        "Hands the collected writes to the compressor thread."
+        if self.__block:
+            self.__blocks.put(''.join(self.__block))
+            self.__block = []
+            self.__block_size = 0
+
+    def close(self):
+        "Waits for the compressor thread to finish the file."
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        self.__blocks.put(None)
+        self.__thread.join()
+        self.__check()
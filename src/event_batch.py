@@ -0,0 +1,233 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Blocks of events that travel through the pipeline as a single item.
+
+In batched mode MuseProtoBufReaderV2 emits one EventBatch per
+MuseDataCollection chunk. The batch is merged, queued and broadcast to the
+output listeners as one item, so the queues take one lock per chunk instead
+of one per sample.
+
+Inside a batch the events are stored by column: one PathColumns per distinct
+(path, types) pair holding a timestamp vector and a samples x channels value
+matrix, plus an order vector that records how the rows interleave. Writers
+can then classify a path once per batch and convert whole columns at once.
+"""
+
+import threading
+
+import numpy as np
+
+_path_ids = {}
+_path_names = []
+_path_lock = threading.Lock()
+
+
+def intern_path(path):
+    "Return a small integer id that stands for path for the life of the process."
+    path_id = _path_ids.get(path)
+    if path_id is None:
+        with _path_lock:
+            path_id = _path_ids.get(path)
+            if path_id is None:
+                path_id = len(_path_names)
+                _path_names.append(path)
+                _path_ids[path] = path_id
+    return path_id
+
+
+def path_name(path_id):
+    return _path_names[path_id]
+
+
+def _numeric_dtype(types):
+    "NumPy dtype able to hold the OSC arguments exactly, None for non-numeric ones."
+    if not types:
+        return None
+    if all(t == 'i' for t in types):
+        return np.int64
+    if all(t in 'fd' for t in types):
+        return np.float64
+    return None
+
+
+class PathColumns(object):
+    """
+    All rows of one (path, types) pair in a batch.
+
+    timestamps and config_ids are vectors. For numeric types values is a
+    2-D array with one row per sample (int64 for 'i' paths, float64 for
+    'f'/'d' paths); for anything else it is a list of argument lists.
+    """
+    def __init__(self, path, types, timestamps, values, config_ids):
+        self.path = path
+        self.path_id = intern_path(path)
+        self.types = types
+        self.timestamps = timestamps
+        self.values = values
+        self.config_ids = config_ids
+
+    def __reduce__(self):
+        # path ids are only valid in the process that interned them
+        return (PathColumns, (self.path, self.types, self.timestamps, self.values, self.config_ids))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def is_numeric(self):
+        return isinstance(self.values, np.ndarray)
+
+    def slice(self, start, stop):
+        return PathColumns(self.path, self.types, self.timestamps[start:stop],
+                           self.values[start:stop], self.config_ids[start:stop])
+
+    def events(self):
+        "The rows as [timestamp, path, types, args, config_id] lists."
+        values = self.values.tolist() if self.is_numeric() else self.values
+        return [[timestamp, self.path, self.types, args, config_id]
+                for timestamp, args, config_id in
+                zip(self.timestamps.tolist(), values, self.config_ids.tolist())]
+
+
+class EventBatchBuilder(object):
+    """
+    Collects events column by column while a chunk is decoded.
+
+    add() takes the arguments straight from the protobuf fields, so no
+    per-sample event list is created for numeric data.
+    """
+    def __init__(self):
+        self._columns = {}
+        self._column_keys = []
+        self._order = []
+
+    def add(self, timestamp, path, types, args, config_id):
+        key = (path, types)
+        column = self._columns.get(key)
+        if column is None:
+            column = ([], [], [], len(self._column_keys), _numeric_dtype(types))
+            self._columns[key] = column
+            self._column_keys.append(key)
+        column[0].append(timestamp)
+        if column[4] is None:
+            column[1].append(list(args))
+        else:
+            column[1].extend(args)
+        column[2].append(config_id)
+        self._order.append(column[3])
+
+    def __len__(self):
+        return len(self._order)
+
+    def build(self):
+        columns = []
+        for key in self._column_keys:
+            path, types = key
+            timestamps, values, config_ids, index, dtype = self._columns[key]
+            if dtype is not None:
+                values = np.array(values, dtype=dtype).reshape(len(timestamps), len(types))
+            columns.append(PathColumns(path, types, np.array(timestamps, dtype=np.float64),
+                                       values, np.array(config_ids, dtype=np.int64)))
+        return EventBatch(columns, np.array(self._order, dtype=np.int32))
+
+
+class EventBatch(object):
+    """
+    A run of events in file order, stored by column.
+
+    order[i] is the index in columns of the i-th event; rows of a column
+    appear in the same order as in the batch. Iterating a batch yields the
+    individual [timestamp, path, types, args, config_id] events, so consumers
+    that only understand single events can fall back to handling them one by
+    one.
+    """
+    def __init__(self, columns, order):
+        self.columns = columns
+        self.order = order
+        self._timestamps = None
+
+    @staticmethod
+    def from_events(events):
+        builder = EventBatchBuilder()
+        for event in events:
+            builder.add(event[0], event[1], event[2], event[3], event[4])
+        return builder.build()
+
+    def __len__(self):
+        return len(self.order)
+
+    def timestamps(self):
+        "Timestamps of every event, in batch order."
+        if self._timestamps is None:
+            timestamps = np.empty(len(self.order), dtype=np.float64)
+            for index, column in enumerate(self.columns):
+                timestamps[self.order == index] = column.timestamps
+            self._timestamps = timestamps
+        return self._timestamps
+
+    def interleave(self, per_column):
+        "Reorder per-column lists of items (one per row) into batch order."
+        iterators = [iter(items) for items in per_column]
+        return [next(iterators[index]) for index in self.order.tolist()]
+
+    def __iter__(self):
+        return iter(self.interleave([column.events() for column in self.columns]))
+
+    def first_timestamp(self):
+        return self.columns[self.order[0]].timestamps[0]
+
+    def last_timestamp(self):
+        column = self.columns[self.order[-1]]
+        return column.timestamps[len(column) - 1]
+
+    def leading_count(self, timestamp, include_equal):
+        """
+        Return how many leading events are before timestamp (or at it, if
+        include_equal is set).
+
+        Used by the merger to find the part of a batch that comes before the
+        next head of another stream.
+        """
+        timestamps = self.timestamps()
+        if include_equal:
+            before = timestamps <= timestamp
+        else:
+            before = timestamps < timestamp
+        if before.all():
+            return len(before)
+        return int(np.argmin(before))
+
+    def select(self, keep):
+        "The events of the columns whose keep flag is set (one per column), None if there are none."
+        if all(keep):
+            return self
+        if not any(keep):
+            return None
+        keep = np.array(keep, dtype=bool)
+        # new index of every kept column
+        indexes = (np.cumsum(keep) - 1).astype(self.order.dtype)
+        return EventBatch([column for column, kept in zip(self.columns, keep.tolist()) if kept],
+                          indexes[self.order[keep[self.order]]])
+
+    def split(self, count):
+        "Split into the first count events and the rest."
+        head_rows = np.bincount(self.order[:count], minlength=len(self.columns))
+        head_columns = []
+        tail_columns = []
+        for column, rows in zip(self.columns, head_rows.tolist()):
+            head_columns.append(column.slice(0, rows))
+            tail_columns.append(column.slice(rows, len(column)))
+        return EventBatch(head_columns, self.order[:count]), EventBatch(tail_columns, self.order[count:])
+
+
+def first_timestamp(item):
+    "Timestamp of the first event in either a single event or an EventBatch."
+    if isinstance(item, EventBatch):
+        return item.first_timestamp()
+    return item[0]
+
+
+def item_size(item):
+    "Number of events carried by a queue item."
+    if isinstance(item, EventBatch):
+        return len(item)
+    return 1
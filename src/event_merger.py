@@ -0,0 +1,81 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Time-ordered merging of several event streams.
+
+This module is used by MuseProtoBufFileReader and MuseOSCFileReader to
+interleave the events produced by one parser per input file into a single
+time-ordered input queue.
+"""
+
+import heapq
+from event_batch import EventBatch, first_timestamp, item_size
+
+
+class EventMerger(object):
+    """
+    K-way merge of parser event queues keyed on each parser's head timestamp.
+
+    Every parser exposes an events_queue whose blocking get() yields events in
+    file order and ends with a 'done' event. The merger keeps the head event of every parser
+    in a heap, so choosing the next event costs O(log k) for k parsers.
+
+    When two heads have the same timestamp the parser added last wins, which
+    is the order the original linear scan produced.
+
+    Parsers may queue EventBatch items. A batch is forwarded whole while it
+    stays ahead of every other head and is otherwise split at the first
+    event that another parser has to go before.
+    """
+    def __init__(self, parsers, output_queue):
+        self._parsers = list(parsers)
+        self._output_queue = output_queue
+        self.merged_events = 0
+
+    def _push_head(self, heap, index):
+        self._push_item(heap, index, self._parsers[index].events_queue.get())
+
+    @staticmethod
+    def _push_item(heap, index, item):
+        # negative index so that, on equal timestamps, the later parser pops first
+        heapq.heappush(heap, (first_timestamp(item), -index, item))
+
+    @staticmethod
+    def _split_batch(heap, negative_index, batch):
+        """
+        Return the leading part of batch that goes before the next head, and
+        the remainder (None if the whole batch goes first).
+        """
+        if not heap:
+            return batch, None
+        next_timestamp, next_negative_index = heap[0][0], heap[0][1]
+        # on equal timestamps the batch still goes first if its parser was added later
+        count = batch.leading_count(next_timestamp, negative_index < next_negative_index)
+        if count == len(batch):
+            return batch, None
+        return batch.split(count)
+
+    def run(self):
+        heap = []
+        for index in range(len(self._parsers)):
+            self._push_head(heap, index)
+
+        while heap:
+            timestamp, negative_index, event = heapq.heappop(heap)
+            if isinstance(event, EventBatch):
+                event, remainder = self._split_batch(heap, negative_index, event)
+                if remainder is not None:
+                    self._push_item(heap, -negative_index, remainder)
+            elif 'done' in event:
+                # the last parser to finish closes the merged stream
+                if not heap:
+                    self._output_queue.put([timestamp + 0.1, 'done'])
+                continue
+            else:
+                remainder = None
+
+            size = item_size(event)
+            self.merged_events += size
+            # blocks while the output queue is full
+            self._output_queue.put(event, size)
+            if remainder is None:
+                self._push_head(heap, -negative_index)
@@ -0,0 +1,73 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Append-only 2-D float64 arrays for MatlabWriter.
+
+MatlabWriter used to keep every sample as a Python list of floats and
+convert the lists with np.array when the file was written, which costs
+around ten Python objects per EEG sample and a second copy at write time.
+A GrowableArray keeps the rows in one preallocated NumPy buffer whose
+capacity doubles when it fills up, so appending is amortized O(1) and the
+rows written so far are available as a view without copying.
+"""
+
+import numpy as np
+
+INITIAL_ROWS = 1024
+
+
+class GrowableArray(object):
+    """
+    A rows x columns float64 array that grows by appending rows.
+
+    The number of columns is fixed by the first row appended.
+    """
+    def __init__(self, columns=None, capacity=INITIAL_ROWS):
+        self.rows = 0
+        self.__capacity = capacity
+        self.__buffer = None
+        if columns is not None:
+            self.__allocate(columns)
+
+    def __allocate(self, columns):
+        self.__buffer = np.empty((self.__capacity, columns), dtype=np.float64)
+
+    def __len__(self):
+        return self.rows
+
+    def columns(self):
+        if self.__buffer is None:
+            return None
+        return self.__buffer.shape[1]
+
+    def __reserve(self, count, columns):
+        if self.__buffer is None:
+            self.__allocate(columns)
+        elif columns != self.__buffer.shape[1]:
+            raise ValueError("Row of %d values appended to an array of %d columns" % (columns, self.__buffer.shape[1]))
+        needed = self.rows + count
+        if needed > len(self.__buffer):
+            capacity = len(self.__buffer)
+            while capacity < needed:
+                capacity *= 2
+            grown = np.empty((capacity, columns), dtype=np.float64)
+            grown[:self.rows] = self.__buffer[:self.rows]
+            self.__buffer = grown
+
+    def append(self, row):
+        self.__reserve(1, len(row))
+        self.__buffer[self.rows] = row
+        self.rows += 1
+
+    def append_block(self, rows):
+        "Append a rows x columns array."
+        if len(rows) == 0:
+            return
+        self.__reserve(len(rows), rows.shape[1])
+        self.__buffer[self.rows:self.rows + len(rows)] = rows
+        self.rows += len(rows)
+
+    def view(self):
+        "The rows appended so far. The view is only valid until the next append."
+        if self.__buffer is None:
+            return np.array([])
+        return self.__buffer[:self.rows]
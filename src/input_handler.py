@@ -1,21 +1,38 @@
+import collections
+import input_stream
 import liblo
+import multiprocessing
+import osc_binary
+import osc_codec
+import osc_packet
+import select
+import signal
+import socket
 import sys
 import time
-import shlex
 import utilities
 import threading
+from bounded_channel import BoundedChannel, DEFAULT_CAPACITY
+from event_batch import EventBatch, first_timestamp
+from event_merger import EventMerger
 from liblo_error_explainer import LibloErrorExplainer
+from muse_chunk_index import MuseChunkIndex
+from muse_chunk_scanner import read_version
+from osc_replay_ranges import byte_ranges, read_lines, RANGE_SIZE
+from osc_replay_tokenizer import split_line, parse_numeric
+from source_splitter import source_path
 from proto_reader_v1 import *
 from proto_reader_v2 import *
 
 
 class InputHandler(object):
-    def __init__(self, queue):
+    def __init__(self, queue, capacity=DEFAULT_CAPACITY):
         self.queue = queue
         self.gap_size = 0
         self.last_timestamp = 0
         self.delta = 0
-        self.input_queue = Queue.Queue()
+        self.capacity = capacity
+        self.input_queue = BoundedChannel(capacity)
         self.done = False
 
     def put_message(self, msg):
@@ -56,13 +73,80 @@ class InputHandler(object):
 
             self.put_message(m)
 
+    # Replays the merged input queue until its 'done' event. Optionally as fast as possible, optionally jumping data gaps.
+    def start_queue(self, as_fast_as_possible, jump_data_gaps):
+        while True:
+            # blocks until the merger has queued the next event
+            item = self.input_queue.get()
+
+            # (1) get the current time
+            if not self.delta:
+                self.delta = time.time() - first_timestamp(item)
+                self.last_timestamp = self.delta
+            if not utilities.DisplayPlayback.start_time:
+                start_time = time.time()
+                utilities.DisplayPlayback.set_start_time(start_time)
+
+            # (2) Loop over messages
+            if isinstance(item, EventBatch):
+                if as_fast_as_possible:
+                    self.put_message(item)
+                    continue
+                events = item
+            elif 'done' in item:
+                self.put_done_message()
+                return
+            else:
+                events = [item]
+
+            for event in events:
+                if not as_fast_as_possible:
+                    self.wait_for_event_time(event, jump_data_gaps)
+                self.put_message(event)
+
+    def wait_for_event_time(self, event, jump_data_gaps):
+        # (4) Wait until the time is right. and send.
+        time_to_wait = event[0] + self.delta - time.time() - utilities.DisplayPlayback.gap_time
+        self.gap_size = event[0] - self.last_timestamp
+        self.last_timestamp = event[0]
+        if (time_to_wait > 1) and jump_data_gaps:
+            utilities.DisplayPlayback.gap_time = time_to_wait + utilities.DisplayPlayback.gap_time
+            time_to_wait = 1
+        if time_to_wait > 0:
+            time.sleep(time_to_wait)
+
+    # Returns (name, counters) for every bounded channel this input uses.
+    def channel_stats(self):
+        return [('input queue', self.input_queue.stats())]
+
 class OSCListener(InputHandler):
-    def __init__(self, queue, address):
+    # Milliseconds recv waits for the first message of a wakeup
+    RECV_TIMEOUT = 1
+    # Most packets handled per wakeup, so a flood still lets done be noticed
+    DRAIN_LIMIT = 1000
+
+    # Every wakeup drains all the packets waiting on the socket. With batch
+    # set the messages of one wakeup are queued as a single EventBatch.
+    # Messages in a bundle with a timetag are stamped with the timetag,
+    # the others with the time they were received.
+    # address can list several ports ('udp:5000-5007' or 'udp:5000,5002'),
+    # which are all served by one loop. The path of each message from them is
+    # then prefixed with its port as source, see source_splitter.
+    # With transport (an osc_transport.OSCTransport) the ports are served by
+    # its asyncore loop instead of liblo, which also accepts 'slip:PORT'.
+    def __init__(self, queue, address, batch=False, transport=None):
         super(OSCListener, self).__init__(queue)
+        self.batch = batch
+        self.transport = transport
+        self.malformed_packets = 0
+        self.__pending = []
+        self.__bundle_time = None
+        self.received_messages = 0
+        self.received_batches = 0
         port_options = address.split(':')
         self.port_type = liblo.TCP
         if len(port_options) == 1:
-            if port_options[0].isdigit():
+            if self.parse_ports(port_options[0]):
                 self.port = address
             else:
                 if port_options[0].lower() == 'udp':
@@ -75,19 +159,113 @@ class OSCListener(InputHandler):
             if port_options[0].lower() == 'udp':
                 self.port_type = liblo.UDP
             self.port = port_options[1]
-
-    def receive_message(self, path, arg, types, src):
-        timestamp = time.time()
+        self.ports = self.parse_ports(str(self.port))
+        if self.ports is None:
+            raise ValueError("Invalid OSC port in %r: give a port, a range (5000-5007) or a list (5000,5002)" % address)
+        if self.port_type == liblo.UDP:
+            self.protocol = 'udp'
+        elif port_options[0].lower() == 'slip':
+            self.protocol = 'slip'
+        else:
+            self.protocol = 'tcp'
+
+    @staticmethod
+    def parse_ports(text):
+        "List of the ports in '5000', '5000-5007' or '5000,5002', or None if text is not a port list."
+        ports = []
+        for part in text.split(','):
+            first, separator, last = part.partition('-')
+            if not first.isdigit() or (separator and not last.isdigit()):
+                return None
+            ports.extend(range(int(first), int(last if separator else first) + 1))
+        return ports or None
+
+    def receive_message(self, path, arg, types, src, source=None):
+        if source is not None:
+            path = source_path(source, path)
+        timestamp = self.__bundle_time
+        if timestamp is None:
+            timestamp = time.time()
 
         msg_to_queue = [timestamp, path, types, arg, 0]
-        self.put_message(msg_to_queue)
+        self.received_messages += 1
+        if self.batch:
+            self.__pending.append(msg_to_queue)
+        else:
+            self.put_message(msg_to_queue)
+
+    def bundle_start(self, timetag, user_data=None):
+        self.__bundle_time = osc_packet.unix_from_timetag(timetag)
+
+    def bundle_end(self, user_data=None):
+        self.__bundle_time = None
+
+    # Waits for a packet, then handles all the packets already waiting on the servers.
+    def receive_pending(self, servers):
+        if len(servers) == 1:
+            if not servers[0].recv(self.RECV_TIMEOUT):
+                return
+        else:
+            # TCP connections have sockets of their own, which select does not see,
+            # so every server is polled after the wait
+            select.select(servers, [], [], self.RECV_TIMEOUT / 1000.0)
+        for server in servers:
+            for _ in xrange(self.DRAIN_LIMIT):
+                if not server.recv(0):
+                    break
+        self.queue_pending()
+
+    def queue_pending(self):
+        if self.__pending:
+            self.put_message(EventBatch.from_events(self.__pending))
+            self.received_batches += 1
+            self.__pending = []
+
+    # Handles a packet received by the transport.
+    def receive_packet(self, data, source):
+        try:
+            messages = osc_codec.decode_packet(data)
+        except ValueError:
+            self.malformed_packets += 1
+            return
+        for timetag, path, types, args in messages:
+            self.__bundle_time = None if timetag is None else osc_packet.unix_from_timetag(timetag)
+            self.receive_message(path, args, types, None, source)
+        self.__bundle_time = None
+
+    def start_transport(self):
+        source = len(self.ports) > 1
+        try:
+            for port in self.ports:
+                self.transport.listen(self.protocol, port, self.receive_packet, port if source else None)
+        except socket.error, err:
+            print >>sys.stderr, "Cannot listen on %s port %s: %s" % (self.protocol, port, err)
+            sys.exit(1)
+        while not self.done:
+            self.transport.poll(self.RECV_TIMEOUT / 1000.0)
+            self.queue_pending()
+        self.transport.close()
 
     def start(self, as_fast_as_possible=False, jump_data_gaps=False):
+        if self.transport is not None:
+            self.start_transport()
+            return
         try:
-            server = liblo.Server(self.port, self.port_type)
-            server.add_method(None, None, self.receive_message)
+            if len(self.ports) == 1:
+                servers = [liblo.Server(self.port, self.port_type)]
+                servers[0].add_method(None, None, self.receive_message)
+            else:
+                servers = []
+                for port in self.ports:
+                    server = liblo.Server(port, self.port_type)
+                    server.add_method(None, None, self.receive_message, port)
+                    servers.append(server)
+            for server in servers:
+                if hasattr(server, 'add_bundle_handlers'):
+                    # pyliblo 0.10 and later
+                    server.add_bundle_handlers(self.bundle_start, self.bundle_end)
             while not self.done:
-                server.recv(1)
+                self.receive_pending(servers)
         except liblo.ServerError, err:
             print >>sys.stderr, str(err)
             explanation = LibloErrorExplainer(err).explanation()
@@ -96,14 +274,32 @@ class OSCListener(InputHandler):
             sys.exit(1)
 
 class MuseProtoBufFileReader(InputHandler):
-    def __init__(self, queue):
-        InputHandler.__init__(self, queue)
+    # With batch set, version 2 files are queued as one EventBatch per chunk.
+    # start and end (seconds from the beginning of the earliest recording) limit
+    # playback to that range, seeking through the chunk index of each file.
+    # With workers set, version 2 chunks are decoded in that many processes.
+    # File names are opened with input_stream, so - (standard input), pipes
+    # and compressed files are read as streams, without seeking.
+    def __init__(self, queue, capacity=DEFAULT_CAPACITY, batch=False, start=None, end=None, workers=0):
+        InputHandler.__init__(self, queue, capacity)
+        self.batch = batch
+        self.workers = workers
+        self.__pool = None
+        self.start_offset = start
+        self.end_offset = end
+        self.__indexes = []
         self.protobuf_reader = []
         self.parsing_threads = []
         self.__events = []
-        self.added_to_queue_events = 0
+        self.__merger = None
         self.events_added_by_threads = 0
 
+    @property
+    def added_to_queue_events(self):
+        if self.__merger is None:
+            return 0
+        return self.__merger.merged_events
+
     # Parses multiple input files, sortes by time and calls the handler functions.
     def parse_files(self, file_names, verbose=True, as_fast_as_possible=False, jump_data_gaps=False):
         file_stream = []
@@ -111,39 +307,70 @@ class MuseProtoBufFileReader(InputHandler):
             if verbose:
                 print "Parsing file", file_name
             try:
-                file_stream.append(open(file_name, "rb"))
+                file_stream.append(input_stream.open_input(file_name))
             except:
                 print "File not found: " + file_name
                 self.put_done_message()
                 exit()
 
+        if self.start_offset is not None or self.end_offset is not None:
+            # streams cannot be indexed, they are played whole
+            self.__indexes = [MuseChunkIndex.load_or_build(file_name, verbose) if input_stream.is_seekable(in_stream) else None
+                              for file_name, in_stream in zip(file_names, file_stream)]
+
         self.__parse_head(file_stream, verbose, as_fast_as_possible, jump_data_gaps)
 
+    # Returns the (start, end) timestamps of the requested playback range.
+    def time_range(self):
+        origins = [index.first_timestamp() for index in self.__indexes if index is not None and len(index)]
+        if not origins:
+            return None, None
+        origin = min(origins)
+        start = end = None
+        if self.start_offset is not None:
+            start = origin + self.start_offset
+        if self.end_offset is not None:
+            end = origin + self.end_offset
+        return start, end
+
     def __parse_head(self, in_streams, verbose=True, as_fast_as_possible=False, jump_data_gaps=False):
+        start, end = self.time_range()
+        if self.workers:
+            self.__pool = create_pool(self.workers, self.batch, start, end)
+
         for in_stream in in_streams:
 
-            # (1) Read the message header
-            header_bin = in_stream.read(4)
+            # (1) Read the version from the first chunk header
+            try:
+                msg_type = read_version(in_stream)
+            except IOError, err:
+                self.__fail(err)
             # check for EOF
-            if len(header_bin) == 0:
+            if msg_type is None:
                 print "Zero Sized Muse File"
-                exit()
+                self.__fail(IOError("Zero sized Muse file: " + in_stream.name))
 
-            header = struct.unpack("<i", header_bin)
-            msg_length = header[0]
-            msg_type = in_stream.read(2)
-            msg_type = struct.unpack("<h", msg_type)
-            msg_type = msg_type[0]
-            in_stream.seek(0,0)
             if verbose:
                 print 'Muse File version #' + str(msg_type)
+            index = self.__indexes[in_streams.index(in_stream)] if self.__indexes else None
             if msg_type == 1:
                 # set reader to version 1
-                self.protobuf_reader.append(MuseProtoBufReaderV1(verbose))
+                if self.__indexes:
+                    print 'Seeking is only supported in Muse File version 2, playing the whole file.'
+                self.protobuf_reader.append(MuseProtoBufReaderV1(verbose, self.capacity))
 
             elif msg_type == 2:
                 # set reader to version 2
-                self.protobuf_reader.append(MuseProtoBufReaderV2(verbose))
+                reader = MuseProtoBufReaderV2(verbose, self.capacity, self.batch)
+                if index is not None:
+                    reader.seek(index.seek(start, end), start, end)
+                elif self.__indexes:
+                    print 'Seeking needs a plain file, playing the whole of ' + in_stream.name + '.'
+
+                if self.__pool is not None:
+                    # two chunks per worker keep the pool busy while bounding read-ahead
+                    reader.set_pool(self.__pool, 2 * self.workers)
+                self.protobuf_reader.append(reader)
             else:
                 print 'Muse File version missing, cannot parse.' 
                 print 'All Muse Files data must be prepended with it''s length and version #.'
@@ -161,90 +388,55 @@ class MuseProtoBufFileReader(InputHandler):
         queueing_thread.daemon = True
         queueing_thread.start()
 
-        data_remains = True
-        while data_remains:
-            while queueing_thread.is_alive() and self.input_queue.empty():
-                time.sleep(0)
-
-            self.start_queue(as_fast_as_possible, jump_data_gaps)
-
-            if len(self.protobuf_reader) == 0:
-                queueing_thread.join()
-                data_remains = False
-
-    def start_queue(self, as_fast_as_possible, jump_data_gaps):
-        if self.input_queue.empty():
-            return
-
-        # (1) get the current time
-        if not self.delta:
-            self.delta = time.time() - self.input_queue.queue[0][0]
-        self.last_timestamp = self.delta
-        if not utilities.DisplayPlayback.start_time:
-            start_time = time.time()
-            utilities.DisplayPlayback.set_start_time(start_time)
-
-        # (2) Loop over messages
-        while not self.input_queue.empty():
-            event = self.input_queue.get()
-            if 'done' in event:
-                self.put_done_message()
-                return
-            if not as_fast_as_possible:
-                # (4) Wait until the time is right. and send.
-                time_to_wait = event[0] + self.delta - time.time() - utilities.DisplayPlayback.gap_time
-                self.gap_size = event[0] - self.last_timestamp
-                self.last_timestamp = event[0]
-                if (time_to_wait > 1) and jump_data_gaps:
-                    utilities.DisplayPlayback.gap_time = time_to_wait + utilities.DisplayPlayback.gap_time
-                    time_to_wait = 1
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-
-            self.put_message(event)
-
+        self.start_queue(as_fast_as_possible, jump_data_gaps)
+        queueing_thread.join()
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+        # the outputs got 'done' already, the failure goes to the caller
+        for reader in self.protobuf_reader:
+            if reader.error is not None:
+                raise reader.error
+
+    # Ends the outputs and raises err. Runs on the parsing thread, where
+    # exit() would only end the thread and leave the outputs waiting.
+    def __fail(self, err):
+        self.put_done_message()
+        if self.__pool is not None:
+            self.__pool.terminate()
+        raise err
+
+    # Merges the events of every parser into the input queue in time order.
     def craft_input_queue(self):
-        while len(self.protobuf_reader) != 0:
-            queue_status = 'data available'
-            for parser in self.protobuf_reader:
-                if parser.events_queue.empty():
-                    queue_status = 'empty'
-                    while parser.events_queue.empty():
-                        time.sleep(0)
-
-            if 'data available' in queue_status:
-                earliest_index = 0
-                earliest_time = [time.time()]
-                for parser in self.protobuf_reader:
-                    if parser.events_queue.queue[0][0] <= earliest_time:
-                        earliest_time = parser.events_queue.queue[0][0]
-                        earliest_index = self.protobuf_reader.index(parser)
-
-                earliest_event = self.protobuf_reader[earliest_index].events_queue.get()
-                if 'done' in earliest_event:
-                    if len(self.protobuf_reader) == 1:
-                        self.input_queue.put([earliest_time + 0.1, 'done'])
-                    del self.protobuf_reader[earliest_index]
-                    del self.parsing_threads[earliest_index]
-
-                else:
-                    self.added_to_queue_events += 1
-                    self.input_queue.put(earliest_event)
-
-            while (self.input_queue.qsize() >= 30000) and (len(self.protobuf_reader) != 0):
-                time.sleep(0)
+        self.__merger = EventMerger(self.protobuf_reader, self.input_queue)
+        self.__merger.run()
 
+    def channel_stats(self):
+        stats = InputHandler.channel_stats(self)
+        for index, parser in enumerate(self.protobuf_reader):
+            stats.append(('parser %d events queue' % index, parser.events_queue.stats()))
+        return stats
 
     # Replays Musefile messages. Optionally as fast as possible, optionally jumping data gaps.
     def start(self, as_fast_as_possible=False, jump_data_gaps=False):
         self.start_file(self.__events, as_fast_as_possible, jump_data_gaps)
 
 class MuseOSCFileReader(InputHandler):
-    def __init__(self, queue):
-        InputHandler.__init__(self, queue)
+    # Reads text and binary (osc_binary) OSC-replay files, opened with
+    # input_stream (plain, compressed, pipes or - for standard input). With
+    # workers set, each plain text file is parsed in byte ranges by that many
+    # processes.
+    # start and end (seconds from the beginning of each recording) limit the
+    # playback of binary files, seeking through their index.
+    def __init__(self, queue, capacity=DEFAULT_CAPACITY, workers=0, start=None, end=None):
+        InputHandler.__init__(self, queue, capacity)
         self.__events = []
         self.oscfile_reader = []
         self.parsing_threads = []
+        self.workers = workers
+        self.start_offset = start
+        self.end_offset = end
+        self.__pool = None
 
 
     def parse_files(self, file_names, verbose=True, as_fast_as_possible=False, jump_data_gaps=False):
@@ -253,7 +445,7 @@ class MuseOSCFileReader(InputHandler):
             if verbose:
                 print "Parsing file", file_path
             try:
-                file_stream.append(open(file_path, "rb"))
+                file_stream.append(input_stream.open_input(file_path))
             except:
                 print "File not found: " + file_path
                 self.put_done_message()
@@ -261,46 +453,28 @@ class MuseOSCFileReader(InputHandler):
 
         self.__parse_head(file_stream, verbose, as_fast_as_possible, jump_data_gaps)
 
-    def start_queue(self, as_fast_as_possible, jump_data_gaps):
-         if self.input_queue.empty():
-             return
-
-         # (1) get the current time
-         if not self.delta:
-             self.delta = time.time() - self.input_queue.queue[0][0]
-         self.last_timestamp = self.delta
-         if not utilities.DisplayPlayback.start_time:
-             start_time = time.time()
-             utilities.DisplayPlayback.set_start_time(start_time)
-
-         # (2) Loop over messages
-         while not self.input_queue.empty():
-             event = self.input_queue.get()
-             if 'done' in event:
-                 self.put_done_message()
-                 return
-             if not as_fast_as_possible:
-                 # (4) Wait until the time is right. and send.
-                 time_to_wait = event[0] + self.delta - time.time() - utilities.DisplayPlayback.gap_time
-                 self.gap_size = event[0] - self.last_timestamp
-                 self.last_timestamp = event[0]
-                 if (time_to_wait > 1) and jump_data_gaps:
-                     utilities.DisplayPlayback.gap_time = time_to_wait + utilities.DisplayPlayback.gap_time
-                     time_to_wait = 1
-                 if time_to_wait > 0:
-                     time.sleep(time_to_wait)
-
-             self.put_message(event)
-         self.put_done_message()
-
     # Replays OSC messages. Optionally as fast as possible.
     def start(self, as_fast_as_possible=False, jump_data_gaps=False):
         self.start_file(self.__events, as_fast_as_possible, jump_data_gaps)
 
     def __parse_head(self, in_streams, verbose=True, as_fast_as_possible=False, jump_data_gaps=False):
+        if self.workers:
+            self.__pool = multiprocessing.Pool(self.workers, init_range_worker)
         for in_stream in in_streams:
 
-            self.oscfile_reader.append(oscFileReader(verbose))
+            try:
+                binary = osc_binary.is_binary(in_stream)
+            except IOError, err:
+                self.__fail(err)
+            if binary:
+                self.oscfile_reader.append(oscBinaryFileReader(verbose, self.capacity, self.start_offset, self.end_offset))
+            else:
+                self.oscfile_reader.append(oscFileReader(verbose, self.capacity))
+            # byte ranges are read from the file by name, so streams are parsed here
+            if (self.__pool is not None and input_stream.is_seekable(in_stream)
+                    and not isinstance(self.oscfile_reader[-1], oscBinaryFileReader)):
+                # two ranges per worker keep the pool busy while bounding read-ahead
+                self.oscfile_reader[-1].set_pool(self.__pool, 2 * self.workers)
 
             parse_thread = threading.Thread(target=self.oscfile_reader[in_streams.index(in_stream)].read_file, args=[in_stream])
             parse_thread.daemon = True
@@ -311,79 +485,32 @@ class MuseOSCFileReader(InputHandler):
         queueing_thread.daemon = True
         queueing_thread.start()
 
-        data_remains = True
-        while data_remains:
-            while queueing_thread.is_alive() and self.input_queue.empty():
-                time.sleep(0)
-
-            self.start_queue(as_fast_as_possible, jump_data_gaps)
-
-            if len(self.oscfile_reader) == 0:
-                queueing_thread.join()
-                data_remains = False
-
-    def start_queue(self, as_fast_as_possible, jump_data_gaps):
-        if self.input_queue.empty():
-            return
-
-        # (1) get the current time
-        if not self.delta:
-            self.delta = time.time() - self.input_queue.queue[0][0]
-        self.last_timestamp = self.delta
-        if not utilities.DisplayPlayback.start_time:
-            start_time = time.time()
-            utilities.DisplayPlayback.set_start_time(start_time)
-
-        # (2) Loop over messages
-        while not self.input_queue.empty():
-            event = self.input_queue.get()
-            if 'done' in event:
-                self.put_done_message()
-                return
-            if not as_fast_as_possible:
-                # (4) Wait until the time is right. and send.
-                time_to_wait = event[0] + self.delta - time.time() - utilities.DisplayPlayback.gap_time
-                self.gap_size = event[0] - self.last_timestamp
-                self.last_timestamp = event[0]
-                if (time_to_wait > 1) and jump_data_gaps:
-                    utilities.DisplayPlayback.gap_time = time_to_wait + utilities.DisplayPlayback.gap_time
-                    time_to_wait = 1
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-
-            self.put_message(event)
-
+        self.start_queue(as_fast_as_possible, jump_data_gaps)
+        queueing_thread.join()
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+        # the outputs got 'done' already, the failure goes to the caller
+        for reader in self.oscfile_reader:
+            if reader.error is not None:
+                raise reader.error
+
+    # Ends the outputs and raises err, for a stream that fails before its reader starts.
+    def __fail(self, err):
+        self.put_done_message()
+        if self.__pool is not None:
+            self.__pool.terminate()
+        raise err
+
+    # Merges the events of every parser into the input queue in time order.
     def craft_input_queue(self):
-        while len(self.oscfile_reader) != 0:
-            queue_status = 'data available'
-            for parser in self.oscfile_reader:
-                if parser.events_queue.empty():
-                    queue_status = 'empty'
-                    while parser.events_queue.empty():
-                        time.sleep(0)
-
-            if 'data available' in queue_status:
-                earliest_index = 0
-                earliest_time = [time.time()]
-                for parser in self.oscfile_reader:
-                    if parser.events_queue.queue[0][0] <= earliest_time:
-                        earliest_time = parser.events_queue.queue[0][0]
-                        earliest_index = self.oscfile_reader.index(parser)
-
-                earliest_event = self.oscfile_reader[earliest_index].events_queue.get()
-                if 'done' in earliest_event:
-                    if len(self.oscfile_reader) == 1:
-                        self.input_queue.put([earliest_time + 0.1, 'done'])
-                    del self.oscfile_reader[earliest_index]
-                    del self.parsing_threads[earliest_index]
-
-                else:
-                    #self.added_to_queue_events += 1
-                    self.input_queue.put(earliest_event)
-
-            while (self.input_queue.qsize() >= 30000) and (len(self.protobuf_reader) != 0):
-                time.sleep(0)
+        EventMerger(self.oscfile_reader, self.input_queue).run()
 
+    def channel_stats(self):
+        stats = InputHandler.channel_stats(self)
+        for index, parser in enumerate(self.oscfile_reader):
+            stats.append(('parser %d events queue' % index, parser.events_queue.stats()))
+        return stats
 
     # Replays Musefile messages. Optionally as fast as possible, optionally jumping data gaps.
     def start(self, as_fast_as_possible=False, jump_data_gaps=False):
@@ -391,22 +518,42 @@ class MuseOSCFileReader(InputHandler):
 
 class oscFileReader(object):
 
-    def __init__(self, verbose=False):
-            self.events_queue = Queue.Queue()
+    def __init__(self, verbose=False, capacity=DEFAULT_CAPACITY):
+            self.events_queue = BoundedChannel(capacity)
             self.last_timestamp = 0
-
+            self.__pool = None
+            self.__pool_window = 0
+            self.error = None
+
+    # Hands parsing to a pool of init_range_worker processes, in byte ranges
+    # of the file (see osc_replay_ranges) queued in file order.
+    def set_pool(self, pool, window, range_size=RANGE_SIZE):
+        self.__pool = pool
+        self.__pool_window = window
+        self.__range_size = range_size
+
+    # The events always end with 'done'. A line that fails to parse (here or
+    # in a pool worker) ends the file and is kept in error.
     def read_file(self, file, verbose=False):
+        try:
+            if self.__pool is not None:
+                self.__read_in_pool(file.name)
+                return
 
-        line = file.readline()
-        while line:
-            newLine = self.parse_line(line)
-            if newLine != []:
-                self.add_to_events_queue(newLine)
             line = file.readline()
-        self.add_done()
+            while line:
+                newLine = self.parse_line(line)
+                if newLine != []:
+                    self.add_to_events_queue(newLine)
+                line = file.readline()
+        except Exception, err:
+            self.error = err
+            print "Corrupted file %s: %r" % (file.name, err)
+        finally:
+            self.add_done()
 
     def parse_line(self, line):
-        info = shlex.split(line.strip())
+        info = split_line(line)
         if(len(info) > 0):
             data_array = []
             data_array.append(float(info[0]))
@@ -419,8 +566,13 @@ class oscFileReader(object):
                 return data_array
             else:
                 data_array.append(info[1])
+                numeric = parse_numeric(info[2], info[3:])
+                if numeric is not None:
+                    data_array.extend([info[2], numeric, 0])
+                    return data_array
                 typeListComplete = ''
                 data_to_store = []
+                rawline = None
 
 
                 typeList = info[2]
@@ -436,7 +588,8 @@ class oscFileReader(object):
                         elif 'd' in type:
                             data = float(info[dataCount])
                         elif 's' in type:
-                            rawline = line.split("'")
+                            if rawline is None:
+                                rawline = line.split("'")
                             data = rawline[dataCount-2]
                         dataCount = dataCount + 1
                         dataLength = dataLength - 1
@@ -453,12 +606,75 @@ class oscFileReader(object):
                 return data_array
         return []
 
+    def __read_in_pool(self, file_name):
+        # at most window ranges are in flight, so large files are not read ahead
+        pending = collections.deque()
+        for start, stop in byte_ranges(file_name, self.__range_size):
+            pending.append(self.__pool.apply_async(parse_range_in_worker, [file_name, start, stop]))
+            if len(pending) >= self.__pool_window:
+                self.queue_parsed(pending.popleft().get())
+        while pending:
+            self.queue_parsed(pending.popleft().get())
+
+    def queue_parsed(self, events):
+        for event in events:
+            self.add_to_events_queue(event)
+
     def add_done(self):
         self.add_to_events_queue([self.last_timestamp + 0.001, 'done'])
 
     def add_to_events_queue(self, event):
         self.last_timestamp = event[0]
+        # blocks while the merger is behind
         self.events_queue.put(event)
 
-        while self.events_queue.qsize() >= 30000:
-            time.sleep(0)
+
+class oscBinaryFileReader(oscFileReader):
+    # Reads binary OSC-replay files (see osc_binary). start and end are
+    # seconds from the first record.
+    def __init__(self, verbose=False, capacity=DEFAULT_CAPACITY, start=None, end=None):
+        oscFileReader.__init__(self, verbose, capacity)
+        self.start_offset = start
+        self.end_offset = end
+
+    # Like oscFileReader.read_file, the events always end with 'done' and a
+    # record that fails to read or decode ends the file and is kept in error.
+    def read_file(self, file, verbose=False):
+        offset = None
+        first = None
+        try:
+            if self.start_offset is not None and input_stream.is_seekable(file):
+                index = osc_binary.BinaryIndex.load(file.name)
+                if index is not None and index.first_timestamp is not None:
+                    first = index.first_timestamp
+                    offset = index.offset(first + self.start_offset)
+            for timestamp, packet in osc_binary.read_records(file, offset):
+                if first is None:
+                    first = timestamp
+                if self.start_offset is not None and timestamp < first + self.start_offset:
+                    continue
+                if self.end_offset is not None and timestamp > first + self.end_offset:
+                    break
+                for _, path, types, args in osc_codec.decode_packet(packet):
+                    self.add_to_events_queue([timestamp, path, types, args, 0])
+        except Exception, err:
+            self.error = err
+            print "Corrupted file %s: %r" % (file.name, err)
+        finally:
+            self.add_done()
+
+
+def init_range_worker():
+    # Control-C is handled by the main process, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def parse_range_in_worker(file_name, start, stop):
+    "Events of the OSC-replay lines between the offsets."
+    reader = oscFileReader()
+    events = []
+    for line in read_lines(file_name, start, stop):
+        event = reader.parse_line(line)
+        if event != []:
+            events.append(event)
+    return events
@@ -0,0 +1,225 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Input files opened for the readers, whatever they are stored in.
+
+open_input returns plain regular files as they are, so the readers can map,
+seek and index them. Anything else is wrapped in an InputStream: standard
+input (-), pipes, and files compressed with gzip, bzip2 or xz, which are
+decompressed by a thread of their own (or by an xz process) ahead of the
+parser. Readers sniff a file's format with peek, which works on both kinds
+without seeking.
+"""
+
+import bz2
+import os
+import subprocess
+import sys
+import threading
+import zlib
+
+from bounded_channel import BoundedChannel
+from compressed_file import compression, lzma
+
+STDIN = '-'
+
+# Bytes read from the underlying stream at a time
+BLOCK_SIZE = 256 * 1024
+
+# Decompressed blocks queued ahead of the parser
+QUEUE_BLOCKS = 16
+
+# Headers of compressed data. A .muse chunk header could only match the
+# gzip one with a chunk of half a megabyte or more.
+MAGIC = [('\x1f\x8b\x08', '.gz'), ('BZh', '.bz2'), ('\xfd7zXZ\x00', '.xz')]
+
+
+def open_input(file_name):
+    """
+    file_name opened for reading, with - for standard input.
+
+    Files are decompressed when their name ends in .gz, .bz2 or .xz, and
+    standard input and pipes when their data starts with a gzip, bzip2 or
+    xz header.
+    """
+    if file_name == STDIN:
+        in_stream = InputStream(os.fdopen(os.dup(sys.stdin.fileno()), 'rb'), '<stdin>')
+    else:
+        in_stream = open(file_name, 'rb')
+        if os.path.isfile(file_name):
+            suffix = compression(file_name)
+            return in_stream if suffix is None else DecompressingStream(in_stream, file_name, suffix)
+        in_stream = InputStream(in_stream, file_name)
+    suffix = sniff_compression(in_stream)
+    return in_stream if suffix is None else DecompressingStream(in_stream, in_stream.name, suffix)
+
+
+def sniff_compression(in_stream):
+    "The compression suffix matching the header of the data in in_stream, or None."
+    head = peek(in_stream, max(len(magic) for magic, _ in MAGIC))
+    for magic, suffix in MAGIC:
+        if head.startswith(magic):
+            return suffix
+    return None
+
+
+def is_seekable(in_stream):
+    "True for a plain regular file, which can be mapped, seeked and indexed."
+    return isinstance(in_stream, file)
+
+
+def peek(in_stream, size):
+    "The next size bytes of in_stream (fewer at its end), left unread."
+    if isinstance(in_stream, InputStream):
+        return in_stream.peek(size)
+    data = in_stream.read(size)
+    in_stream.seek(-len(data), os.SEEK_CUR)
+    return data
+
+
+class InputStream(object):
+    """
+    Buffered reading of a stream that cannot seek, with peek.
+
+    Has the read, readline and iteration the readers use, but no fileno or
+    seek, so the readers take their streaming paths for it.
+    """
+    def __init__(self, raw, name):
+        self.raw = raw
+        self.name = name
+        self.__buffer = ''
+        self.__position = 0
+        self.__eof = False
+
+    def read_block(self):
+        "The next block of the stream, '' at its end."
+        return self.raw.read(BLOCK_SIZE)
+
+    def __fill(self, size):
+        "Buffers at least size unread bytes, unless the stream ends first."
+        while len(self.__buffer) - self.__position < size and not self.__eof:
+            block = self.read_block()
+            if not block:
+                self.__eof = True
+                return
+            self.__buffer = self.__buffer[self.__position:] + block
+            self.__position = 0
+
+    def peek(self, size):
+        self.__fill(size)
+        return self.__buffer[self.__position:self.__position + size]
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = sys.maxint
+        self.__fill(size)
+        data = self.__buffer[self.__position:self.__position + size]
+        self.__position += len(data)
+        return data
+
+    def readline(self):
+        end = self.__buffer.find('\n', self.__position)
+        while end < 0 and not self.__eof:
+            searched = len(self.__buffer) - self.__position
+            self.__fill(searched + 1)
+            end = self.__buffer.find('\n', self.__position + searched)
+        end = len(self.__buffer) if end < 0 else end + 1
+        line = self.__buffer[self.__position:end]
+        self.__position = end
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        self.raw.close()
+
+
+def _decompressor(suffix):
+    if suffix == '.gz':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if suffix == '.bz2':
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor()
+
+
+class DecompressingStream(InputStream):
+    """
+    The decompressed data of a compressed stream.
+
+    gzip and bzip2 (and xz with backports.lzma) are decompressed by a
+    thread that stays up to QUEUE_BLOCKS blocks ahead of the reader; zlib
+    and bz2 release the interpreter lock while they work. Concatenated
+    streams (as written by pigz or pbzip2) are read one after the other.
+    Without backports.lzma, .xz is decompressed by an xz process. A
+    decompression error is raised as IOError by the read that reaches it.
+    """
+    def __init__(self, compressed, name, suffix):
+        self.compressed = compressed
+        self.suffix = suffix
+        self.__blocks = BoundedChannel(QUEUE_BLOCKS)
+        self.__error = None
+        self.__process = None
+        if suffix == '.xz' and lzma is None:
+            regular = isinstance(compressed, file)
+            try:
+                self.__process = subprocess.Popen(['xz', '-dc'], stdout=subprocess.PIPE,
+                                                  stdin=compressed if regular else subprocess.PIPE)
+            except OSError:
+                raise IOError("Reading .xz files needs the xz program or backports.lzma")
+            InputStream.__init__(self, self.__process.stdout, name)
+            if regular:
+                return
+            target = self.__feed
+        else:
+            InputStream.__init__(self, compressed, name)
+            target = self.__decompress
+        self.__thread = threading.Thread(target=target)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __decompress(self):
+        try:
+            decompressor = _decompressor(self.suffix)
+            data = self.compressed.read(BLOCK_SIZE)
+            while data:
+                try:
+                    block = decompressor.decompress(data)
+                except EOFError:
+                    # a bzip2 stream ended with the last block, the next one starts here
+                    decompressor = _decompressor(self.suffix)
+                    continue
+                if block:
+                    self.__blocks.put(block)
+                data = decompressor.unused_data
+                if data:
+                    decompressor = _decompressor(self.suffix)
+                else:
+                    data = self.compressed.read(BLOCK_SIZE)
+        except Exception, err:
+            # any error (zlib.error, IOError, LZMAError, ...) goes to the reader
+            self.__error = err
+        finally:
+            self.__blocks.put('')
+
+    def __feed(self):
+        # copies a compressed stream into the xz process, which reports a cut short stream
+        try:
+            data = self.compressed.read(BLOCK_SIZE)
+            while data:
+                self.__process.stdin.write(data)
+                data = self.compressed.read(BLOCK_SIZE)
+        except Exception:
+            pass
+        finally:
+            self.__process.stdin.close()
+
+    def read_block(self):
+        if self.__process is not None:
+            return InputStream.read_block(self)
+        block = self.__blocks.get()
+        if not block and self.__error is not None:
+            raise IOError("Decompressing %s failed: %s" % (self.name, self.__error))
+        return block
+
+    def close(self):
+        self.compressed.close()
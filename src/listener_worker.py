@@ -0,0 +1,170 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Output listeners that run on their own thread.
+
+OutputHandler hands every event to its listeners one after the other, so a
+listener that stalls (OSCMessageWriter waiting for an unreachable host)
+stalls every other output and, behind them, the input. A ListenerWorker
+wraps a listener with a bounded queue and a thread of its own: the handler
+only enqueues, and what happens when the queue is full is decided per
+listener by its overflow policy.
+"""
+
+import threading
+
+import path_filter
+from bounded_channel import BoundedChannel, DEFAULT_CAPACITY
+from event_batch import EventBatch, first_timestamp, item_size
+from output_handler import OutputHandler
+
+# Overflow policies
+BLOCK = 'block'              # wait for the listener, losing nothing
+DROP_OLDEST = 'drop-oldest'  # discard the oldest queued events
+DROP_PATHS = 'drop-paths'    # discard new events on the given paths, wait for the others
+POLICIES = [BLOCK, DROP_OLDEST, DROP_PATHS]
+
+
+class OverflowChannel(BoundedChannel):
+    "BoundedChannel that can make room or refuse an item instead of blocking."
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        BoundedChannel.__init__(self, capacity)
+        self.dropped = 0
+
+    def put_dropping_oldest(self, item, size=1):
+        with self._lock:
+            while self._is_full() and self._items:
+                _, dropped_size = self._items.popleft()
+                self._size -= dropped_size
+                self.dropped += dropped_size
+        self.put(item, size)
+
+    def offer(self, item, size=1):
+        "Put item unless the channel is full. Returns whether it was queued."
+        with self._lock:
+            if self._is_full():
+                self.dropped += size
+                return False
+        self.put(item, size)
+        return True
+
+    def put_last(self, item):
+        "Queue the item that ends the stream, even over capacity."
+        with self._lock:
+            self._items.append((item, 0))
+            self._not_empty.notify()
+
+    def stats(self):
+        stats = BoundedChannel.stats(self)
+        with self._lock:
+            stats['dropped'] = self.dropped
+        return stats
+
+
+class ListenerWorker(OutputHandler):
+    """
+    Runs listener on a thread of its own behind a bounded queue.
+
+    The worker is added to OutputHandler in place of the listener. policy is
+    one of POLICIES; drop_paths are the path patterns that DROP_PATHS may
+    discard (a batch only if all its paths match). The 'done' message is
+    never dropped, and receiving it waits until the listener has processed
+    everything queued before it. If the listener raises, the worker keeps
+    emptying its queue so the caller is never blocked, and the error is
+    raised again when 'done' is received.
+    """
+    def __init__(self, listener, name, capacity=DEFAULT_CAPACITY, policy=BLOCK, drop_paths=None):
+        if policy not in POLICIES:
+            raise ValueError("Unknown overflow policy: " + str(policy))
+        self.listener = listener
+        self.name = name
+        self.policy = policy
+        self.__drop_paths = path_filter.compile_filter(drop_paths or [])
+        self.__queue = OverflowChannel(capacity)
+        self.__thread = threading.Thread(target=self.run, name=name + ' output')
+        self.__thread.daemon = True
+        self.__started = False
+        self.error = None
+        self.first_timestamp = None
+        self.queued_timestamp = None
+        self.delivered_timestamp = None
+
+    @property
+    def applies_own_filters(self):
+        return self.listener.applies_own_filters
+
+    def set_options(self, verbose, filters):
+        self.listener.set_options(verbose, filters)
+        if not self.__started:
+            self.__started = True
+            self.__thread.start()
+
+    def receive_msg(self, msg):
+        if "done" in msg:
+            self.__queue.put_last(msg)
+            if self.__started:
+                self.__thread.join()
+                if self.error is not None:
+                    raise self.error
+            else:
+                self.listener.receive_msg(msg)
+            return
+        self.queue(msg, [msg[1]])
+
+    def receive_batch(self, batch):
+        self.queue(batch, [column.path for column in batch.columns])
+
+    def queue(self, item, paths):
+        size = item_size(item)
+        if self.policy == DROP_OLDEST:
+            self.__queue.put_dropping_oldest(item, size)
+        elif self.policy == DROP_PATHS and all(self.__drop_paths.matches(path) for path in paths):
+            if not self.__queue.offer(item, size):
+                return
+        else:
+            self.__queue.put(item, size)
+        if self.first_timestamp is None:
+            self.first_timestamp = first_timestamp(item)
+        self.queued_timestamp = item.last_timestamp() if isinstance(item, EventBatch) else item[0]
+
+    def run(self):
+        while True:
+            item = self.__queue.get()
+            done = not isinstance(item, EventBatch) and "done" in item
+            if self.error is None:
+                try:
+                    self.deliver(item)
+                except Exception, err:
+                    self.error = err
+                    print '%s output failed: %r' % (self.name, err)
+            if done:
+                return
+
+    def deliver(self, item):
+        if isinstance(item, EventBatch):
+            self.listener.receive_batch(item)
+            self.delivered_timestamp = item.last_timestamp()
+            return
+        self.listener.receive_msg(item)
+        if "done" not in item:
+            self.delivered_timestamp = item[0]
+
+    def lag(self):
+        "Seconds of recording between the last event queued and the last one the listener processed."
+        if self.queued_timestamp is None:
+            return 0.0
+        delivered = self.delivered_timestamp
+        if delivered is None:
+            delivered = self.first_timestamp
+        return max(0.0, float(self.queued_timestamp - delivered))
+
+    def stats(self):
+        stats = self.__queue.stats()
+        stats['lag'] = self.lag()
+        return stats
+
+    @staticmethod
+    def format_stats(name, stats):
+        return ('%s output: lag %.2fs, %d queued, dropped %d, high water mark %d/%s, '
+                'input blocked %d times (%.2fs)') % (
+                    name, stats['lag'], stats['queued'], stats['dropped'], stats['high_water_mark'],
+                    stats['capacity'] or 'unbounded', stats['put_blocked_count'], stats['put_blocked_time'])
@@ -0,0 +1,134 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Incremental writing of the large arrays of a MATLAB (v7.3) file.
+
+MatlabWriter normally keeps every sample in memory and writes the whole
+structure with hdf5storage at the end, splitting long sessions into several
+files. In streaming mode the sample arrays (raw eeg/acc/drlref/battery and
+elements) are instead appended as they arrive to resizable, chunked HDF5
+datasets, so memory stays flat and a session produces a single file. The rest of the structure (config, device, markers, ...) is
+small and still written by hdf5storage when the file is finished.
+"""
+
+import os
+
+import h5py
+import hdf5storage as h5
+import numpy as np
+from hdf5storage.utilities import set_attribute
+
+# Streamed datasets live in <output file><SCRATCH_SUFFIX> until the output is
+# finished: hdf5storage rewrites the whole file it is given.
+SCRATCH_SUFFIX = '.stream'
+
+# Rows buffered per dataset before they are appended to the file.
+BLOCK_ROWS = 4096
+
+# Columns per HDF5 chunk (MATLAB layout is transposed, so rows become columns).
+CHUNK_COLUMNS = 4096
+
+
+class StreamedArray(object):
+    """
+    A 2-D float64 array that grows by rows inside an HDF5 file.
+
+    The dataset is stored transposed (columns x rows), which is how
+    hdf5storage lays out arrays for MATLAB.
+    """
+    def __init__(self, group, name, columns):
+        self.columns = columns
+        self.rows = 0
+        self.dataset = group.create_dataset(name, shape=(columns, 0), maxshape=(columns, None),
+                                            chunks=(columns, CHUNK_COLUMNS), dtype=np.float64)
+        self.__pending = []
+
+    def append(self, row):
+        self.__pending.append(row)
+        if len(self.__pending) >= BLOCK_ROWS:
+            self.flush()
+
+    def append_block(self, rows):
+        self.flush()
+        self.write(np.asarray(rows, dtype=np.float64))
+
+    def flush(self):
+        if self.__pending:
+            rows = np.array(self.__pending, dtype=np.float64)
+            self.__pending = []
+            self.write(rows)
+
+    def write(self, rows):
+        count = len(rows)
+        self.dataset.resize((self.columns, self.rows + count))
+        self.dataset[:, self.rows:self.rows + count] = rows.T
+        self.rows += count
+
+
+class MatlabStream(object):
+    """
+    Streams arrays into a MATLAB file and finishes it with the rest of the
+    structure.
+
+    Arrays are addressed by their key path in the MatlabWriter dataset, e.g.
+    (u'IXDATA', u'raw', u'eeg', u'data'). They are appended to a scratch file
+    next to the output (<file>.stream), created on the first append, and
+    copied into the output when it is finished.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.scratch_name = file_name + SCRATCH_SUFFIX
+        self.__file = None
+        self.__arrays = {}
+
+    def __array(self, path, columns):
+        array = self.__arrays.get(path)
+        if array is None:
+            if self.__file is None:
+                self.__file = h5py.File(self.scratch_name, 'w')
+            array = StreamedArray(self.__file, '/'.join(path), columns)
+            self.__arrays[path] = array
+        return array
+
+    def append(self, path, row):
+        self.__array(path, len(row)).append(row)
+
+    def append_block(self, path, rows):
+        if len(rows):
+            self.__array(path, rows.shape[1]).append_block(rows)
+
+    def finish(self, dataset):
+        """
+        Write dataset with hdf5storage and copy the streamed arrays into it.
+
+        Each streamed array gets a one-row placeholder in dataset so that
+        hdf5storage writes the struct fields and array attributes MATLAB
+        needs. The placeholder is then replaced by the streamed dataset.
+        """
+        for path, array in self.__arrays.items():
+            array.flush()
+            node = dataset
+            for key in path[:-1]:
+                if not isinstance(node.get(key), dict):
+                    node[key] = {}
+                node = node[key]
+            node[path[-1]] = np.zeros((1, array.columns))
+
+        h5.write(dataset, path='/', filename=self.file_name, truncate_existing=True,
+                 store_python_metadata=True, matlab_compatible=True)
+        if self.__file is None:
+            return
+
+        with h5py.File(self.file_name, 'a') as out_file:
+            for path, array in self.__arrays.items():
+                parent = out_file['/' + '/'.join(path[:-1])]
+                attributes = dict(parent[path[-1]].attrs.items())
+                del parent[path[-1]]
+                self.__file.copy(array.dataset, parent, name=path[-1])
+                streamed = parent[path[-1]]
+                for name, value in attributes.items():
+                    streamed.attrs[name] = value
+                set_attribute(streamed, 'Python.Shape', np.array([array.rows, array.columns], dtype=np.uint64))
+        self.__file.close()
+        os.remove(self.scratch_name)
+        self.__arrays = {}
+        self.__file = None
@@ -3,7 +3,14 @@ import signal
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 from input_handler import *
 from output_handler import *
+from bounded_channel import BoundedChannel, DEFAULT_CAPACITY
+from listener_worker import ListenerWorker, POLICIES, BLOCK
+from process_fanout import ProcessFanout
+from source_splitter import SourceSplitter
+from osc_transport import OSCTransport
+import batch_converter
 import Queue
+import multiprocessing
 import threading
 import utilities
 import platform
@@ -24,6 +31,9 @@ done = False
 
 VERSION = (1, 9, 0)
 
+# Output names for --output-filter
+OUTPUT_NAMES = ['osc', 'muse', 'matlab', 'oscreplay', 'oscbinary', 'csv', 'screen']
+
 def prog_version_string():
     return "Muse Player " + ".".join(str(x) for x in VERSION)
 
@@ -63,6 +73,12 @@ Examples:
 
     muse-player -l 5555 -M matlab.mat -s 5001
         This will receive OSC messages on port 5555, save them to file, and rebroadcast them to port 5001.
+
+    muse-player -f my_eeg_recording.muse -M raw.mat -s --output-filter matlab /muse/eeg /muse/acc --output-filter osc /muse/elements
+        This will save only raw EEG and accelerometer data to Matlab and send only elements as OSC.
+
+    muse-player batch recordings/ -t mat csv -d converted/
+        This will convert every recording under recordings/ in parallel, see muse-player batch -h.
                             """)
 
     parser.add_argument("-v", "--verbose",
@@ -91,47 +107,177 @@ Examples:
                         default=False,
                         help="Replay input by omitting output of current timing info.")
 
+    parser.add_argument("-b", "--batch",
+                        action="store_true",
+                        dest="batch",
+                        default=False,
+                        help="Move Muse file (version 2) data through the pipeline one chunk at a time instead of one message at a time. With -l, the messages received in one wakeup are moved together.")
+
+    parser.add_argument("--queue-capacity",
+                        dest="queue_capacity",
+                        type=int,
+                        default=DEFAULT_CAPACITY,
+                        metavar="N",
+                        help="Maximum number of events buffered between file parsing and playback (default: %(default)s, 0 for unbounded). With -v the queue counters are printed at the end.")
+
+    parser.add_argument("--workers",
+                        dest="workers",
+                        type=int,
+                        default=0,
+                        metavar="N",
+                        help="Decode Muse file (version 2) chunks, or parse OSC-replay files in byte ranges, in N worker processes instead of the parsing threads (default: 0, no worker processes).")
+
+    parser.add_argument("--start",
+                        dest="start",
+                        type=float,
+                        metavar="SECONDS",
+                        help="Start playback of Muse files (version 2) and binary OSC-replay files this many seconds after the beginning of the recording. Seeks through a .muse.idx index that is written next to each file on first use, or the .idx written with a binary OSC-replay file.")
+
+    parser.add_argument("--end",
+                        dest="end",
+                        type=float,
+                        metavar="SECONDS",
+                        help="Stop playback of Muse files (version 2) and binary OSC-replay files this many seconds after the beginning of the recording.")
+
     parser.add_argument("-i", "--filter",
                         dest="filter_data",
                         nargs='+',
                         help="Filter data by path. e.g. -i /muse/elements/alpha /muse/eeg")
 
+    parser.add_argument("--output-filter",
+                        dest="output_filters",
+                        nargs='+',
+                        action='append',
+                        metavar=("OUTPUT", "PATTERN"),
+                        help="Filter the data of one output by path instead of -i. OUTPUT is one of: " + ", ".join(OUTPUT_NAMES) + ". Can be given once per output.")
+
+    parser.add_argument("--output-threads",
+                        action="store_true",
+                        dest="output_threads",
+                        default=False,
+                        help="Run every output on its own thread behind its own queue, so a slow output (e.g. an unreachable OSC host) does not hold up the others. With -v the per-output lag and drop counters are printed at the end.")
+
+    parser.add_argument("--output-queue-capacity",
+                        dest="output_queue_capacity",
+                        type=int,
+                        default=DEFAULT_CAPACITY,
+                        metavar="N",
+                        help="Maximum number of events queued for each output with --output-threads (default: %(default)s, 0 for unbounded).")
+
+    parser.add_argument("--output-processes",
+                        action="store_true",
+                        dest="output_processes",
+                        default=False,
+                        help="Run each file output (-F, -M, -O, -C) in a process of its own, so converting to several formats uses several cores.")
+
+    parser.add_argument("--split-sources",
+                        action="store_true",
+                        dest="split_sources",
+                        default=False,
+                        help="With -l on several ports, write each file output (-F, -M, -O, -C) to one file per source: out.csv becomes out_5000.csv, out_5001.csv, ...")
+
+    parser.add_argument("--overflow",
+                        dest="overflow",
+                        nargs='+',
+                        action='append',
+                        metavar=("OUTPUT", "POLICY"),
+                        help="What an output does when its queue is full (implies --output-threads): " + ", ".join(POLICIES) + " (default: " + BLOCK + "). drop-paths is followed by the path patterns that may be dropped. e.g. --overflow osc drop-oldest")
+
     input_group = parser.add_argument_group("Input options",
                                             "Only one type of input can be specified, but can be multiple files of the same type:")
     input_group.add_argument("-l", "--input-osc-port",
                              const="tcp:5000",
                              nargs='?',
-                             help="Listen for OSC messages on this port (default: tcp:5000).")
+                             help="Listen for OSC messages on this port (default: tcp:5000). A list or range of ports (udp:5000-5007, udp:5000,5002) listens to several headsets at once, with each message path prefixed by its port as source, e.g. /source5001/muse/eeg.")
     input_group.add_argument("-f", "--input-muse-files",
                              nargs='+',
-                             help="Input from Muse file format.")
+                             help="Input from Muse file format. - reads standard input; files ending in .gz, .bz2 or .xz (and compressed standard input) are decompressed on a background thread as they are read.")
     input_group.add_argument("-o", "--input-oscreplay-files",
                              nargs='+',
-                             help="Input from OSC-replay files.")
+                             help="Input from OSC-replay files, text or binary (-B). Like -f, takes - for standard input and compressed files (.gz, .bz2, .xz).")
 
     output_group = parser.add_argument_group("Output options", "One or more outputs can be specified:")
     output_group.add_argument("-s", "--output-osc-url",
-                              help="Output OSC messages to HOST:PORT (default: osc.udp://localhost:5001)",
+                              help="Output OSC messages to HOST:PORT (default: osc.udp://localhost:5001). Can be given several times, each destination is sent to from its own thread. A destination can be followed by '#' and comma separated path patterns that replace the filters for it, e.g. -s osc.tcp://localhost:5002#/muse/eeg,/muse/acc",
                               const="osc.udp://localhost:5001",
+                              action='append',
                               nargs='?')
+    parser.add_argument("--osc-transport",
+                        dest="osc_transport",
+                        choices=["liblo", "native"],
+                        default="liblo",
+                        help="Network code for -l and -s (default: liblo). native serves all OSC sockets from one loop without liblo, and adds SLIP framed TCP: -l slip:PORT, -s osc.slip://HOST:PORT.")
+
+    output_group.add_argument("--osc-bundle",
+                              dest="osc_bundle",
+                              type=float,
+                              metavar="SECONDS",
+                              help="Send OSC output in bundles of the messages within SECONDS of each other (0 for messages with the same timestamp).")
     output_group.add_argument("-F", "--output-muse-file",
                               help="Output to a Muse file",
                               metavar="FILE")
     output_group.add_argument("-M", "--output-matlab-file",
                               help="Output to a Matlab file",
                               metavar="FILE")
+    output_group.add_argument("--stream-matlab",
+                              action="store_true",
+                              default=False,
+                              help="Append Matlab output to the file as it arrives instead of keeping it in memory. Long sessions then produce one file instead of several.")
     output_group.add_argument("-O", "--output-oscreplay-file",
-                              help="Output to an OSC-replay file",
+                              help="Output to an OSC-replay file, compressed on a background thread if FILE ends in .gz, .bz2 or .xz",
+                              metavar="FILE")
+    output_group.add_argument("-B", "--output-oscbinary-file",
+                              help="Output to a binary OSC-replay file, with its index next to it (FILE.idx)",
                               metavar="FILE")
     output_group.add_argument("-C", "--output-csv-file",
-                              help="Output to an CSV file",
+                              help="Output to an CSV file, compressed on a background thread if FILE ends in .gz, .bz2 or .xz",
                               metavar="FILE")
+    output_group.add_argument("--csv-wide",
+                              action="store_true",
+                              dest="csv_wide",
+                              default=False,
+                              help="Write -C as one file per path with one row per sample and a column per channel (out.csv becomes out_muse_eeg.csv, out_muse_acc.csv, ...), ready for pandas.read_csv.")
     output_group.add_argument("-D", "--output-screen-dump",
                               help="Output to the screen directly",
                               action='store_true')
 
     args = parser.parse_args()
 
+    output_filters = {}
+    for output_filter in args.output_filters or []:
+        if output_filter[0] not in OUTPUT_NAMES or len(output_filter) < 2:
+            parser.error("--output-filter takes an output (" + ", ".join(OUTPUT_NAMES) + ") and one or more patterns")
+        output_filters.setdefault(output_filter[0], []).extend(output_filter[1:])
+
+    overflow = {}
+    for output_overflow in args.overflow or []:
+        if output_overflow[0] not in OUTPUT_NAMES or len(output_overflow) < 2 or output_overflow[1] not in POLICIES:
+            parser.error("--overflow takes an output (" + ", ".join(OUTPUT_NAMES) + ") and a policy (" + ", ".join(POLICIES) + ")")
+        overflow[output_overflow[0]] = output_overflow[1:]
+    if overflow:
+        args.output_threads = True
+    output_workers = []
+
+    def add_output(listener, name):
+        if args.output_threads:
+            policy = overflow.get(name, [BLOCK])
+            listener = ListenerWorker(listener, name, args.output_queue_capacity, policy[0], policy[1:])
+            output_workers.append(listener)
+        output_handler.add_listener(listener, output_filters.get(name))
+
+    output_fanout = ProcessFanout()
+
+    def add_file_output(name, writer_class, *writer_args):
+        if args.split_sources:
+            writer_args = (writer_class,) + writer_args
+            writer_class = SourceSplitter
+        if args.output_processes:
+            output_fanout.add_writer(name, writer_class, writer_args, output_filters.get(name))
+            return None
+        writer = writer_class(*writer_args)
+        add_output(writer, name)
+        return writer
+
     if args.no_time_data:
         utilities.DisplayPlayback.output_timing = False
 
@@ -172,18 +318,20 @@ Examples:
     if args.input_osc_port:
         print args.input_osc_port
         valid_options = ['udp', 'tcp']
+        if args.osc_transport == 'native':
+            valid_options.append('slip')
         if len(args.input_osc_port.split(':')) == 1:
             if args.input_osc_port.lower() in valid_options:
                 print "  * OSC port: {}:5000 (Hit Control-C to stop)".format(
                     args.input_osc_port)
-            elif args.input_osc_port.isdigit():
+            elif OSCListener.parse_ports(args.input_osc_port):
                 print "  * OSC port: tcp:{} (Hit Control-C to stop)".format(
                     args.input_osc_port)
             else:
                 err = (
                     "Input error: You specified OSC listening at '{}' "
-                    "tcp:port and udp:port are the only valid options"
-                    ).format(args.input_osc_port)
+                    "{} are the only valid options"
+                    ).format(args.input_osc_port, " and ".join(option + ":port" for option in valid_options))
                 print >>sys.stderr, err
                 sys.exit(1)
         else:
@@ -191,12 +339,12 @@ Examples:
             type = port_options[0]
             if not (type.lower() in valid_options):
                 err = (
-                    "Input port type error: You specified '{}' tcp "
-                    "and udp are the only valid options"
-                    ).format(port_options[0].lower())
+                    "Input port type error: You specified '{}' {} "
+                    "are the only valid options"
+                    ).format(port_options[0].lower(), " and ".join(valid_options))
                 print >>sys.stderr, err
                 sys.exit(1)
-            elif port_options[1].isdigit():
+            elif OSCListener.parse_ports(port_options[1]):
                 print "  * OSC port: {} (Hit Control-C to stop)".format(
                     args.input_osc_port)
             else:
@@ -207,14 +355,15 @@ Examples:
 
                 args.input_osc_port = port_options[0] + ':' + str(5000)
                 print "  * OSC port: " + args.input_osc_port + " (Hit Control-C to stop)"
-        input_handler = OSCListener(queue, args.input_osc_port)
+        input_handler = OSCListener(queue, args.input_osc_port, args.batch,
+                                    OSCTransport() if args.osc_transport == 'native' else None)
 
     elif args.input_muse_files:
-        input_handler = MuseProtoBufFileReader(queue)
+        input_handler = MuseProtoBufFileReader(queue, args.queue_capacity, args.batch, args.start, args.end, args.workers)
         print "  * Muse file(s): " + str(args.input_muse_files)
     elif args.input_oscreplay_files:
         print args.input_oscreplay_files
-        input_handler = MuseOSCFileReader(queue)
+        input_handler = MuseOSCFileReader(queue, args.queue_capacity, args.workers, args.start, args.end)
         parsing_streaming_input_thread = threading.Thread(target=input_handler.parse_files, args=[args.input_oscreplay_files])
         parsing_streaming_input_thread.daemon = True
         print "  * OSC file(s): " + str(args.input_oscreplay_files)
@@ -224,31 +373,37 @@ Examples:
     output_handler = OutputHandler(queue)
     if args.output_oscreplay_file:
         print "  * OSC-replay file: " + str(args.output_oscreplay_file)
-        osc_writer = OSCFileWriter(args.output_oscreplay_file)
-        output_handler.add_listener(osc_writer)
+        add_file_output('oscreplay', OSCFileWriter, args.output_oscreplay_file)
+    if args.output_oscbinary_file:
+        print "  * Binary OSC-replay file: " + str(args.output_oscbinary_file)
+        add_file_output('oscbinary', OSCBinaryFileWriter, args.output_oscbinary_file)
     if args.output_csv_file:
         print "  * CSV file: " + str(args.output_csv_file)
-        csv_writer = CSVFileWriter(args.output_csv_file)
-        output_handler.add_listener(csv_writer)
+        add_file_output('csv', CSVWideFileWriter if args.csv_wide else CSVFileWriter, args.output_csv_file)
     if args.output_muse_file:
         print "  * Muse file: " + str(args.output_muse_file)
-        proto_writer = ProtoBufFileWriter(args.output_muse_file)
-        output_handler.add_listener(proto_writer)
+        add_file_output('muse', ProtoBufFileWriter, args.output_muse_file)
     if args.output_osc_url:
-        print "  * OSC output stream URL: " + str(args.output_osc_url)
-        osc_sender = OSCMessageWriter(args.output_osc_url)
-        output_handler.add_listener(osc_sender)
+        for destination in args.output_osc_url:
+            print "  * OSC output stream URL: " + str(destination)
+        osc_sender = OSCMessageWriter(args.output_osc_url, args.osc_bundle,
+                                      OSCTransport() if args.osc_transport == 'native' else None)
+        add_output(osc_sender, 'osc')
     if args.output_matlab_file:
         print "  * Matlab output file: " + str(args.output_matlab_file)
-        matlab_writer = MatlabWriter(args.output_matlab_file)
-        output_handler.add_listener(matlab_writer)
+        matlab_writer = add_file_output('matlab', MatlabWriter, args.output_matlab_file, args.stream_matlab)
 
-    total_output_types = int(bool(args.output_csv_file)) + int(bool(args.output_oscreplay_file)) + int(bool(args.output_muse_file)) + int(bool(args.output_osc_url)) + int(bool(args.output_matlab_file))
+    total_output_types = int(bool(args.output_csv_file)) + int(bool(args.output_oscreplay_file)) + int(bool(args.output_oscbinary_file)) + int(bool(args.output_muse_file)) + int(bool(args.output_osc_url)) + int(bool(args.output_matlab_file))
     if total_output_types == 0 or args.output_screen_dump:
         print "  * Screen output mode"
         utilities.DisplayPlayback.screen_dump = True
         screen_writer = ScreenWriter()
-        output_handler.add_listener(screen_writer)
+        add_output(screen_writer, 'screen')
+
+    if len(output_fanout):
+        # fork the writer processes before the input threads start
+        output_fanout.start_writers(args.verbose, args.filter_data)
+        output_handler.add_listener(output_fanout)
 
     if args.input_muse_files:
         parsing_streaming_input_thread = threading.Thread(target=input_handler.parse_files, args=[args.input_muse_files, args.verbose, args.as_fast_as_possible, args.jump_data_gaps])
@@ -292,6 +447,13 @@ Examples:
             done = True
             break
 
+    if args.verbose and (args.input_muse_files or args.input_oscreplay_files):
+        for name, stats in input_handler.channel_stats():
+            print BoundedChannel.format_stats(name, stats)
+    if args.verbose:
+        for worker in output_workers:
+            print ListenerWorker.format_stats(worker.name, worker.stats())
+
     data_parsed = 0
     data_in = 0
     data_out = 0
@@ -299,11 +461,17 @@ Examples:
         data_parsed = input_handler.events_added_by_threads
         data_in = input_handler.added_to_queue_events
         if args.output_matlab_file:
-            data_out = matlab_writer.data_written
+            if matlab_writer is None:
+                data_out = output_fanout.results.get('matlab', {}).get('data_written', 0)
+            else:
+                data_out = matlab_writer.data_written
             if not data_in == data_out:
                 print 'Input Output size mismatch:'
                 print 'Data in: ' + str(data_in) + ' Data out: ' + str(data_out) + " File: " + str(args.input_muse_files)
 
 # If invoked as a script
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.exit(batch_converter.run(sys.argv[2:]))
     run_()
@@ -15,6 +15,7 @@ import struct
 import json
 import google.protobuf.internal.containers
 import output_handler
+from muse_chunk_scanner import MuseChunkScanner
 
 # Catch Control-C interrupt and cancel
 def ix_signal_handler(signum, frame):
@@ -40,34 +41,24 @@ class MuseProtoBufReaderV2(object):
         self.add_done()
 
     def parse(self):
-        while True:
-            # (1) Read the message header
-            header_bin = self.infile.read(4)
-            # check for EOF
-            if len(header_bin) == 0:
+        scanner = MuseChunkScanner(self.infile)
+        for chunk in scanner:
+            # (1) Check the chunk header
+            if chunk.version != 2:
+                print 'This script only supports Muse files version 2. Parsed: ' + str(chunk.version) + ' expected 2'
                 break
-
-            header = struct.unpack("<i", header_bin)
-            msg_length = header[0]
-            msg_type = self.infile.read(2)
-            msg_type = struct.unpack("<h", msg_type)
-            msg_type = msg_type[0]
-            if msg_type != 2:
-                print 'This script only supports Muse files version 2. Parsed: ' + str(msg_type) + ' expected 2'
-                break
-
-            # (2) Read and parse the message
-            msg_bin = self.infile.read(msg_length)
-            if len(msg_bin) != msg_length:
-                print 'Corrupted file, length mismatch. Reporting length: ' + str(len(msg_bin)) + ' expected: ' + str(msg_length)
+            if not chunk.is_complete():
+                print 'Corrupted file, length mismatch. Reporting length: ' + str(len(chunk.payload)) + ' expected: ' + str(chunk.length)
                 break
 
+            # (2) Parse the message in place
             muse_data_collection = MuseDataCollection()
-            muse_data_collection.ParseFromString(msg_bin)
+            muse_data_collection.ParseFromString(chunk.payload)
 
             # (3) Process this chunk of data
             for obj in muse_data_collection.collection:
                 self.handle_data(obj)
+        scanner.close()
 
     def add_done(self):
         self.matlabWriter.receive_msg([self.__timestamp + 0.001, 'done'])
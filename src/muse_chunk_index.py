@@ -0,0 +1,193 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Chunk index for .muse files.
+
+The index is stored next to the recording as <file>.muse.idx and maps every
+chunk's byte offset to the first and last timestamps it holds, the
+datatypes present and the config_id active at its start. It is built the
+first time a file is read with a time range and rebuilt whenever the size
+or modification time of the recording no longer match.
+
+With it MuseProtoBufFileReader can start playback in the middle of a long
+session by bisecting the chunk list instead of parsing from byte zero.
+"""
+
+import bisect
+import json
+import os
+
+from Muse_v2 import MuseDataCollection, MuseData
+from muse_chunk_scanner import MuseChunkScanner
+
+INDEX_FORMAT = 1
+INDEX_SUFFIX = '.idx'
+
+# Datatypes that describe the session rather than samples. They are replayed
+# from the chunks before a seek point so the outputs still get them.
+METADATA_DATATYPES = frozenset([MuseData.CONFIG, MuseData.VERSION, MuseData.COMPUTING_DEVICE])
+
+
+def index_file_name(file_name):
+    return file_name + INDEX_SUFFIX
+
+
+class ChunkEntry(object):
+    """
+    Index entry of one chunk.
+
+    first and last are the smallest and largest timestamps in the chunk, so
+    the entry stays correct for chunks whose samples are not time ordered.
+    """
+    __slots__ = ('offset', 'first', 'last', 'datatypes', 'config_id')
+
+    def __init__(self, offset, first, last, datatypes, config_id):
+        self.offset = offset
+        self.first = first
+        self.last = last
+        self.datatypes = datatypes
+        self.config_id = config_id
+
+    def to_list(self):
+        return [self.offset, self.first, self.last, self.datatypes, self.config_id]
+
+
+class ChunkRange(object):
+    """
+    The chunks to read for a time range.
+
+    preamble holds the offsets of the chunks before the range that carry the
+    most recent metadata (config, version, device); offset is the first
+    chunk to read and stop the first chunk not to read (None for the end of
+    the file).
+    """
+    def __init__(self, preamble, offset, stop):
+        self.preamble = preamble
+        self.offset = offset
+        self.stop = stop
+
+
+class MuseChunkIndex(object):
+    def __init__(self, file_size, mtime, chunks):
+        self.file_size = file_size
+        self.mtime = mtime
+        self.chunks = chunks
+        # Running maximum of the last timestamps and running minimum (from
+        # the end) of the first timestamps: both are sorted, so the bounds of
+        # a time range can be bisected.
+        self.__latest = []
+        latest = float('-inf')
+        for chunk in chunks:
+            latest = max(latest, chunk.last)
+            self.__latest.append(latest)
+        self.__earliest_after = [0] * len(chunks)
+        earliest = float('inf')
+        for i in reversed(range(len(chunks))):
+            earliest = min(earliest, chunks[i].first)
+            self.__earliest_after[i] = earliest
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def first_timestamp(self):
+        if not self.chunks:
+            return None
+        return self.__earliest_after[0]
+
+    def last_timestamp(self):
+        if not self.chunks:
+            return None
+        return self.__latest[-1]
+
+    def seek(self, start=None, end=None):
+        "Return the ChunkRange covering the timestamps in [start, end]."
+        first = 0
+        if start is not None:
+            first = bisect.bisect_left(self.__latest, start)
+        stop = len(self.chunks)
+        if end is not None:
+            stop = max(first, bisect.bisect_right(self.__earliest_after, end))
+
+        # (1) latest chunk before the range that carries each metadata datatype
+        preamble = set()
+        missing = set(METADATA_DATATYPES)
+        for chunk in reversed(self.chunks[:first]):
+            found = missing.intersection(chunk.datatypes)
+            if found:
+                preamble.add(chunk.offset)
+                missing -= found
+                if not missing:
+                    break
+
+        # (2) range of chunks to read
+        if first < len(self.chunks):
+            offset = self.chunks[first].offset
+        else:
+            offset = None
+        if stop < len(self.chunks):
+            stop_offset = self.chunks[stop].offset
+        else:
+            stop_offset = None
+        return ChunkRange(sorted(preamble), offset, stop_offset)
+
+    @staticmethod
+    def build(file_name):
+        "Index a version 2 .muse file by decoding each chunk once."
+        chunks = []
+        with open(file_name, 'rb') as in_stream:
+            stat = os.fstat(in_stream.fileno())
+            scanner = MuseChunkScanner(in_stream, 0)
+            for chunk in scanner:
+                if chunk.version != 2 or not chunk.is_complete():
+                    break
+                muse_data_collection = MuseDataCollection()
+                muse_data_collection.ParseFromString(chunk.payload)
+                collection = muse_data_collection.collection
+                if len(collection) == 0:
+                    continue
+                timestamps = [md.timestamp for md in collection]
+                datatypes = sorted(set(md.datatype for md in collection))
+                chunks.append(ChunkEntry(chunk.offset, min(timestamps), max(timestamps),
+                                         datatypes, collection[0].config_id))
+            scanner.close()
+        return MuseChunkIndex(stat.st_size, stat.st_mtime, chunks)
+
+    @staticmethod
+    def load(file_name):
+        "Return the index stored next to file_name, or None if it is missing or stale."
+        try:
+            stat = os.stat(file_name)
+            with open(index_file_name(file_name), 'r') as index_file:
+                stored = json.load(index_file)
+        except (EnvironmentError, ValueError):
+            return None
+        if (stored.get('format') != INDEX_FORMAT or stored.get('size') != stat.st_size
+                or stored.get('mtime') != stat.st_mtime):
+            return None
+        return MuseChunkIndex(stored['size'], stored['mtime'],
+                              [ChunkEntry(*entry) for entry in stored['chunks']])
+
+    def save(self, file_name):
+        stored = {
+            'format': INDEX_FORMAT,
+            'size': self.file_size,
+            'mtime': self.mtime,
+            'chunks': [chunk.to_list() for chunk in self.chunks],
+        }
+        with open(index_file_name(file_name), 'w') as index_file:
+            json.dump(stored, index_file)
+
+    @staticmethod
+    def load_or_build(file_name, verbose=False):
+        index = MuseChunkIndex.load(file_name)
+        if index is not None:
+            return index
+        if verbose:
+            print "Indexing file", file_name
+        index = MuseChunkIndex.build(file_name)
+        try:
+            index.save(file_name)
+        except EnvironmentError as err:
+            # a read-only directory only costs the next run a rebuild
+            if verbose:
+                print "Could not write index " + index_file_name(file_name) + ": " + str(err)
+        return index
@@ -0,0 +1,133 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Framing layer for .muse files.
+
+A .muse file is a sequence of chunks, each a little-endian int32 payload
+length, an int16 file format version and a serialized MuseDataCollection.
+This module walks that framing for the version 1 and 2 readers,
+muse_data_handler and muse-to-mat.py.
+"""
+
+import mmap
+import os
+import struct
+
+from input_stream import peek
+
+HEADER = struct.Struct("<ih")
+
+
+class MuseChunk(object):
+    """
+    One framed chunk.
+
+    payload is a read-only buffer over the file mapping when the file could
+    be mapped, so handing it to ParseFromString does not copy it. It is
+    shorter than length when the file is truncated.
+    """
+    __slots__ = ('offset', 'version', 'length', 'payload')
+
+    def __init__(self, offset, version, length, payload):
+        self.offset = offset
+        self.version = version
+        self.length = length
+        self.payload = payload
+
+    def is_complete(self):
+        return len(self.payload) == self.length
+
+    def end(self):
+        "Offset of the next chunk."
+        return self.offset + HEADER.size + self.length
+
+
+class MuseChunkScanner(object):
+    """
+    Iterates the chunks of a .muse stream.
+
+    Regular files are memory-mapped once and scanned in place, so a whole
+    file costs one mapping instead of three reads per chunk. Streams that
+    cannot be mapped (pipes, empty files) fall back to reading the header
+    and payload of every chunk.
+    """
+    def __init__(self, in_stream, offset=None):
+        self.in_stream = in_stream
+        self._map = None
+        if offset is None:
+            offset = self._tell()
+        self.offset = offset
+        try:
+            self._map = mmap.mmap(in_stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError, mmap.error):
+            self._map = None
+
+    def _tell(self):
+        try:
+            return self.in_stream.tell()
+        except (AttributeError, EnvironmentError):
+            return 0
+
+    def is_mapped(self):
+        return self._map is not None
+
+    def size(self):
+        if self._map is not None:
+            return len(self._map)
+        try:
+            return os.fstat(self.in_stream.fileno()).st_size
+        except (AttributeError, EnvironmentError, ValueError):
+            return None
+
+    def read_chunk(self, offset):
+        "Return the single chunk at offset, None past the end of the file."
+        if self._map is not None:
+            if offset + HEADER.size > len(self._map):
+                return None
+            length, version = HEADER.unpack_from(self._map, offset)
+            start = offset + HEADER.size
+            available = max(0, min(length, len(self._map) - start))
+            return MuseChunk(offset, version, length, buffer(self._map, start, available))
+        self.in_stream.seek(offset)
+        header_bin = self.in_stream.read(HEADER.size)
+        if len(header_bin) < HEADER.size:
+            return None
+        length, version = HEADER.unpack(header_bin)
+        return MuseChunk(offset, version, length, self.in_stream.read(length))
+
+    def __iter__(self):
+        if self._map is not None:
+            return self._mapped_chunks()
+        return self._streamed_chunks()
+
+    def _mapped_chunks(self):
+        chunk = self.read_chunk(self.offset)
+        while chunk is not None:
+            self.offset = chunk.end()
+            yield chunk
+            chunk = self.read_chunk(self.offset)
+
+    def _streamed_chunks(self):
+        if self.offset != self._tell():
+            self.in_stream.seek(self.offset)
+        while True:
+            header_bin = self.in_stream.read(HEADER.size)
+            if len(header_bin) < HEADER.size:
+                return
+            length, version = HEADER.unpack(header_bin)
+            payload = self.in_stream.read(length)
+            chunk = MuseChunk(self.offset, version, length, payload)
+            self.offset = chunk.end()
+            yield chunk
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def read_version(in_stream):
+    "Return the version of the first chunk without consuming the stream, None for an empty stream."
+    header_bin = peek(in_stream, HEADER.size)
+    if len(header_bin) < HEADER.size:
+        return None
+    return HEADER.unpack(header_bin)[1]
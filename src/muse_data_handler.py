@@ -2,6 +2,7 @@ import struct
 import sys
 import Muse_V1 as Muse_pb1
 import Muse_V2 as Muse_pb2
+from muse_chunk_scanner import MuseChunkScanner
 
 
 # Parses serialized binary data stream and calls corresponding handler function based on data type
@@ -33,34 +34,26 @@ class MuseProtoBufDataHandler(object):
 
     @staticmethod
     def __parse(in_stream, callback, mtype):
-        while True:
-            # (1) Read the message header
-            header_bin = in_stream.read(4)
-            # check for EOF
-            if len(header_bin) == 0:
-                break
-
-            header = struct.unpack("<i", header_bin)
-            msg_length = header[0]
-            msg_type = in_stream.read(2)
-            mtype.append(msg_type)            
-
-            if msg_type == 1:
-                # (2) Read and parse the message
-                msg_bin = in_stream.read(msg_length)
+        scanner = MuseChunkScanner(in_stream)
+        for chunk in scanner:
+            # (1) Pick the message type from the chunk header
+            mtype.append(chunk.version)
+
+            if chunk.version == 1:
+                # (2) Parse the message in place
                 muse_data_collection = Muse_pb1.MuseDataCollection()
-                muse_data_collection.ParseFromString(msg_bin)
+                muse_data_collection.ParseFromString(chunk.payload)
 
                 # (3) Process this chunk of data
                 callback(muse_data_collection.collection)
-            elif msg_type == 2:
-                # (2) Read and parse the message
-                msg_bin = in_stream.read(msg_length)
+            elif chunk.version == 2:
+                # (2) Parse the message in place
                 muse_data_collection = Muse_pb2.MuseDataCollection()
-                muse_data_collection.ParseFromString(msg_bin)
+                muse_data_collection.ParseFromString(chunk.payload)
 
                 # (3) Process this chunk of data
                 callback(muse_data_collection.collection)
+        scanner.close()
 
     # dispatch based on data type
     def __handle_data(self, md, mtype):
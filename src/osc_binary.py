@@ -0,0 +1,112 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Binary OSC-replay files.
+
+The text OSC-replay format prints every argument and has to be tokenized
+again to be read. A binary replay file stores each message as the OSC packet
+itself, so any path and type list round trips exactly:
+
+    header   'OSCB', format version (uint16 little endian), 2 bytes padding
+    record   timestamp (float64 little endian), packet size (uint32 little
+             endian), the OSC packet (osc_codec)
+
+The writer also saves an index next to the file (<file>.idx) with the
+offset of the first record of every INDEX_INTERVAL seconds, so playback can
+start in the middle of a long capture.
+"""
+
+import bisect
+import json
+import os
+import struct
+
+from input_stream import peek
+
+MAGIC = 'OSCB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH2x')
+RECORD_HEADER = struct.Struct('<dI')
+
+INDEX_FORMAT = 1
+INDEX_SUFFIX = '.idx'
+# Seconds of recording between index entries
+INDEX_INTERVAL = 1.0
+
+
+def is_binary(file_handle):
+    "True if the file starts with the binary replay header. Leaves the header unread."
+    return peek(file_handle, len(MAGIC)) == MAGIC
+
+
+def header():
+    return HEADER.pack(MAGIC, FORMAT_VERSION)
+
+
+def record(timestamp, packet):
+    return RECORD_HEADER.pack(timestamp, len(packet)) + packet
+
+
+def read_records(file_handle, offset=None):
+    """
+    Yields (timestamp, packet) for the records of the file, from offset if set.
+
+    Raises ValueError for a file that is not a binary replay file. A
+    truncated last record (a capture that was cut short) ends the file.
+    """
+    magic, version = HEADER.unpack(file_handle.read(HEADER.size) or '\0' * HEADER.size)
+    if magic != MAGIC or version > FORMAT_VERSION:
+        raise ValueError("Not a binary OSC-replay file (version %d or older)" % FORMAT_VERSION)
+    if offset is not None:
+        file_handle.seek(offset)
+    while True:
+        data = file_handle.read(RECORD_HEADER.size)
+        if len(data) < RECORD_HEADER.size:
+            return
+        timestamp, size = RECORD_HEADER.unpack(data)
+        packet = file_handle.read(size)
+        if len(packet) < size:
+            return
+        yield timestamp, packet
+
+
+def index_file_name(file_name):
+    return file_name + INDEX_SUFFIX
+
+
+class BinaryIndex(object):
+    "Offsets of the records of a binary replay file by time."
+    def __init__(self, entries=None, file_size=None):
+        self.entries = entries or []
+        self.file_size = file_size
+        self.__next = None
+
+    def add(self, timestamp, offset):
+        if self.__next is None or timestamp >= self.__next:
+            self.entries.append((timestamp, offset))
+            self.__next = timestamp + INDEX_INTERVAL
+
+    @property
+    def first_timestamp(self):
+        return self.entries[0][0] if self.entries else None
+
+    def offset(self, timestamp):
+        "Offset of a record at or before the first record at timestamp."
+        position = bisect.bisect_right([entry[0] for entry in self.entries], timestamp) - 1
+        return self.entries[max(position, 0)][1] if self.entries else None
+
+    def save(self, file_name):
+        with open(index_file_name(file_name), 'w') as file_handle:
+            json.dump({'format': INDEX_FORMAT, 'file_size': os.path.getsize(file_name),
+                       'entries': self.entries}, file_handle)
+
+    @staticmethod
+    def load(file_name):
+        "The index of file_name, or None if it has none or it does not match the file."
+        try:
+            with open(index_file_name(file_name)) as file_handle:
+                data = json.load(file_handle)
+        except (IOError, ValueError):
+            return None
+        if data.get('format') != INDEX_FORMAT or data.get('file_size') != os.path.getsize(file_name):
+            return None
+        return BinaryIndex([tuple(entry) for entry in data['entries']], data['file_size'])
@@ -0,0 +1,192 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+OSC 1.0 packets encoded and decoded in Python, and their framing on streams.
+
+Used by osc_transport, which sends and receives OSC without liblo. Decoded
+messages are (timetag, path, types, args) with the values liblo hands to its
+callbacks. timetag is a float counting seconds from 1900 like liblo's, or
+None for a message that is not in a bundle. Streams carry packets either
+length-prefixed (OSC 1.0, as liblo does over TCP) or SLIP-encoded (OSC 1.1).
+"""
+
+import struct
+
+BUNDLE_TAG = '#bundle\0'
+
+# The 'immediately' timetag
+IMMEDIATELY = 1.0 / 2 ** 32
+
+_FIXED_FORMATS = {'i': '>i', 'f': '>f', 'd': '>d', 'h': '>q', 'r': '>I'}
+_NO_DATA = {'T': True, 'F': False, 'N': None, 'I': float('inf')}
+
+
+def _padding(length):
+    return '\0' * (3 - (length & 3))
+
+
+def encode_string(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value + '\0' + _padding(len(value))
+
+
+def encode_blob(value):
+    value = str(bytearray(value))
+    return struct.pack('>i', len(value)) + value + '\0' * (-len(value) & 3)
+
+
+def encode_timetag(timetag):
+    seconds = int(timetag)
+    return struct.pack('>II', seconds, int((timetag - seconds) * 2 ** 32))
+
+
+def encode_message(path, types, args):
+    "The OSC message for path with the given type tags and arguments."
+    parts = [encode_string(path), encode_string(',' + types)]
+    for osc_type, arg in zip(types, args):
+        fixed = _FIXED_FORMATS.get(osc_type)
+        if fixed is not None:
+            parts.append(struct.pack(fixed, arg))
+        elif osc_type in 'sS':
+            parts.append(encode_string(arg if isinstance(arg, basestring) else str(arg)))
+        elif osc_type == 'b':
+            parts.append(encode_blob(arg))
+        elif osc_type == 'c':
+            parts.append(struct.pack('>i', ord(arg)))
+        elif osc_type == 't':
+            parts.append(encode_timetag(arg))
+        elif osc_type == 'm':
+            parts.append(struct.pack('>4B', *arg))
+        elif osc_type not in _NO_DATA:
+            raise ValueError("Unsupported OSC type: " + osc_type)
+    return ''.join(parts)
+
+
+def encode_bundle(timetag, elements):
+    "The OSC bundle holding the encoded messages (or bundles) in elements."
+    parts = [BUNDLE_TAG, encode_timetag(timetag)]
+    for element in elements:
+        parts.append(struct.pack('>i', len(element)))
+        parts.append(element)
+    return ''.join(parts)
+
+
+def _read_string(data, offset):
+    end = data.index('\0', offset)
+    return data[offset:end], (end + 4) & ~3
+
+
+def _read_timetag(data, offset):
+    seconds, fraction = struct.unpack_from('>II', data, offset)
+    return seconds + fraction / float(2 ** 32)
+
+
+def decode_message(data):
+    "(path, types, args) of an encoded OSC message."
+    path, offset = _read_string(data, 0)
+    if offset >= len(data):
+        # messages without type tags are allowed by OSC 1.0
+        return path, '', []
+    types, offset = _read_string(data, offset)
+    if not types.startswith(','):
+        raise ValueError("OSC message without type tags: " + repr(path))
+    types = types[1:]
+    args = []
+    for osc_type in types:
+        fixed = _FIXED_FORMATS.get(osc_type)
+        if fixed is not None:
+            args.append(struct.unpack_from(fixed, data, offset)[0])
+            offset += struct.calcsize(fixed)
+        elif osc_type in 'sS':
+            value, offset = _read_string(data, offset)
+            args.append(value)
+        elif osc_type == 'b':
+            length = struct.unpack_from('>i', data, offset)[0]
+            args.append(data[offset + 4:offset + 4 + length])
+            offset += 4 + ((length + 3) & ~3)
+        elif osc_type == 'c':
+            args.append(chr(struct.unpack_from('>i', data, offset)[0]))
+            offset += 4
+        elif osc_type == 't':
+            args.append(_read_timetag(data, offset))
+            offset += 8
+        elif osc_type == 'm':
+            args.append(struct.unpack_from('>4B', data, offset))
+            offset += 4
+        elif osc_type in _NO_DATA:
+            args.append(_NO_DATA[osc_type])
+        else:
+            raise ValueError("Unsupported OSC type: " + osc_type)
+    if offset > len(data):
+        raise ValueError("Truncated OSC message: " + repr(path))
+    return path, types, args
+
+
+def decode_packet(data, timetag=None):
+    "List of (timetag, path, types, args) for every message in an encoded packet."
+    try:
+        if not data.startswith(BUNDLE_TAG):
+            return [(timetag,) + decode_message(data)]
+        timetag = _read_timetag(data, len(BUNDLE_TAG))
+        messages = []
+        offset = len(BUNDLE_TAG) + 8
+        while offset < len(data):
+            size = struct.unpack_from('>i', data, offset)[0]
+            offset += 4
+            if size < 0 or offset + size > len(data):
+                raise ValueError("Truncated OSC bundle")
+            messages.extend(decode_packet(data[offset:offset + size], timetag))
+            offset += size
+        return messages
+    except (struct.error, IndexError):
+        raise ValueError("Truncated OSC packet")
+
+
+class LengthPrefixFraming(object):
+    "Packets preceded by their size as a 32 bit integer (OSC 1.0 streams)."
+    def __init__(self):
+        self.__buffer = ''
+
+    @staticmethod
+    def encode(packet):
+        return struct.pack('>i', len(packet)) + packet
+
+    def feed(self, data):
+        "Adds received bytes and returns the packets they complete."
+        self.__buffer += data
+        packets = []
+        offset = 0
+        while len(self.__buffer) - offset >= 4:
+            size = struct.unpack_from('>i', self.__buffer, offset)[0]
+            if len(self.__buffer) - offset - 4 < size:
+                break
+            packets.append(self.__buffer[offset + 4:offset + 4 + size])
+            offset += 4 + size
+        self.__buffer = self.__buffer[offset:]
+        return packets
+
+
+class SlipFraming(object):
+    "Packets SLIP encoded, with an END byte on both sides (OSC 1.1 streams)."
+    END = '\xc0'
+    ESC = '\xdb'
+    ESC_END = '\xdc'
+    ESC_ESC = '\xdd'
+
+    def __init__(self):
+        self.__buffer = ''
+
+    @classmethod
+    def encode(cls, packet):
+        escaped = packet.replace(cls.ESC, cls.ESC + cls.ESC_ESC).replace(cls.END, cls.ESC + cls.ESC_END)
+        return cls.END + escaped + cls.END
+
+    def feed(self, data):
+        "Adds received bytes and returns the packets they complete."
+        frames = (self.__buffer + data).split(self.END)
+        self.__buffer = frames.pop()
+        return [frame.replace(self.ESC + self.ESC_END, self.END).replace(self.ESC + self.ESC_ESC, self.ESC)
+                for frame in frames if frame]
+
+
+FRAMINGS = {'tcp': LengthPrefixFraming, 'slip': SlipFraming}
@@ -0,0 +1,61 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Sizes of OSC 1.0 packets, computed from the message fields.
+
+OSC strings are null terminated and padded to a multiple of 4 bytes, blobs
+are a 4 byte length followed by the padded data, and the other argument
+types have a fixed size. This lets the OSC writers check packet size limits
+without encoding the packet or formatting its arguments.
+"""
+
+# "#bundle\0" and the 8 byte timetag
+BUNDLE_HEADER_SIZE = 16
+
+# Each bundle element is preceded by its 4 byte size
+BUNDLE_ELEMENT_OVERHEAD = 4
+
+FIXED_SIZES = {'i': 4, 'f': 4, 'c': 4, 'r': 4, 'm': 4, 'd': 8, 'h': 8, 't': 8,
+               'T': 0, 'F': 0, 'N': 0, 'I': 0}
+
+
+def string_size(length):
+    "Size of an OSC string of length characters: the string, a null and padding."
+    return (length + 4) & ~3
+
+
+def blob_size(length):
+    return 4 + ((length + 3) & ~3)
+
+
+def message_size(path, types, args):
+    "Size of the OSC message for path with the given type tags and arguments."
+    size = string_size(len(path)) + string_size(len(types) + 1)
+    for osc_type, arg in zip(types, args):
+        fixed = FIXED_SIZES.get(osc_type)
+        if fixed is not None:
+            size += fixed
+        elif osc_type == 'b':
+            size += blob_size(len(arg))
+        else:
+            size += string_size(len(arg))
+    return size
+
+
+def bundle_size(message_sizes):
+    "Size of a bundle holding messages of the given sizes."
+    return BUNDLE_HEADER_SIZE + sum(BUNDLE_ELEMENT_OVERHEAD + size for size in message_sizes)
+
+
+# OSC timetags (and liblo's float timetags) count seconds from 1900, Unix time from 1970
+TIMETAG_EPOCH_OFFSET = 2208988800.0
+
+
+def timetag_from_unix(timestamp):
+    return timestamp + TIMETAG_EPOCH_OFFSET
+
+
+def unix_from_timetag(timetag):
+    "Unix time of timetag, or None for the 'immediately' timetag."
+    if timetag < TIMETAG_EPOCH_OFFSET:
+        return None
+    return timetag - TIMETAG_EPOCH_OFFSET
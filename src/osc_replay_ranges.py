@@ -0,0 +1,41 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Newline-aligned byte ranges of OSC-replay files.
+
+Every line of an OSC-replay file is a message of its own, so a large file
+can be cut into ranges that end at line ends and the ranges parsed
+independently, in worker processes, then queued in file order.
+"""
+
+import cStringIO
+import os
+
+# Bytes per range handed to a worker
+RANGE_SIZE = 4 * 1024 * 1024
+
+
+def byte_ranges(file_name, range_size=RANGE_SIZE):
+    "List of (start, stop) offsets covering the file, each stop at the end of a line."
+    size = os.path.getsize(file_name)
+    ranges = []
+    start = 0
+    with open(file_name, 'rb') as file_handle:
+        while start < size:
+            stop = start + range_size
+            if stop < size:
+                file_handle.seek(stop - 1)
+                # a range ends after the newline that ends its last line
+                file_handle.readline()
+                stop = file_handle.tell()
+            else:
+                stop = size
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def read_lines(file_name, start, stop):
+    "Lines of the file between the offsets."
+    with open(file_name, 'rb') as file_handle:
+        file_handle.seek(start)
+        return cStringIO.StringIO(file_handle.read(stop - start)).readlines()
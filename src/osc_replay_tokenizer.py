@@ -0,0 +1,80 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Splitting of OSC-replay lines into their fields.
+
+A line is a timestamp, a path, a type list and the arguments, separated by
+whitespace, with string arguments quoted. split_line gives the same tokens
+as shlex.split (POSIX rules) in one pass: lines without quotes or escapes,
+which are most EEG lines, are split with str.split, and only the others go
+through the quote and escape rules.
+"""
+
+_CONVERTERS = {'f': float, 'd': float, 'i': int}
+
+
+def split_line(line):
+    "Tokens of line, as shlex.split(line) gives them."
+    if "'" not in line and '"' not in line and '\\' not in line:
+        return line.split()
+    return _split_quoted(line.strip())
+
+
+def _split_quoted(line):
+    tokens = []
+    token = []
+    in_token = False
+    quote = None
+    position = 0
+    end = len(line)
+    while position < end:
+        char = line[position]
+        position += 1
+        if quote == "'":
+            # no escapes within single quotes
+            if char == "'":
+                quote = None
+            else:
+                token.append(char)
+        elif quote == '"':
+            if char == '"':
+                quote = None
+            elif char == '\\' and position < end and line[position] in '"\\':
+                token.append(line[position])
+                position += 1
+            else:
+                token.append(char)
+        elif char in ' \t\r\n':
+            if in_token:
+                tokens.append(''.join(token))
+                token = []
+                in_token = False
+        elif char in '\'"':
+            quote = char
+            in_token = True
+        elif char == '\\':
+            if position == end:
+                raise ValueError("No escaped character")
+            token.append(line[position])
+            position += 1
+            in_token = True
+        else:
+            token.append(char)
+            in_token = True
+    if quote is not None:
+        raise ValueError("No closing quotation")
+    if in_token:
+        tokens.append(''.join(token))
+    return tokens
+
+
+def parse_numeric(types, values):
+    "Argument values of a message with numeric types only, or None when it needs the general parser."
+    if len(values) != len(types):
+        # a second type list follows the first arguments
+        return None
+    if not types.strip('fd'):
+        return [float(value) for value in values]
+    try:
+        return [_CONVERTERS[osc_type](value) for osc_type, value in zip(types, values)]
+    except KeyError:
+        return None
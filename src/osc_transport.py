@@ -0,0 +1,221 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+OSC over sockets without liblo, on one asyncore loop.
+
+liblo gives each server a blocking recv and each send a blocking call, so
+every socket needs a thread of its own. Here all the inbound servers and
+outbound clients of an OSCTransport share one asyncore map, served by
+poll(), so one thread handles hundreds of sockets. Packets go over UDP, or
+over TCP length-prefixed (osc.tcp://, liblo compatible) or SLIP-encoded
+(osc.slip://). Encoding and decoding is done by osc_codec.
+"""
+
+import asyncore
+import errno
+import socket
+import time
+
+import osc_codec
+
+PROTOCOLS = ['udp', 'tcp', 'slip']
+
+# Bytes a client buffers for a TCP receiver before sends fail
+MAX_BUFFERED = 4 * 1024 * 1024
+
+# Largest UDP datagram
+MAX_DATAGRAM = 65536
+
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+def parse_url(url):
+    "('udp', host, port) for osc.udp://host:port, likewise for osc.tcp:// and osc.slip://"
+    scheme, separator, location = url.partition('://')
+    protocol = scheme[len('osc.'):] if scheme.startswith('osc.') else scheme
+    host, _, port = location.rstrip('/').rpartition(':')
+    if not separator or protocol not in PROTOCOLS or not port.isdigit():
+        raise ValueError("Not an OSC URL: " + url)
+    return protocol, host or 'localhost', int(port)
+
+
+class UDPServer(asyncore.dispatcher):
+    "Receives datagrams on port and hands each to handler(data, source)."
+    def __init__(self, transport, port, handler, source=None):
+        asyncore.dispatcher.__init__(self, map=transport.map)
+        self.handler = handler
+        self.source = source
+        self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.set_reuse_addr()
+        self.bind(('', port))
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        # take every datagram already waiting
+        while True:
+            try:
+                data = self.socket.recv(MAX_DATAGRAM)
+            except socket.error, err:
+                if err.args[0] in _WOULD_BLOCK:
+                    return
+                raise
+            self.handler(data, self.source)
+
+
+class TCPServer(asyncore.dispatcher):
+    "Accepts stream connections on port and hands each packet they carry to handler(data, source)."
+    def __init__(self, transport, port, handler, source=None, protocol='tcp'):
+        asyncore.dispatcher.__init__(self, map=transport.map)
+        self.transport = transport
+        self.handler = handler
+        self.source = source
+        self.framing = osc_codec.FRAMINGS[protocol]
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(('', port))
+        self.listen(16)
+
+    def writable(self):
+        return False
+
+    def handle_accept(self):
+        accepted = self.accept()
+        if accepted is not None:
+            StreamConnection(self.transport, accepted[0], self.framing(), self.handler, self.source)
+
+
+class StreamConnection(asyncore.dispatcher):
+    def __init__(self, transport, sock, framing, handler, source):
+        asyncore.dispatcher.__init__(self, sock, map=transport.map)
+        self.framing = framing
+        self.handler = handler
+        self.source = source
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        data = self.recv(MAX_DATAGRAM)
+        for packet in self.framing.feed(data):
+            self.handler(packet, self.source)
+
+    def handle_close(self):
+        self.close()
+
+
+class OSCClient(asyncore.dispatcher):
+    """
+    Sends packets to an OSC URL without blocking.
+
+    UDP datagrams are sent at once. Stream packets are buffered and written
+    as the connection accepts them; the connection is (re)opened by the
+    first send after it was lost. send raises IOError when the packet cannot
+    be sent: the host is unreachable, the connection failed since the last
+    send, or the receiver is more than MAX_BUFFERED bytes behind.
+    """
+    def __init__(self, transport, url):
+        asyncore.dispatcher.__init__(self, map=transport.map)
+        self.url = url
+        self.protocol, host, port = parse_url(url)
+        self.destination = (socket.gethostbyname(host), port)
+        self.framing = osc_codec.FRAMINGS.get(self.protocol)
+        self.buffer = ''
+        self.failed = False
+        if self.protocol == 'udp':
+            self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send_packet(self, packet):
+        if self.framing is None:
+            try:
+                self.socket.sendto(packet, self.destination)
+            except socket.error, err:
+                raise IOError(err.args[0], "OSC send to %s failed: %s" % (self.url, err))
+            return
+        if self.failed:
+            self.failed = False
+            raise IOError("OSC connection to %s failed" % self.url)
+        if len(self.buffer) > MAX_BUFFERED:
+            raise IOError("OSC receiver at %s is too slow" % self.url)
+        if self.socket is None:
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                self.connect(self.destination)
+            except socket.error, err:
+                self.close()
+                self.socket = None
+                raise IOError(err.args[0], "OSC connection to %s failed: %s" % (self.url, err))
+        self.buffer += self.framing.encode(packet)
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return bool(self.buffer) and self.socket is not None
+
+    def handle_connect(self):
+        pass
+
+    def handle_write(self):
+        sent = self.send(self.buffer)
+        self.buffer = self.buffer[sent:]
+
+    def handle_close(self):
+        self.close()
+        self.socket = None
+        if self.buffer:
+            self.buffer = ''
+            self.failed = True
+
+    def handle_error(self):
+        self.handle_close()
+
+
+class OSCTransport(object):
+    """
+    The sockets of one loop, with the output interface OSCMessageWriter uses.
+
+    Outbound sends never block, so every destination is served from the
+    thread that sends; inbound servers are served by calling poll.
+    """
+    blocking = False
+
+    def __init__(self):
+        self.map = {}
+
+    @staticmethod
+    def message(path, types, args):
+        return osc_codec.encode_message(path, types, args)
+
+    @staticmethod
+    def bundle(timetag, messages):
+        return osc_codec.encode_bundle(timetag, messages)
+
+    def address(self, url):
+        return OSCClient(self, url)
+
+    def send(self, client, packet):
+        client.send_packet(packet)
+        self.poll(0)
+
+    def listen(self, protocol, port, handler, source=None):
+        if protocol == 'udp':
+            return UDPServer(self, port, handler, source)
+        return TCPServer(self, port, handler, source, protocol)
+
+    def poll(self, timeout):
+        "Serves every socket that is ready, waiting up to timeout seconds for one."
+        if self.map:
+            asyncore.loop(timeout, True, self.map, 1)
+        elif timeout:
+            time.sleep(timeout)
+
+    def flush(self, timeout):
+        "Waits up to timeout seconds for the clients to write what they buffered."
+        give_up_at = time.time() + timeout
+        while time.time() < give_up_at and any(
+                isinstance(channel, OSCClient) and channel.writable() for channel in self.map.values()):
+            self.poll(0.01)
+
+    def close(self):
+        asyncore.close_all(self.map)
@@ -13,12 +13,31 @@ from Muse_v2 import _EEGUNITS
 from Muse_v2 import _ACCELEROMETERUNITS
 import hdf5storage as h5
 import collections
+import compressed_file
 import marker_reconstructor
+import matlab_stream
+from growable_array import GrowableArray
+from path_router import PathRouter
+import path_filter
+import osc_binary
+import osc_codec
+import osc_packet
+from event_batch import EventBatch
 
 class OutputHandler(object):
+    # Listeners that apply the filters given to set_options themselves (per
+    # destination, per source or in other processes) set this and are handed
+    # every message. The others are given no filters: start computes one
+    # verdict per message for each distinct filter before the fan-out, and
+    # only hands them what passes theirs.
+    applies_own_filters = False
+
     def __init__(self, queue):
         self.queue = queue
         self.listeners = []
+        self.__listener_filters = {}
+        self.__routes = None
+        self.__filters = []
         self.__start_time = 0
         self.__done = False
         self.__thread_lock = threading.Lock()
@@ -30,14 +49,43 @@ class OutputHandler(object):
             return self.queue.get()
 
     def broadcast_message(self, msg):
-        for listener in self.listeners:
+        batch = isinstance(msg, EventBatch)
+        routes = self.__routes
+        if routes is None:
+            routes = [(listener, None) for listener in self.listeners]
+        if batch:
+            # the events of each filter, None where none pass
+            selected = [msg.select([listener_filter.matches(column.path) for column in msg.columns])
+                        for listener_filter in self.__filters]
+        elif "done" not in msg:
+            verdicts = [listener_filter.matches(msg[1]) for listener_filter in self.__filters]
+        for listener, index in routes:
+            item = msg
+            if index is not None:
+                if batch:
+                    item = selected[index]
+                    if item is None:
+                        continue
+                elif "done" not in msg and not verdicts[index]:
+                    continue
             self.__thread_lock.acquire()
             if not self.__done:
-                listener.receive_msg(msg)
+                if batch:
+                    listener.receive_batch(item)
+                else:
+                    listener.receive_msg(item)
             self.__thread_lock.release()
 
-    def add_listener(self, listener):
+    # Listeners that can handle a whole EventBatch at once override this.
+    def receive_batch(self, batch):
+        for msg in batch:
+            self.receive_msg(msg)
+
+    # filters (a list of patterns) replaces the filters given to start for this listener only.
+    def add_listener(self, listener, filters=None):
         self.listeners.append(listener)
+        if filters is not None:
+            self.__listener_filters[listener] = filters
 
     def put_done_message(self):
         self.__done = True
@@ -46,23 +94,42 @@ class OutputHandler(object):
             listener.receive_msg('done')
             self.__thread_lock.release()
 
+    # filters is a path_filter.PathFilter (as given to set_options) or a list of patterns.
     @staticmethod
     def path_contains_filter(filters, type):
         if filters == None:
             return True
-        else:
-            for filter in filters:
-                if re.search(filter, type):
-                    return True
-        return False
+        return path_filter.compile_filter(filters).matches(type)
 
     def start(self, filters, verbose=False):
+        # Listeners with the same patterns share a route to one compiled
+        # filter, so broadcast_message checks each message once per distinct
+        # filter however many listeners there are.
+        self.__routes = []
         for listener in self.listeners:
-            listener.set_options(verbose, filters)
+            listener_filter = path_filter.compile_filter(self.__listener_filters.get(listener, filters))
+            if listener.applies_own_filters:
+                listener.set_options(verbose, listener_filter)
+                self.__routes.append((listener, None))
+                continue
+            listener.set_options(verbose, None)
+            if listener_filter is None:
+                self.__routes.append((listener, None))
+                continue
+            if listener_filter not in self.__filters:
+                self.__filters.append(listener_filter)
+            self.__routes.append((listener, self.__filters.index(listener_filter)))
         done = False
 
         while not done:
             msg = self.get_message()
+            if isinstance(msg, EventBatch):
+                if self.__start_time == 0:
+                    self.__start_time = msg.first_timestamp()
+                status = "Sending Data"
+                utilities.DisplayPlayback.playback_time(msg.last_timestamp() - self.__start_time, status)
+                self.broadcast_message(msg)
+                continue
             if self.__start_time == 0:
                 self.__start_time = msg[0]
             if ("done" in msg) or (self.__done == True):
@@ -112,13 +179,21 @@ class ScreenWriter(OutputHandler):
         utilities.DisplayPlayback.print_msg(str(msg[0]) + " " + msg[1] + " " + str(msg[2]) + " " + dataset)
 
 class MatlabWriter(OutputHandler):
-    def __init__(self, out_file):
+    # Path classes returned by route_path
+    RAW_DATA, CONFIG_DATA, ANNOTATION, ELEMENT = range(1, 5)
+
+    # With streaming set, raw data and elements are appended to the file as they
+    # arrive (see matlab_stream) instead of being kept in memory, and the
+    # session is written to a single file.
+    def __init__(self, out_file, streaming=False):
         # the most important part of dataset is now the first dict which contains the main struct, IXDATA
         self.__dataset = {}
         self.__markers = marker_reconstructor.MarkerReconstructor()
         self.set_data_structure()
         self.__value = []
         self.__file_out = out_file
+        self.__stream = matlab_stream.MatlabStream(out_file) if streaming else None
+        self.__routes = PathRouter(self.route_path)
         self.received_data = 0
         self.data_written = 0
         self.files_written = 0
@@ -185,7 +260,10 @@ class MatlabWriter(OutputHandler):
         self.__dataset['IXDATA'][u'markers'] = self.__markers.markers()
         if 'elements' in self.__dataset:
             self.__dataset['elements'] = self.convert_list_to_numpy_list(self.__dataset['elements'])
-        h5.write(self.__dataset, path='/', filename=file_name,  truncate_existing=True, store_python_metadata=True, matlab_compatible=True)
+        if self.__stream is not None:
+            self.__stream.finish(self.__dataset)
+        else:
+            h5.write(self.__dataset, path='/', filename=file_name,  truncate_existing=True, store_python_metadata=True, matlab_compatible=True)
 
         self.files_written += 1
 
@@ -197,11 +275,24 @@ class MatlabWriter(OutputHandler):
                 if isinstance(value, dict):
                     diction = self.convert_list_to_numpy_list(value)
                     dictionary[key] = diction
+                elif isinstance(value, GrowableArray):
+                    dictionary[key] = value.view()
                 elif isinstance(value, list):
                     dictionary[key] = np.array(value)
             return dictionary
 
-    def handle_raw_data(self, osc_path, input_data):
+    # Returns the GrowableArray that holds the rows of dictionary[key], replacing the empty list it starts as.
+    @staticmethod
+    def rows_of(dictionary, key):
+        rows = dictionary.get(key)
+        if not isinstance(rows, GrowableArray):
+            rows = GrowableArray()
+            dictionary[key] = rows
+        return rows
+
+    # Returns the IXDATA.raw keys (type, times, data) for a raw data path.
+    @staticmethod
+    def raw_data_keys(osc_path):
             eeg_data_identifier = ["eeg/quantization", "eeg/dropped", "eeg"]
             acc_data_identifier = ["acc/dropped", "acc"]
             drlref_data_identifier = ["drlref"]
@@ -235,11 +326,32 @@ class MatlabWriter(OutputHandler):
                 time_key = "times"
                 data_key = "val"
 
-            self.__dataset['IXDATA']["raw"][type_key][time_key].append([input_data[0]])
-            data = []
-            for x in input_data[1:]:
-                data.append(float(x))
-            self.__dataset['IXDATA']["raw"][type_key][data_key].append(data)
+            return type_key, time_key, data_key
+
+    # Classifies a path once for the path router. Returns (path class, raw data keys or element name).
+    @staticmethod
+    def route_path(osc_path):
+        raw_data_identifier = ["eeg/quantization", "eeg/dropped", "eeg", "acc/dropped", "acc", "drlref", "muse/batt"]
+        config_identifier = ["muse/config", "muse/version", "muse/device"]
+        if any(identifier in osc_path for identifier in raw_data_identifier):
+            return MatlabWriter.RAW_DATA, tuple(unicode(key) for key in MatlabWriter.raw_data_keys(osc_path))
+        elif any(identifier in osc_path for identifier in config_identifier):
+            return MatlabWriter.CONFIG_DATA, None
+        elif "muse/annotation" in osc_path:
+            return MatlabWriter.ANNOTATION, None
+        elif "/muse/elements" in osc_path:
+            return MatlabWriter.ELEMENT, unicode(osc_path.replace('-', '_')[15:].replace('/', '_'))
+        return None, None
+
+    def handle_raw_data(self, osc_path, input_data):
+            type_key, time_key, data_key = self.__routes.route(osc_path)[1]
+            if self.__stream is not None:
+                self.__stream.append((u'IXDATA', u'raw', type_key, time_key), input_data[:1])
+                self.__stream.append((u'IXDATA', u'raw', type_key, data_key), input_data[1:])
+                return
+            raw = self.__dataset['IXDATA']["raw"][type_key]
+            self.rows_of(raw, time_key).append(input_data[:1])
+            self.rows_of(raw, data_key).append(input_data[1:])
 
     def handle_config_data(self, osc_path, input_data):
             old_format_offset = 6
@@ -296,8 +408,6 @@ class MatlabWriter(OutputHandler):
             return dictionary
 
     def receive_msg(self, msg):
-        raw_data_identifier = ["eeg/quantization", "eeg/dropped", "eeg", "acc/dropped", "acc", "drlref", "muse/batt"]
-        config_identifier = ["muse/config", "muse/version", "muse/device"]
         if "done" in msg:
             self.write_array()
             return
@@ -312,26 +422,71 @@ class MatlabWriter(OutputHandler):
         for x in msg[3]:
             temp.append(x)
         if ('i' in msg[2]) or ('f' in msg[2]) or ('d' in msg[2]) or ('s' in msg[2]):
-            if any(identifier in msg[1] for identifier in raw_data_identifier):
+            path_class, keys = self.__routes.route(msg[1])
+            if path_class == self.RAW_DATA:
                 self.handle_raw_data(msg[1], temp)
-            elif any(identifier in msg[1] for identifier in config_identifier):
+            elif path_class == self.CONFIG_DATA:
                 self.handle_config_data(msg[1], temp)
-            elif "muse/annotation" in msg[1]:
+            elif path_class == self.ANNOTATION:
                 self.handle_annotation(temp[0], temp[1], temp[3] if len(temp) > 3 else None)
-            elif "/muse/elements" in msg[1]:
-                msg[1] = msg[1].replace('-', '_')
-                name = msg[1][15:].replace('/', '_')
-                self.__dataset.setdefault(u'elements', {}).setdefault(unicode(name), []).append(temp)
+            elif path_class == self.ELEMENT:
+                if 's' in msg[2]:
+                    self.__dataset.setdefault(u'elements', {}).setdefault(keys, []).append(temp)
+                elif self.__stream is not None:
+                    self.__stream.append((u'elements', keys), temp)
+                else:
+                    self.rows_of(self.__dataset.setdefault(u'elements', {}), keys).append(temp)
         else:
             if self.__verbose:
                 print "Unknown Data ", msg[1], " ", msg[2], " ", msg[3]
 
         self.received_data += 1
         self.data_written += 1
-        if self.received_data > 36000*30: #Approximately 1 minutes at 500Hz * 30 for 30 minutes files
+        if self.received_data > 36000*30 and self.__stream is None: #Approximately 1 minutes at 500Hz * 30 for 30 minutes files
             self.write_array()
             self.received_data = 0
 
+    # Raw data and elements are appended a column block at a time, everything else goes through receive_msg.
+    def receive_batch(self, batch):
+        for column in batch.columns:
+            count = len(column)
+            if count == 0:
+                continue
+            path = column.path
+            if not column.is_numeric():
+                for msg in column.events():
+                    self.receive_msg(msg)
+                continue
+
+            if self.path_contains_filter(self.__filters, path):
+                path_class, keys = self.__routes.route(path)
+                if path_class == self.RAW_DATA:
+                    type_key, time_key, data_key = keys
+                    if self.__stream is not None:
+                        raw_path = (u'IXDATA', u'raw', type_key)
+                        self.__stream.append_block(raw_path + (time_key,), column.timestamps[:, np.newaxis])
+                        self.__stream.append_block(raw_path + (data_key,), column.values)
+                    else:
+                        raw = self.__dataset['IXDATA']["raw"][type_key]
+                        self.rows_of(raw, time_key).append_block(column.timestamps[:, np.newaxis])
+                        self.rows_of(raw, data_key).append_block(column.values)
+                elif path_class == self.ELEMENT:
+                    rows = np.hstack((column.timestamps[:, np.newaxis], column.values))
+                    if self.__stream is not None:
+                        self.__stream.append_block((u'elements', keys), rows)
+                    else:
+                        self.rows_of(self.__dataset.setdefault(u'elements', {}), keys).append_block(rows)
+                else:
+                    for msg in column.events():
+                        self.receive_msg(msg)
+                    continue
+
+            self.received_data += count
+            self.data_written += count
+            if self.received_data > 36000*30 and self.__stream is None: #Approximately 1 minutes at 500Hz * 30 for 30 minutes files
+                self.write_array()
+                self.received_data = 0
+
 
 
 """class LSLMessageWriter(object):
@@ -374,38 +529,284 @@ class MatlabWriter(OutputHandler):
 """
 
 
+class LibloTransport(object):
+    "OSC output through liblo, whose sends block."
+    blocking = True
+
+    @staticmethod
+    def message(path, types, args):
+        return liblo.Message(path, *args)
+
+    @staticmethod
+    def bundle(timetag, messages):
+        return liblo.Bundle(timetag, *messages)
+
+    @staticmethod
+    def address(url):
+        return liblo.Address(url)
+
+    @staticmethod
+    def send(address, packet):
+        liblo.send(address, packet)
+
+    def flush(self, timeout):
+        pass
+
+
+class OSCDestination(object):
+    """
+    One receiver of OSCMessageWriter: its address, path filter, bundle and send queue.
+
+    Packets that cannot be sent now wait in a bounded queue, the oldest is
+    dropped when it is full. Without a thread the queue is retried, with
+    backoff, whenever a new packet is sent. With start_thread the destination
+    sends from a thread of its own, so a slow receiver only delays itself.
+    transport builds and sends the packets: a LibloTransport or an
+    osc_transport.OSCTransport.
+    """
+    # Packets waiting to be sent, the oldest is dropped when it is full
+    QUEUE_CAPACITY = 10000
+    # First and longest wait between retries, in seconds
+    RETRY_BACKOFF = (0.05, 2.0)
+    # Retries at the end of the session before giving up on the waiting packets
+    RETRIES_WHEN_DONE = 5
+
+    def __init__(self, url, patterns=None, bundle_window=None, transport=None):
+        self.url = url
+        self.patterns = patterns
+        self.filters = None
+        self.__transport = transport or LibloTransport()
+        self.__address = self.__transport.address(url)
+        self.__bundle_window = bundle_window
+        self.__bundle = []
+        self.__bundle_time = None
+        self.__bundle_size = 0
+        self.__queue = collections.deque()
+        self.__retry_at = 0
+        self.__backoff = self.RETRY_BACKOFF[0]
+        self.__lock = threading.Lock()
+        self.__not_empty = threading.Condition(self.__lock)
+        self.__thread = None
+        self.__done = False
+        self.packets_sent = 0
+        self.packets_dropped = 0
+
+    def start_thread(self):
+        self.__thread = threading.Thread(target=self.run, name='OSC output to ' + self.url)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    # message is a packet of size bytes from transport.message, shared by all destinations.
+    def add(self, timestamp, message, size, max_packet_size):
+        if self.__bundle_window is None:
+            self.send(message)
+            return
+        if self.__bundle and (not 0 <= timestamp - self.__bundle_time <= self.__bundle_window
+                              or self.__bundle_size + osc_packet.BUNDLE_ELEMENT_OVERHEAD + size > max_packet_size):
+            self.flush_bundle()
+        if not self.__bundle:
+            self.__bundle_time = timestamp
+            self.__bundle_size = osc_packet.BUNDLE_HEADER_SIZE
+        self.__bundle.append(message)
+        self.__bundle_size += osc_packet.BUNDLE_ELEMENT_OVERHEAD + size
+
+    def flush_bundle(self):
+        if self.__bundle:
+            self.send(self.__transport.bundle(osc_packet.timetag_from_unix(self.__bundle_time), self.__bundle))
+            self.__bundle = []
+
+    # Sends a message or bundle, or queues it. Packets are sent in order,
+    # so while earlier ones wait new ones wait behind them.
+    def send(self, packet):
+        if self.__thread is not None:
+            with self.__lock:
+                self.queue(packet)
+                self.__not_empty.notify()
+        elif self.__queue:
+            self.queue(packet)
+            self.retry()
+        elif not self.try_send(packet):
+            self.queue(packet)
+            self.connection_failed()
+
+    def try_send(self, packet):
+        try:
+            self.__transport.send(self.__address, packet)
+        except IOError:
+            return False
+        self.packets_sent += 1
+        return True
+
+    def queue(self, packet):
+        if len(self.__queue) >= self.QUEUE_CAPACITY:
+            self.__queue.popleft()
+            self.packets_dropped += 1
+        self.__queue.append(packet)
+
+    def connection_failed(self):
+        self.__retry_at = time.time() + self.__backoff
+        status = "Connection to %s failed, retrying in %.2f seconds." % (self.url, self.__backoff)
+        utilities.DisplayPlayback.post_connection_issue(status)
+        self.__backoff = min(self.__backoff * 2, self.RETRY_BACKOFF[1])
+
+    def retry(self):
+        if time.time() < self.__retry_at:
+            return
+        while self.__queue:
+            if not self.try_send(self.__queue[0]):
+                self.connection_failed()
+                return
+            self.__queue.popleft()
+        self.__backoff = self.RETRY_BACKOFF[0]
+
+    # Send loop of the destination thread.
+    def run(self):
+        retries_left = self.RETRIES_WHEN_DONE
+        while True:
+            with self.__lock:
+                while not self.__queue and not self.__done:
+                    self.__not_empty.wait()
+                if not self.__queue:
+                    return
+                packet = self.__queue[0]
+            if self.try_send(packet):
+                self.__backoff = self.RETRY_BACKOFF[0]
+                with self.__lock:
+                    # it may have been dropped to make room while it was sent
+                    if self.__queue and self.__queue[0] is packet:
+                        self.__queue.popleft()
+                continue
+            self.connection_failed()
+            if self.__done:
+                retries_left -= 1
+                if not retries_left:
+                    return
+            time.sleep(max(0, self.__retry_at - time.time()))
+
+    # Sends what is left and waits for it, then drops what could not be sent.
+    def finish(self):
+        self.flush_bundle()
+        if self.__thread is not None:
+            with self.__lock:
+                self.__done = True
+                self.__not_empty.notify()
+            self.__thread.join()
+        else:
+            for _ in range(self.RETRIES_WHEN_DONE):
+                if not self.__queue:
+                    break
+                time.sleep(max(0, self.__retry_at - time.time()))
+                self.__retry_at = 0
+                self.retry()
+            self.__transport.flush(self.RETRY_BACKOFF[1])
+        if self.__queue:
+            self.packets_dropped += len(self.__queue)
+            self.__queue.clear()
+        if self.packets_dropped:
+            utilities.DisplayPlayback.playback_error("OSC output to %s: %d packets could not be sent"
+                                                     % (self.url, self.packets_dropped))
+
+
 class OSCMessageWriter(OutputHandler):
-    def __init__(self, address):
-        self.__address = liblo.Address(address)
+    """
+    Sends the messages to one or more OSC destinations.
+
+    destinations is a URL or a list of destinations, each a URL optionally
+    followed by '#' and comma separated path patterns that replace the
+    output filters for that destination (see parse_destination). Each
+    message is built and measured once and handed to every destination it
+    passes the filter of. With several destinations each one sends from its
+    own thread and queue.
+
+    With bundle_window set (in seconds), messages whose timestamps are
+    within bundle_window of the first one are sent as one OSC bundle,
+    timetagged with that first timestamp.
+
+    transport is a LibloTransport (the default) or an
+    osc_transport.OSCTransport, whose sends do not block; all destinations
+    are then sent to from the output thread.
+    """
+    MAX_PACKET_SIZE = 3000
+    applies_own_filters = True
+
+    def __init__(self, destinations, bundle_window=None, transport=None):
+        if isinstance(destinations, basestring):
+            destinations = [destinations]
+        self.transport = transport or LibloTransport()
+        self.destinations = []
+        for destination in destinations:
+            url, patterns = self.parse_destination(destination)
+            self.destinations.append(OSCDestination(url, patterns, bundle_window, self.transport))
+        self.__filters = None
+
+    @staticmethod
+    def parse_destination(destination):
+        "Split 'osc.udp://host:port#/muse/eeg,/muse/acc' into the URL and a list of patterns (or None)."
+        url, separator, patterns = destination.partition('#')
+        if not separator:
+            return url, None
+        return url, [pattern for pattern in patterns.split(',') if pattern]
+
+    @property
+    def packets_sent(self):
+        return sum(destination.packets_sent for destination in self.destinations)
+
+    @property
+    def packets_dropped(self):
+        return sum(destination.packets_dropped for destination in self.destinations)
 
     def set_options(self, verbose, filters):
         self.__verbose = verbose
         self.__filters = filters
+        for destination in self.destinations:
+            destination.filters = filters if destination.patterns is None else path_filter.compile_filter(destination.patterns)
+        if len(self.destinations) > 1 and self.transport.blocking:
+            for destination in self.destinations:
+                destination.start_thread()
 
     def receive_msg(self, msg):
         if "done" in msg:
+            for destination in self.destinations:
+                destination.finish()
             return
 
-        if not self.path_contains_filter(self.__filters, msg[1]):
+        receivers = [destination for destination in self.destinations
+                     if self.path_contains_filter(destination.filters, msg[1])]
+        if not receivers:
             return
 
-        if len(str(msg[3])) < 3000:
-            try:
-                liblo.send(self.__address, msg[1], *msg[3])
-            except:
-                status = "Connection Failed, retrying in 1 second."
-                utilities.DisplayPlayback.post_connection_issue(status)
-                time.sleep(1)
-                self.receive_msg(msg)
-        else:
-            error_msg = 'A Message is too long for OSC Send: ' + str(len(str(msg[3]))) + " bytes long         "
+        size = osc_packet.message_size(msg[1], msg[2], msg[3])
+        if size > self.MAX_PACKET_SIZE:
+            error_msg = 'A Message is too long for OSC Send: ' + str(size) + " bytes long         "
             utilities.DisplayPlayback.playback_error(error_msg)
+            return
+
+        message = self.transport.message(msg[1], msg[2], msg[3])
+        for destination in receivers:
+            destination.add(msg[0], message, size, self.MAX_PACKET_SIZE)
+
+# Write buffer of the CSV files, so a batch is written in a few large writes
+CSV_BUFFER_SIZE = 1024 * 1024
+
+
+def csv_block(timestamps, values, row_format):
+    """
+    Rows of a numeric column formatted at once: row_format holds the
+    timestamp format and one %s per channel, so floats print as str() does.
+    """
+    if values.dtype.kind == 'f':
+        table = np.column_stack((timestamps, values))
+    else:
+        # an object table keeps the integers exact and printed without '.0'
+        table = np.column_stack((timestamps.astype(object), values.astype(object)))
+    return (row_format * len(timestamps)) % tuple(table.ravel().tolist())
+
 
 class CSVFileWriter(OutputHandler):
     def __init__(self, output_path):
         self.__done_status = False
         try:
-            self.file_handle = open(output_path, 'w')
+            self.file_handle = compressed_file.open_output(output_path, CSV_BUFFER_SIZE)
         except:
             print "Error: Unable to open a file at %s" % output_path
             exit()
@@ -424,6 +825,27 @@ class CSVFileWriter(OutputHandler):
         if not self.path_contains_filter(self.__filters, msg[1]):
             return
 
+        self.write(self.format_msg(msg))
+
+    # Formats the batch a column at a time and writes it once.
+    def receive_batch(self, batch):
+        per_column = []
+        for column in batch.columns:
+            if self.path_contains_filter(self.__filters, column.path):
+                per_column.append(self.format_column(column))
+            else:
+                per_column.append([''] * len(column))
+        self.write("".join(batch.interleave(per_column)))
+
+    @staticmethod
+    def format_column(column):
+        if not column.is_numeric():
+            return [CSVFileWriter.format_msg(msg) for msg in column.events()]
+        row_format = "%.6f, " + column.path.replace("%", "%%") + ", " + ", ".join(["%s"] * len(column.types)) + "\n"
+        return csv_block(column.timestamps, column.values, row_format).splitlines(True)
+
+    @staticmethod
+    def format_msg(msg):
         timestamp = msg[0]
         path = msg[1]
         type = msg[2]
@@ -432,8 +854,9 @@ class CSVFileWriter(OutputHandler):
         else:
             data = ", ".join(str(x) for x in msg[3])
 
-        msg_to_write = ("%.6f" % timestamp)  +  ", "  + path + ", " + data + "\n"
+        return ("%.6f" % timestamp)  +  ", "  + path + ", " + data + "\n"
 
+    def write(self, msg_to_write):
         if (self.file_handle is not None) and (self.__done_status == False):
             self.file_handle.write(msg_to_write)
         elif self.__done_status == True:
@@ -444,11 +867,94 @@ class CSVFileWriter(OutputHandler):
     def close_file(self):
         self.file_handle.close()
 
+class CSVWideFileWriter(OutputHandler):
+    """
+    CSV with one row per sample and one column per channel, in one file per
+    path: out.csv becomes out_muse_eeg.csv, out_muse_acc.csv, ... Each file
+    starts with a header (timestamp, eeg_0, eeg_1, ...) and is separated by
+    plain commas, so it loads directly as a table (e.g. pandas.read_csv).
+    When the number of arguments of a path changes, the rows with the new
+    count go to a file of their own, e.g. out_muse_eeg_6.csv.
+    """
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.__done_status = False
+        self.__files = {}
+        self.__widths = {}
+
+    def set_options(self, verbose, filters):
+        self.__verbose = verbose
+        self.__filters = filters
+
+    @staticmethod
+    def group_file_name(output_path, path, width=None):
+        "out.csv for /muse/eeg is out_muse_eeg.csv, out_muse_eeg_6.csv for the rows of width 6 if that is not its first width."
+        root, extension = compressed_file.splitext(output_path)
+        name = root + '_' + '_'.join(part for part in path.split('/') if part)
+        if width is not None:
+            name += '_' + str(width)
+        return name + extension
+
+    @staticmethod
+    def header(path, width):
+        leaf = path.rstrip('/').rpartition('/')[2] or 'value'
+        return ",".join(['timestamp'] + ['%s_%d' % (leaf, channel) for channel in range(width)]) + "\n"
+
+    def file_for(self, path, width):
+        file_handle = self.__files.get((path, width))
+        if file_handle is None:
+            first_width = self.__widths.setdefault(path, width)
+            file_name = self.group_file_name(self.output_path, path, None if width == first_width else width)
+            try:
+                file_handle = compressed_file.open_output(file_name, CSV_BUFFER_SIZE)
+            except:
+                print "Error: Unable to open a file at %s" % file_name
+                exit()
+            file_handle.write(self.header(path, width))
+            self.__files[(path, width)] = file_handle
+        return file_handle
+
+    def receive_msg(self, msg):
+        if "done" in msg:
+            self.__done_status = True
+            self.close_file()
+            return
+
+        if self.__done_status or not self.path_contains_filter(self.__filters, msg[1]):
+            return
+
+        self.file_for(msg[1], len(msg[3])).write(self.format_row(msg[0], msg[3]))
+
+    # Each column of the batch goes to its file in one block.
+    def receive_batch(self, batch):
+        if self.__done_status:
+            return
+        for column in batch.columns:
+            if not len(column) or not self.path_contains_filter(self.__filters, column.path):
+                continue
+            if column.is_numeric():
+                row_format = "%.6f" + ",%s" * len(column.types) + "\n"
+                self.file_for(column.path, len(column.types)).write(
+                    csv_block(column.timestamps, column.values, row_format))
+            else:
+                for msg in column.events():
+                    self.file_for(msg[1], len(msg[3])).write(self.format_row(msg[0], msg[3]))
+
+    @staticmethod
+    def format_row(timestamp, args):
+        # strings are quoted the CSV way, as they may hold commas
+        values = ['"' + x.rstrip().replace('"', '""') + '"' if isinstance(x, basestring) else str(x) for x in args]
+        return ",".join(["%.6f" % timestamp] + values) + "\n"
+
+    def close_file(self):
+        for file_handle in self.__files.values():
+            file_handle.close()
+
 class OSCFileWriter(OutputHandler):
     def __init__(self, output_path):
         self.__done_status = False
         try:
-            self.file_handle = open(output_path, 'w')
+            self.file_handle = compressed_file.open_output(output_path)
         except:
             print "Error: Unable to open a file at %s" % output_path
             exit()
@@ -466,6 +972,29 @@ class OSCFileWriter(OutputHandler):
         if not self.path_contains_filter(self.__filters, msg[1]):
             return
 
+        self.write(self.format_msg(msg))
+
+    # Formats the batch a column at a time and writes it once.
+    def receive_batch(self, batch):
+        per_column = []
+        for column in batch.columns:
+            if self.path_contains_filter(self.__filters, column.path):
+                per_column.append(self.format_column(column))
+            else:
+                per_column.append([''] * len(column))
+        self.write("".join(batch.interleave(per_column)))
+
+    @staticmethod
+    def format_column(column):
+        if not column.is_numeric():
+            return [OSCFileWriter.format_msg(msg) for msg in column.events()]
+        prefix = " " + column.path + " " + column.types + " "
+        data_format = "".join(" %.6f" if type == 'f' else " %s" for type in column.types) + "\n"
+        return [("%f" % timestamp) + prefix + data_format % tuple(row)
+                for timestamp, row in zip(column.timestamps.tolist(), column.values.tolist())]
+
+    @staticmethod
+    def format_msg(msg):
         timestamp = msg[0]
         path = msg[1]
         types = msg[2]
@@ -481,8 +1010,9 @@ class OSCFileWriter(OutputHandler):
                 data += " " + str(msg[3][position])
             position += 1
 
-        msg_to_write = ("%f" % timestamp)  +  " "  + path + " " + types + " " + data + "\n"
+        return ("%f" % timestamp)  +  " "  + path + " " + types + " " + data + "\n"
 
+    def write(self, msg_to_write):
         if (self.file_handle is not None) and (self.__done_status == False):
             self.file_handle.write(msg_to_write)
         elif self.__done_status == True:
@@ -494,6 +1024,48 @@ class OSCFileWriter(OutputHandler):
         self.file_handle.close()
 
 
+class OSCBinaryFileWriter(OutputHandler):
+    # Writes a binary OSC-replay file (see osc_binary): every message as its
+    # OSC packet. With index set, the index is saved next to the file when done.
+    def __init__(self, output_path, index=True):
+        self.output_path = output_path
+        self.data_written = 0
+        try:
+            self.file_handle = open(output_path, 'wb')
+        except:
+            print "Error: Unable to open a file at %s" % output_path
+            exit()
+        self.file_handle.write(osc_binary.header())
+        self.__offset = osc_binary.HEADER.size
+        self.__index = osc_binary.BinaryIndex() if index else None
+
+    def set_options(self, verbose, filters):
+        self.__verbose = verbose
+        self.__filters = filters
+
+    def receive_msg(self, msg):
+        if "done" in msg:
+            self.close_file()
+            return
+
+        if not self.path_contains_filter(self.__filters, msg[1]):
+            return
+
+        data = osc_binary.record(msg[0], osc_codec.encode_message(msg[1], msg[2], msg[3]))
+        if self.__index is not None:
+            self.__index.add(msg[0], self.__offset)
+        self.file_handle.write(data)
+        self.__offset += len(data)
+        self.data_written += 1
+
+    def close_file(self):
+        if self.file_handle.closed:
+            return
+        self.file_handle.close()
+        if self.__index is not None:
+            self.__index.save(self.output_path)
+
+
 class ProtoBufFileWriter(OutputHandler):
     def __init__(self, output_path):
         try:
@@ -510,6 +1082,7 @@ class ProtoBufFileWriter(OutputHandler):
         self.attr_does_not_exist = ["error_stat_enabled"]
         self.received_data = 0
         self.data_sent = 0
+        self.__handlers = PathRouter(self.datatype_handler)
 
     def set_options(self, verbose, filters):
         self.__verbose = verbose
@@ -523,178 +1096,223 @@ class ProtoBufFileWriter(OutputHandler):
         if not self.path_contains_filter(self.__filters, msg[1]):
             return
 
-        timestamp = msg[0]
-        path = msg[1]
-        osc_types = msg[2]
-        data = msg[3]
-        config_id = msg[4]
-
+        self.add_muse_data(self.__handlers.route(msg[1]), msg[0], msg[1], msg[2], msg[3], msg[4])
+
+    # Adds the batch in order, looking up the datatype handler once per column.
+    def receive_batch(self, batch):
+        columns = []
+        for column in batch.columns:
+            if not self.path_contains_filter(self.__filters, column.path):
+                columns.append(None)
+                continue
+            values = column.values.tolist() if column.is_numeric() else column.values
+            columns.append((self.__handlers.route(column.path), column.path, column.types,
+                            iter(column.timestamps.tolist()), iter(values), iter(column.config_ids.tolist())))
+
+        for index in batch.order.tolist():
+            entry = columns[index]
+            if entry is None:
+                continue
+            handler, path, osc_types, timestamps, values, config_ids = entry
+            self.add_muse_data(handler, next(timestamps), path, osc_types, next(values), next(config_ids))
+
+    def add_muse_data(self, handler, timestamp, path, osc_types, data, config_id):
         muse_data = self.muse_data_collection.collection.add()
         muse_data.timestamp = timestamp
         muse_data.config_id = config_id
 
-        if "/muse/config" in path:
-            muse_data.datatype = MuseData.CONFIG
-            configDictionary = json.loads(data[0])
-
-            muse_config_data = muse_data.Extensions[MuseConfig.museData]
-            for config_key in configDictionary:
-                value = configDictionary[config_key]
-                if 'accelerometer_data_enabled' in config_key:
-                    print config_key
-                elif 'error_stat_enabled' in config_key:
-                    print config_key
-                    setattr(muse_config_data, 'error_data_enabled', configDictionary[config_key])
-                elif isinstance(value, list) and (muse_config_data.eeg_locations == []):
-                    for y in value:
-                        muse_config_data.eeg_locations.append(y)
-                elif isinstance(value, unicode):
-                    values = value.split()
-                    if(len(values) > 1):
-                        if(muse_config_data.eeg_locations == []):
-                            for loc in values:
-                                muse_config_data.eeg_locations.append(_HEADLOCATIONS.values_by_name[loc].number)
-                        setattr(muse_config_data, config_key, str(configDictionary[config_key]))
-                    elif configDictionary[config_key] in _EEGUNITS.values_by_name.keys():
-                        setattr(muse_config_data, config_key, _EEGUNITS.values_by_name[configDictionary[config_key]].number)
-                    elif configDictionary[config_key] in _ACCELEROMETERUNITS.values_by_name.keys():
-                        setattr(muse_config_data, config_key, _ACCELEROMETERUNITS.values_by_name[configDictionary[config_key]].number)
-                    elif configDictionary[config_key] in utilities.units_dictionary:
-                        setattr(muse_config_data, config_key, utilities.units_dictionary[configDictionary[config_key]])
-                    else:
-                        setattr(muse_config_data, config_key, str(configDictionary[config_key]))
-                else:
-                    try:
-                        setattr(muse_config_data, config_key, configDictionary[config_key])
-                    except:
-                        if self.__verbose:
-                            print 'Attribute does not exist in Muse Config File Format: ' + config_key
-        elif "/muse/device" in path:
-            muse_data.datatype = MuseData.COMPUTING_DEVICE
-            deviceDictionary = json.loads(data[0])
-
-            muse_device_data = muse_data.Extensions[ComputingDevice.museData]
-            for device_key in deviceDictionary:
-                value = deviceDictionary[device_key]
-                if isinstance(value, unicode):
-                    setattr(muse_device_data, device_key, str(deviceDictionary[device_key]))
-                else:
-                    try:
-                        setattr(muse_device_data, device_key, deviceDictionary[device_key])
-                    except:
-                        if self.__verbose:
-                            print 'Attribute does not exist in Muse Device File Format: ' + device_key
+        handler(muse_data, path, osc_types, data)
 
+        self.received_data += 1
+        self.data_sent += 1
+        if self.received_data > 3000:
+            self.write_to_file()
+            self.received_data = 0
 
+    # Returns the method that fills in a MuseData entry for messages on this path.
+    def datatype_handler(self, path):
+        if "/muse/config" in path:
+            return self.fill_config
+        elif "/muse/device" in path:
+            return self.fill_device
         elif "/muse/eeg/quantization" in path:
-            muse_data.datatype= MuseData.QUANT
-            muse_quant_data = muse_data.Extensions[MuseQuantization.museData]
-            for x in data:
-                muse_quant_data.values.append(int(x))
-
+            return self.fill_quantization
         elif "/muse/eeg/dropped" in path:
-            muse_data.datatype= MuseData.EEG_DROPPED
-            muse_eeg_dropped_data = muse_data.Extensions[EEG_DroppedSamples.museData]
-            muse_eeg_dropped_data.num = data[0]
-
+            return self.fill_eeg_dropped
         elif "/muse/eeg" in path:
-            muse_data.datatype= MuseData.EEG
-            muse_eeg_data = muse_data.Extensions[EEG.museData]
-
-            for value in data:
-                muse_eeg_data.values.append(float(value))
-
+            return self.fill_eeg
         elif "/muse/acc/dropped" in path:
-            muse_data.datatype= MuseData.ACC_DROPPED
-            muse_acc_dropped_data = muse_data.Extensions[ACC_DroppedSamples.museData]
-            muse_acc_dropped_data.num = data[0]
-
-
+            return self.fill_acc_dropped
         elif "/muse/acc" in path:
-            muse_data.datatype= MuseData.ACCEL
-            muse_acc_data = muse_data.Extensions[Accelerometer.museData]
-            muse_acc_data.acc1 = float(data[0])
-            muse_acc_data.acc2 = float(data[1])
-            muse_acc_data.acc3 = float(data[2])
-
+            return self.fill_acc
         elif "/muse/batt" in path:
-            muse_data.datatype= MuseData.BATTERY
-            muse_batt_data = muse_data.Extensions[Battery.museData]
-            muse_batt_data.percent_remaining = data[0]
-            muse_batt_data.battery_fuel_gauge_millivolts = data[1]
-            muse_batt_data.battery_adc_millivolts = data[2]
-            muse_batt_data.temperature_celsius = data[3]
-
+            return self.fill_battery
         elif "/muse/drlref" in path:
-            muse_data.datatype= MuseData.EEG
-            muse_eeg_data = muse_data.Extensions[EEG.museData]
-            muse_eeg_data.drl = float(data[0])
-            muse_eeg_data.ref = float(data[1])
-
+            return self.fill_drlref
         elif "/muse/version" in path:
-            muse_data.datatype= MuseData.VERSION
-            versionDictionary = json.loads(data[0])
-            #When more than one data is present, a timestamp is appended, may replace timestamp
-            #if len(data) > 1:
-            #    print len(data)
-            #    print '%.6f' % float(str(data[1]) + '.' + str(data[2]))
-
-            muse_version_data = muse_data.Extensions[MuseVersion.museData]
-            for version_key in versionDictionary:
-                if 'firmware_version' in version_key:
-                    print version_key
-                    setattr(muse_version_data, 'firmware_headset_version', str(versionDictionary[version_key]))
-                else:
-                    try:
-                        setattr(muse_version_data, version_key, str(versionDictionary[version_key]))
-                    except:
-                        if self.__verbose:
-                            print 'Attribute does not exist in Muse Version File Format: ' + version_key
-
-
+            return self.fill_version
         elif "/muse/annotation" in path:
-            muse_data.datatype= MuseData.ANNOTATION
-            muse_anno_data = muse_data.Extensions[Annotation.museData]
-            muse_anno_data.event_data = data[0]
-            if data[1] == "Plain String":
-                muse_anno_data.event_data_format = int(Annotation.PLAIN_STRING)
-            elif data[1] == "JSON":
-                muse_anno_data.event_data_format = int(Annotation.JSON)
-            muse_anno_data.event_type = data[2]
-            muse_anno_data.event_id = data[3]
-            muse_anno_data.parent_id = data[4]
+            return self.fill_annotation
         elif "/muse/dsp" in path:
-            muse_data.datatype=MuseData.DSP
-            muse_dsp_data = muse_data.Extensions[DSP.museData]
-            muse_dsp_data.type = path[10:]
-            for value in data:
-                muse_dsp_data.float_array.append(float(value))
-
+            return self.fill_dsp
         else:
-            muse_data.datatype = MuseData.ANNOTATION
-            muse_anno_data = muse_data.Extensions[Annotation.museData]
-            data_msg = ""
-            data_msg += path + " "
-            data_msg += osc_types + " "
-            i = 0
-            for osc_type in osc_types:
-                data_msg += str(data[i]) + " "
-                i += 1
-            muse_anno_data.event_data = data_msg
-            muse_anno_data.event_data_format = int(Annotation.OSC)
-            muse_anno_data.event_type = ''
-            muse_anno_data.event_id = ''
-            muse_anno_data.parent_id = ''
-            if self.__verbose:
-                print 'Unkwown type'
-                print path
-                print data
-
-        self.received_data += 1
-        self.data_sent += 1
-        if self.received_data > 3000:
-            self.write_to_file()
-            self.received_data = 0
+            return self.fill_osc_annotation
+
+    def fill_config(self, muse_data, path, osc_types, data):
+        muse_data.datatype = MuseData.CONFIG
+        configDictionary = json.loads(data[0])
+
+        muse_config_data = muse_data.Extensions[MuseConfig.museData]
+        for config_key in configDictionary:
+            value = configDictionary[config_key]
+            if 'accelerometer_data_enabled' in config_key:
+                print config_key
+            elif 'error_stat_enabled' in config_key:
+                print config_key
+                setattr(muse_config_data, 'error_data_enabled', configDictionary[config_key])
+            elif isinstance(value, list) and (muse_config_data.eeg_locations == []):
+                for y in value:
+                    muse_config_data.eeg_locations.append(y)
+            elif isinstance(value, unicode):
+                values = value.split()
+                if(len(values) > 1):
+                    if(muse_config_data.eeg_locations == []):
+                        for loc in values:
+                            muse_config_data.eeg_locations.append(_HEADLOCATIONS.values_by_name[loc].number)
+                    setattr(muse_config_data, config_key, str(configDictionary[config_key]))
+                elif configDictionary[config_key] in _EEGUNITS.values_by_name.keys():
+                    setattr(muse_config_data, config_key, _EEGUNITS.values_by_name[configDictionary[config_key]].number)
+                elif configDictionary[config_key] in _ACCELEROMETERUNITS.values_by_name.keys():
+                    setattr(muse_config_data, config_key, _ACCELEROMETERUNITS.values_by_name[configDictionary[config_key]].number)
+                elif configDictionary[config_key] in utilities.units_dictionary:
+                    setattr(muse_config_data, config_key, utilities.units_dictionary[configDictionary[config_key]])
+                else:
+                    setattr(muse_config_data, config_key, str(configDictionary[config_key]))
+            else:
+                try:
+                    setattr(muse_config_data, config_key, configDictionary[config_key])
+                except:
+                    if self.__verbose:
+                        print 'Attribute does not exist in Muse Config File Format: ' + config_key
+
+    def fill_device(self, muse_data, path, osc_types, data):
+        muse_data.datatype = MuseData.COMPUTING_DEVICE
+        deviceDictionary = json.loads(data[0])
+
+        muse_device_data = muse_data.Extensions[ComputingDevice.museData]
+        for device_key in deviceDictionary:
+            value = deviceDictionary[device_key]
+            if isinstance(value, unicode):
+                setattr(muse_device_data, device_key, str(deviceDictionary[device_key]))
+            else:
+                try:
+                    setattr(muse_device_data, device_key, deviceDictionary[device_key])
+                except:
+                    if self.__verbose:
+                        print 'Attribute does not exist in Muse Device File Format: ' + device_key
+
+    def fill_quantization(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.QUANT
+        muse_quant_data = muse_data.Extensions[MuseQuantization.museData]
+        for x in data:
+            muse_quant_data.values.append(int(x))
+
+    def fill_eeg_dropped(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.EEG_DROPPED
+        muse_eeg_dropped_data = muse_data.Extensions[EEG_DroppedSamples.museData]
+        muse_eeg_dropped_data.num = data[0]
+
+    def fill_eeg(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.EEG
+        muse_eeg_data = muse_data.Extensions[EEG.museData]
+
+        for value in data:
+            muse_eeg_data.values.append(float(value))
+
+    def fill_acc_dropped(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.ACC_DROPPED
+        muse_acc_dropped_data = muse_data.Extensions[ACC_DroppedSamples.museData]
+        muse_acc_dropped_data.num = data[0]
+
+    def fill_acc(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.ACCEL
+        muse_acc_data = muse_data.Extensions[Accelerometer.museData]
+        muse_acc_data.acc1 = float(data[0])
+        muse_acc_data.acc2 = float(data[1])
+        muse_acc_data.acc3 = float(data[2])
+
+    def fill_battery(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.BATTERY
+        muse_batt_data = muse_data.Extensions[Battery.museData]
+        muse_batt_data.percent_remaining = data[0]
+        muse_batt_data.battery_fuel_gauge_millivolts = data[1]
+        muse_batt_data.battery_adc_millivolts = data[2]
+        muse_batt_data.temperature_celsius = data[3]
+
+    def fill_drlref(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.EEG
+        muse_eeg_data = muse_data.Extensions[EEG.museData]
+        muse_eeg_data.drl = float(data[0])
+        muse_eeg_data.ref = float(data[1])
+
+    def fill_version(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.VERSION
+        versionDictionary = json.loads(data[0])
+        #When more than one data is present, a timestamp is appended, may replace timestamp
+        #if len(data) > 1:
+        #    print len(data)
+        #    print '%.6f' % float(str(data[1]) + '.' + str(data[2]))
+
+        muse_version_data = muse_data.Extensions[MuseVersion.museData]
+        for version_key in versionDictionary:
+            if 'firmware_version' in version_key:
+                print version_key
+                setattr(muse_version_data, 'firmware_headset_version', str(versionDictionary[version_key]))
+            else:
+                try:
+                    setattr(muse_version_data, version_key, str(versionDictionary[version_key]))
+                except:
+                    if self.__verbose:
+                        print 'Attribute does not exist in Muse Version File Format: ' + version_key
+
+    def fill_annotation(self, muse_data, path, osc_types, data):
+        muse_data.datatype= MuseData.ANNOTATION
+        muse_anno_data = muse_data.Extensions[Annotation.museData]
+        muse_anno_data.event_data = data[0]
+        if data[1] == "Plain String":
+            muse_anno_data.event_data_format = int(Annotation.PLAIN_STRING)
+        elif data[1] == "JSON":
+            muse_anno_data.event_data_format = int(Annotation.JSON)
+        muse_anno_data.event_type = data[2]
+        muse_anno_data.event_id = data[3]
+        muse_anno_data.parent_id = data[4]
+
+    def fill_dsp(self, muse_data, path, osc_types, data):
+        muse_data.datatype=MuseData.DSP
+        muse_dsp_data = muse_data.Extensions[DSP.museData]
+        muse_dsp_data.type = path[10:]
+        for value in data:
+            muse_dsp_data.float_array.append(float(value))
+
+    def fill_osc_annotation(self, muse_data, path, osc_types, data):
+        muse_data.datatype = MuseData.ANNOTATION
+        muse_anno_data = muse_data.Extensions[Annotation.museData]
+        data_msg = ""
+        data_msg += path + " "
+        data_msg += osc_types + " "
+        i = 0
+        for osc_type in osc_types:
+            data_msg += str(data[i]) + " "
+            i += 1
+        muse_anno_data.event_data = data_msg
+        muse_anno_data.event_data_format = int(Annotation.OSC)
+        muse_anno_data.event_type = ''
+        muse_anno_data.event_id = ''
+        muse_anno_data.parent_id = ''
+        if self.__verbose:
+            print 'Unkwown type'
+            print path
+            print data
 
     def write_to_file(self):
         data_bytes = self.muse_data_collection.SerializeToString()
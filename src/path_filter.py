@@ -0,0 +1,52 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Path filters (-i/--filter and --output-filter).
+
+A message passes a filter when any of the filter's regular expressions is
+found in its OSC path. The patterns are compiled into one alternation when
+the filter is created, and since the verdict only depends on the path it is
+remembered for each distinct path, so filtering a message costs a dict
+lookup however many patterns there are. OutputHandler asks each distinct
+filter once per message, before handing the message to its listeners.
+"""
+
+import re
+
+from path_router import PathRouter
+
+
+class PathFilter(object):
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+        self.__regex = None
+        if self.patterns:
+            self.__regex = re.compile("|".join("(?:%s)" % pattern for pattern in self.patterns))
+        self.__verdicts = PathRouter(self.__match)
+
+    def __match(self, path):
+        return self.__regex is not None and self.__regex.search(path) is not None
+
+    def matches(self, path):
+        return self.__verdicts.route(path)
+
+
+_filters = {}
+
+
+def compile_filter(patterns):
+    """
+    Return the PathFilter for a list of patterns, None for no filtering.
+
+    Filters are shared by pattern list so listeners given the same patterns
+    also share their verdicts.
+    """
+    if patterns is None:
+        return None
+    if isinstance(patterns, PathFilter):
+        return patterns
+    key = tuple(patterns)
+    path_filter = _filters.get(key)
+    if path_filter is None:
+        path_filter = PathFilter(key)
+        _filters[key] = path_filter
+    return path_filter
@@ -0,0 +1,33 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Per-path dispatch for the output writers.
+
+The writers decide what to do with a message by running substring tests on
+its OSC path. A session only has a few dozen distinct paths, so a
+PathRouter runs that classification once per path and afterwards answers
+with a single dict lookup.
+"""
+
+
+class PathRouter(object):
+    """
+    Memoizes resolve(path) for every path seen.
+
+    resolve must depend on the path only. Its result (a handler, a tuple of
+    dataset keys, ...) is returned as is for every later message on that
+    path.
+    """
+    def __init__(self, resolve):
+        self.__resolve = resolve
+        self.__routes = {}
+
+    def route(self, path):
+        try:
+            return self.__routes[path]
+        except KeyError:
+            route = self.__resolve(path)
+            self.__routes[path] = route
+            return route
+
+    def __len__(self):
+        return len(self.__routes)
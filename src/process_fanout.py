@@ -0,0 +1,147 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Output writers in their own processes.
+
+All listeners normally run in the output thread, so converting to several
+file formats costs the sum of the writers' time on one core. ProcessFanout
+is a single listener that encodes the events once, in blocks, into a
+shared_ring.SharedRing, and every writer runs in a child process that reads
+the blocks from the ring. The writers then run in parallel.
+"""
+
+import cPickle
+import multiprocessing
+import Queue
+import signal
+
+import path_filter
+import utilities
+from event_batch import EventBatch, item_size
+from output_handler import OutputHandler
+from shared_ring import SharedRing, DEFAULT_CAPACITY
+
+# Events encoded together in one ring record
+BLOCK_EVENTS = 2048
+
+# Writer counters reported back to the parent when a writer is done
+RESULT_ATTRIBUTES = ['data_written', 'files_written', 'data_sent']
+
+
+def run_writer(ring, reader, writer_class, writer_args, verbose, filters, results):
+    "Entry point of a writer process."
+    # Control-C is handled by the parent, which sends 'done'
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    utilities.DisplayPlayback.output_timing = False
+    writer = writer_class(*writer_args)
+    writer.set_options(verbose, path_filter.compile_filter(filters))
+    while True:
+        for item in cPickle.loads(ring.read(reader)):
+            if isinstance(item, EventBatch):
+                writer.receive_batch(item)
+                continue
+            writer.receive_msg(item)
+            if "done" in item:
+                results.put((reader, dict((name, getattr(writer, name))
+                                          for name in RESULT_ATTRIBUTES if hasattr(writer, name))))
+                return
+
+
+class ProcessFanout(OutputHandler):
+    """
+    Listener that forwards the events to writer processes.
+
+    Writers are given as a class and constructor arguments, since they open
+    their files in the process that uses them. The processes are started by
+    start_writers (or set_options when it was not called), ideally before
+    the input threads are running. After 'done' the counters of every writer
+    (data_written, ...) are in results, keyed by writer name.
+    """
+    # the writers filter in their processes, with their own filters
+    applies_own_filters = True
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.results = {}
+        self.__writers = []
+        self.__processes = []
+        self.__ring = None
+        self.__results = None
+        self.__pending = []
+        self.__pending_events = 0
+        self.__done = False
+
+    def add_writer(self, name, writer_class, writer_args, filters=None):
+        "filters (a list of patterns) replaces the filters given to start_writers for this writer."
+        self.__writers.append((name, writer_class, writer_args, filters))
+
+    def __len__(self):
+        return len(self.__writers)
+
+    def start_writers(self, verbose, filters):
+        if self.__ring is not None:
+            return
+        self.__ring = SharedRing(len(self.__writers), self.capacity)
+        self.__results = multiprocessing.Queue()
+        for reader, (name, writer_class, writer_args, writer_filters) in enumerate(self.__writers):
+            if writer_filters is None:
+                writer_filters = filters
+            process = multiprocessing.Process(target=run_writer, name=name + ' writer',
+                                              args=(self.__ring, reader, writer_class, writer_args, verbose,
+                                                    writer_filters, self.__results))
+            process.daemon = True
+            process.start()
+            self.__processes.append(process)
+
+    def set_options(self, verbose, filters):
+        self.start_writers(verbose, filters.patterns if filters is not None else None)
+
+    def receive_msg(self, msg):
+        if self.__done:
+            return
+        if isinstance(msg, list) and len(msg) > 3 and not isinstance(msg[3], list):
+            # protobuf repeated fields do not pickle
+            msg = msg[:3] + [list(msg[3])] + msg[4:]
+        self.__pending.append(msg)
+        self.__pending_events += 1
+        if "done" in msg:
+            self.flush()
+            self.join()
+        elif self.__pending_events >= BLOCK_EVENTS:
+            self.flush()
+
+    def receive_batch(self, batch):
+        if self.__done:
+            return
+        self.__pending.append(batch)
+        self.__pending_events += item_size(batch)
+        if self.__pending_events >= BLOCK_EVENTS:
+            self.flush()
+
+    def flush(self):
+        if self.__pending:
+            self.__ring.write(cPickle.dumps(self.__pending, cPickle.HIGHEST_PROTOCOL), self.detach_dead_writers)
+            self.__pending = []
+            self.__pending_events = 0
+
+    def detach_dead_writers(self):
+        for reader, process in enumerate(self.__processes):
+            if not process.is_alive():
+                self.__ring.detach(reader)
+
+    def join(self):
+        self.__done = True
+        waiting = len(self.__processes)
+        while waiting:
+            try:
+                reader, counters = self.__results.get(timeout=1.0)
+            except Queue.Empty:
+                if not any(process.is_alive() for process in self.__processes):
+                    break
+                continue
+            self.results[self.__writers[reader][0]] = counters
+            waiting -= 1
+        for process in self.__processes:
+            process.join()
+        for reader, process in enumerate(self.__processes):
+            if process.exitcode:
+                print "Error: %s writer exited with code %d" % (self.__writers[reader][0], process.exitcode)
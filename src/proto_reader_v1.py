@@ -5,11 +5,13 @@ import google.protobuf.internal.containers
 import threading
 import time
 import Queue
+from bounded_channel import BoundedChannel, DEFAULT_CAPACITY
+from muse_chunk_scanner import MuseChunkScanner
 
 
 class MuseProtoBufReaderV1(object):
 
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, capacity=DEFAULT_CAPACITY):
         self.events = []
         self.__objects = []
         self.__config_id = 0
@@ -17,47 +19,42 @@ class MuseProtoBufReaderV1(object):
         self.__verbose = verbose
         self.__timestamp = 0
         self.added_to_events = 0
-        self.events_queue = Queue.Queue()
+        self.events_queue = BoundedChannel(capacity)
+        self.error = None
 
+    # The events always end with 'done'. A chunk that fails to decode ends
+    # the file and is kept in error.
     def parse(self, in_stream):
+        scanner = MuseChunkScanner(in_stream)
+        try:
+            for chunk in scanner:
+                # (1) Check the chunk header
+                if chunk.version != 1:
+                    if self.__verbose:
+                        print 'Corrupted file, type mismatch. Parsed: ' + str(chunk.version) + ' expected 1'
+                    break
+                if not chunk.is_complete():
+                    if self.__verbose:
+                        print 'Corrupted file: ' + str(in_stream) + ', length mismatch. Reporting length: ' + str(len(chunk.payload)) + ' expected: ' + str(chunk.length)
+                    break
+
+                # (2) Parse the message in place
+                muse_data_collection = MuseDataCollection()
+                muse_data_collection.ParseFromString(chunk.payload)
 
-        while True:
-            # (1) Read the message header
-            header_bin = in_stream.read(4)
-            # check for EOF
-            if len(header_bin) == 0:
-                self.add_done()
-                break
-
-            header = struct.unpack("<i", header_bin)
-            msg_length = header[0]
-            msg_type = in_stream.read(2)
-            msg_type = struct.unpack("<h", msg_type)
-            msg_type = msg_type[0]
-            if msg_type != 1:
-                if self.__verbose:
-                    print 'Corrupted file, type mismatch. Parsed: ' + str(msg_type) + ' expected 1'
-                self.add_done()
-                break
-
-            # (2) Read and parse the message
-            msg_bin = in_stream.read(msg_length)
-            if len(msg_bin) != msg_length:
-                if self.__verbose:
-                    print 'Corrupted file: ' + str(in_stream) + ', length mismatch. Reporting length: ' + str(len(msg_bin)) + ' expected: ' + str(msg_length)
-                self.add_done()
-                break
-
-            muse_data_collection = MuseDataCollection()
-            muse_data_collection.ParseFromString(msg_bin)
-
-            # (3) Process this chunk of data
-            self.__objects.extend(muse_data_collection.collection)
- 
-            for obj in self.__objects:
-                self.__handle_data(obj)
-
-            self.__objects = []
+                # (3) Process this chunk of data
+                self.__objects.extend(muse_data_collection.collection)
+
+                for obj in self.__objects:
+                    self.__handle_data(obj)
+
+                self.__objects = []
+        except Exception, err:
+            self.error = err
+            print 'Corrupted file %s: %r' % (getattr(in_stream, 'name', in_stream), err)
+        finally:
+            scanner.close()
+            self.add_done()
 
     def add_done(self):
         self.add_to_events_queue([self.__timestamp + 0.001, 'done'])
@@ -191,8 +188,6 @@ class MuseProtoBufReaderV1(object):
 
     def add_to_events_queue(self, event):
         self.__timestamp = event[0]
+        # blocks while the merger is behind
         self.events_queue.put(event)
         self.added_to_events += 1
-
-        while self.events_queue.qsize() >= 30000:
-            time.sleep(0)
@@ -5,11 +5,23 @@ import google.protobuf.internal.containers
 import threading
 import time
 import Queue
+import collections
+import multiprocessing
+import signal
+from bounded_channel import BoundedChannel, DEFAULT_CAPACITY
+from event_batch import EventBatch, EventBatchBuilder
+from muse_chunk_index import METADATA_DATATYPES
+from muse_chunk_scanner import MuseChunkScanner
+
+# Paths of the metadata events, which are kept (at the start timestamp) when a
+# seek skips past them.
+METADATA_PATHS = frozenset(["/muse/config", "/muse/version", "/muse/device"])
 
 
 class MuseProtoBufReaderV2(object):
 
-    def __init__(self, verbose):
+    # With batch set, every MuseDataCollection chunk is queued as a single EventBatch.
+    def __init__(self, verbose, capacity=DEFAULT_CAPACITY, batch=False):
         self.events = []
         self.__objects = []
         self.__config_id = 0
@@ -17,45 +29,126 @@ class MuseProtoBufReaderV2(object):
         self.__verbose = verbose
         self.__timestamp = 0
         self.added_to_events = 0
-        self.events_queue = Queue.Queue()
-
+        self.events_queue = BoundedChannel(capacity)
+        self.__batch = batch
+        self.__batch_builder = None
+        self.__range = None
+        self.__start = None
+        self.__end = None
+        self.__filtering = False
+        self.__pool = None
+        self.__pool_window = 0
+        self.error = None
+
+    # Restricts parsing to the chunks of chunk_range (see muse_chunk_index) and
+    # to the events between the start and end timestamps.
+    def seek(self, chunk_range, start=None, end=None):
+        self.__range = chunk_range
+        self.__start = start
+        self.__end = end
+        self.__filtering = start is not None or end is not None
+
+    # Hands chunk decoding to a pool made by create_pool. Framing stays in the
+    # parsing thread and the decoded chunks are queued in file order.
+    def set_pool(self, pool, window):
+        self.__pool = pool
+        self.__pool_window = window
+
+    # The events always end with 'done'. A chunk that fails to decode (here
+    # or in a pool worker) ends the file and is kept in error.
     def parse(self, in_stream):
-
-        while True:
-            # (1) Read the message header
-            header_bin = in_stream.read(4)
-            # check for EOF
-            if len(header_bin) == 0:
-                self.add_done()
-                break
-
-            header = struct.unpack("<i", header_bin)
-            msg_length = header[0]
-            msg_type = in_stream.read(2)
-            msg_type = struct.unpack("<h", msg_type)
-            msg_type = msg_type[0]
-            if msg_type != 2:
-                print 'Corrupted file, type mismatch. Parsed: ' + str(msg_type) + ' expected 2'
-                self.add_done()
-                break
-
-            # (2) Read and parse the message
-            msg_bin = in_stream.read(msg_length)
-            if len(msg_bin) != msg_length:
-                print 'Corrupted file, length mismatch. Reporting length: ' + str(len(msg_bin)) + ' expected: ' + str(msg_length)
-                self.add_done()
+        scanner = MuseChunkScanner(in_stream)
+        try:
+            chunks = iter(scanner)
+            if self.__range is not None:
+                # Replay the metadata recorded before the seek point
+                for offset in self.__range.preamble:
+                    self.parse_chunk(scanner.read_chunk(offset), METADATA_DATATYPES)
+                chunks = self.__chunks_in_range(scanner)
+
+            if self.__pool is not None:
+                self.__decode_in_pool(chunks)
+            else:
+                for chunk in chunks:
+                    if not self.parse_chunk(chunk):
+                        break
+        except Exception, err:
+            self.error = err
+            print 'Corrupted file %s: %r' % (getattr(in_stream, 'name', in_stream), err)
+        finally:
+            scanner.close()
+            self.add_done()
+
+    def __chunks_in_range(self, scanner):
+        if self.__range.offset is None:
+            return
+        scanner.offset = self.__range.offset
+        for chunk in scanner:
+            if self.__range.stop is not None and chunk.offset >= self.__range.stop:
+                return
+            yield chunk
+
+    def __decode_in_pool(self, chunks):
+        # at most window chunks are in flight, so large files are not read ahead
+        pending = collections.deque()
+        for chunk in chunks:
+            if not self.check_chunk(chunk):
                 break
+            pending.append(self.__pool.apply_async(decode_in_worker, [str(chunk.payload)]))
+            if len(pending) >= self.__pool_window:
+                self.queue_decoded(pending.popleft().get())
+        while pending:
+            self.queue_decoded(pending.popleft().get())
+
+    # Queues what a worker returned for one chunk: an EventBatch or a list of events.
+    def queue_decoded(self, decoded):
+        if isinstance(decoded, EventBatch):
+            self.__timestamp = decoded.last_timestamp()
+            self.added_to_events += len(decoded)
+            self.events_queue.put(decoded, len(decoded))
+        else:
+            for event in decoded:
+                self.add_to_events_queue(event)
+
+    # Returns False if the chunk is corrupted.
+    def check_chunk(self, chunk):
+        if chunk.version != 2:
+            print 'Corrupted file, type mismatch. Parsed: ' + str(chunk.version) + ' expected 2'
+            return False
+        if not chunk.is_complete():
+            print 'Corrupted file, length mismatch. Reporting length: ' + str(len(chunk.payload)) + ' expected: ' + str(chunk.length)
+            return False
+        return True
+
+    # Decodes and queues one chunk. Returns False if the chunk is corrupted.
+    def parse_chunk(self, chunk, datatypes=None):
+        # (1) Check the chunk header
+        if not self.check_chunk(chunk):
+            return False
+
+        self.decode_chunk(chunk.payload, datatypes)
+        return True
+
+    # Decodes a chunk payload and queues its events, keeping only the given datatypes if set.
+    def decode_chunk(self, payload, datatypes=None):
+        # (2) Parse the message in place
+        muse_data_collection = MuseDataCollection()
+        muse_data_collection.ParseFromString(payload)
+
+        # (3) Process this chunk of data
+        self.__objects.extend(muse_data_collection.collection)
+        if datatypes is not None:
+            self.__objects = [obj for obj in self.__objects if obj.datatype in datatypes]
+
+        if self.__batch:
+            self.__batch_builder = EventBatchBuilder()
+        for obj in self.__objects:
+            self.handle_data(obj)
+        if self.__batch:
+            self.add_batch_to_events_queue(self.__batch_builder)
+            self.__batch_builder = None
 
-            muse_data_collection = MuseDataCollection()
-            muse_data_collection.ParseFromString(msg_bin)
-
-            # (3) Process this chunk of data
-            self.__objects.extend(muse_data_collection.collection)
-
-            for obj in self.__objects:
-                self.handle_data(obj)
-
-            self.__objects = []
+        self.__objects = []
 
     def add_done(self):
         self.add_to_events_queue([self.__timestamp + 0.001, 'done'])
@@ -146,39 +239,38 @@ class MuseProtoBufReaderV2(object):
 
     def handle_config(self, timestamp, data_obj):
         json_dict = self.handle_json_dictionary_from_proto(data_obj)
-        self.add_to_events_queue([timestamp, "/muse/config", "s", [str(json_dict)], self.__config_id])
+        self.add_event(timestamp, "/muse/config", "s", [str(json_dict)])
 
     def handle_version(self, timestamp, data_obj):
         json_dict = self.handle_json_dictionary_from_proto(data_obj)
-        self.add_to_events_queue([timestamp, "/muse/version", "s", [str(json_dict)], self.__config_id])
+        self.add_event(timestamp, "/muse/version", "s", [str(json_dict)])
 
     def handle_eeg(self, timestamp, data_obj):
         # Check if this is a 6 channel EEG message
         data_count = len(data_obj.values)
         osc_type = 'f'*data_count
-        self.add_to_events_queue([timestamp, "/muse/eeg", osc_type, data_obj.values, self.__config_id])
+        self.add_event(timestamp, "/muse/eeg", osc_type, data_obj.values)
 
     def handle_drlref(self, timestamp, data_obj):
-        self.add_to_events_queue([timestamp, "/muse/drlref", "ff",
-                            [data_obj.drl, data_obj.ref], self.__config_id])
+        self.add_event(timestamp, "/muse/drlref", "ff",
+                            [data_obj.drl, data_obj.ref])
 
     def handle_quantization(self, timestamp, data_obj):
         data_count = len(data_obj.values)
         osc_type = 'i'*data_count
-        self.add_to_events_queue([timestamp, "/muse/eeg/quantization", osc_type,
-                            data_obj.values, self.__config_id])
+        self.add_event(timestamp, "/muse/eeg/quantization", osc_type,
+                            data_obj.values)
 
     def handle_acc(self, timestamp, data_obj):
-        self.add_to_events_queue([timestamp, "/muse/acc", "fff",
-                            [data_obj.acc1, data_obj.acc2, data_obj.acc3],
-                            self.__config_id])
+        self.add_event(timestamp, "/muse/acc", "fff",
+                            [data_obj.acc1, data_obj.acc2, data_obj.acc3])
 
     def handle_batt(self, timestamp, data_obj):
-        self.add_to_events_queue([timestamp, "/muse/batt", "iiii",
+        self.add_event(timestamp, "/muse/batt", "iiii",
                               [data_obj.percent_remaining,
                                data_obj.battery_fuel_gauge_millivolts,
                                data_obj.battery_adc_millivolts,
-                               data_obj.temperature_celsius], self.__config_id])
+                               data_obj.temperature_celsius])
 
     def handle_annotation(self, timestamp, data_obj):
         if data_obj.event_data_format == Annotation.OSC:
@@ -198,34 +290,101 @@ class MuseProtoBufReaderV2(object):
                 elif 's' in osc_type:
                     data.append(str(string_data[i]))
                 i += 1
-            self.add_to_events_queue([timestamp, path, osc_types, data, self.__config_id])
+            self.add_event(timestamp, path, osc_types, data)
         else:
             event_format = ""
             if data_obj.event_data_format == Annotation.PLAIN_STRING:   
                 event_format = "Plain String"
             elif data_obj.event_data_format == Annotation.JSON:
                 event_format = "JSON"
-            self.add_to_events_queue([timestamp, "/muse/annotation", "sssss", [data_obj.event_data, event_format, data_obj.event_type, data_obj.event_id, data_obj.parent_id], self.__config_id])
+            self.add_event(timestamp, "/muse/annotation", "sssss", [data_obj.event_data, event_format, data_obj.event_type, data_obj.event_id, data_obj.parent_id])
             
     def handle_dsp(self, timestamp, data_obj):
         data_count = len(data_obj.float_array)
         osc_type = 'f'*data_count
-        self.add_to_events_queue([timestamp, "/muse/dsp/" + data_obj.type, osc_type, data_obj.float_array, self.__config_id])
+        self.add_event(timestamp, "/muse/dsp/" + data_obj.type, osc_type, data_obj.float_array)
 
     def handle_computing_device(self, timestamp, data_obj):
         json_dict = self.handle_json_dictionary_from_proto(data_obj)
-        self.add_to_events_queue([timestamp, "/muse/device", "s", [str(json_dict)], self.__config_id])
+        self.add_event(timestamp, "/muse/device", "s", [str(json_dict)])
 
     def handle_dropped_eeg(self, timestamp, data_obj):
-        self.add_to_events_queue([timestamp, "/muse/eeg/dropped", "i", [data_obj.num], self.__config_id])
+        self.add_event(timestamp, "/muse/eeg/dropped", "i", [data_obj.num])
 
     def handle_dropped_acc(self, timestamp, data_obj):
-        self.add_to_events_queue([timestamp, "/muse/acc/dropped", "i", [data_obj.num], self.__config_id])
+        self.add_event(timestamp, "/muse/acc/dropped", "i", [data_obj.num])
+
+    # Events outside a seek range are dropped. Batched chunks are built column by
+    # column straight from the protobuf fields.
+    def add_event(self, timestamp, path, osc_types, data):
+        if self.__filtering:
+            if self.__start is not None and timestamp < self.__start:
+                if path not in METADATA_PATHS:
+                    return
+                timestamp = self.__start
+            if self.__end is not None and timestamp > self.__end:
+                return
+        if self.__batch_builder is not None:
+            self.__timestamp = timestamp
+            self.__batch_builder.add(timestamp, path, osc_types, data, self.__config_id)
+            self.added_to_events += 1
+        else:
+            self.add_to_events_queue([timestamp, path, osc_types, data, self.__config_id])
+
+    def add_batch_to_events_queue(self, builder):
+        if len(builder) == 0:
+            return
+        # blocks while the merger is behind
+        self.events_queue.put(builder.build(), len(builder))
 
     def add_to_events_queue(self, event):
         self.__timestamp = event[0]
+        # blocks while the merger is behind
         self.events_queue.put(event)
         self.added_to_events += 1
 
-        while self.events_queue.qsize() >= 30000:
-            time.sleep(0)
+
+class WorkerDecoder(MuseProtoBufReaderV2):
+    """
+    Decodes chunks inside a pool worker process.
+
+    The decoded events (or the EventBatch in batch mode) are collected and
+    returned to the parsing thread instead of being queued.
+    """
+    def __init__(self, batch, start, end):
+        MuseProtoBufReaderV2.__init__(self, False, 0, batch)
+        self.seek(None, start, end)
+        self.decoded = []
+
+    def add_to_events_queue(self, event):
+        # repeated protobuf fields cannot be pickled back to the parsing thread
+        event[3] = list(event[3])
+        self.decoded.append(event)
+
+    def add_batch_to_events_queue(self, builder):
+        if len(builder) > 0:
+            self.decoded = builder.build()
+
+    def decode(self, payload):
+        self.decoded = []
+        self.decode_chunk(payload)
+        return self.decoded
+
+
+_worker_decoder = None
+
+
+def init_worker(batch, start, end):
+    global _worker_decoder
+    # Control-C is handled by the main process, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_decoder = WorkerDecoder(batch, start, end)
+
+
+def decode_in_worker(payload):
+    return _worker_decoder.decode(payload)
+
+
+def create_pool(workers, batch=False, start=None, end=None):
+    "Pool of processes that decode version 2 chunks for MuseProtoBufReaderV2.set_pool."
+    return multiprocessing.Pool(workers, init_worker, [batch, start, end])
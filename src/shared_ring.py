@@ -0,0 +1,105 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Single-producer, multi-consumer ring buffer in shared memory.
+
+Records (byte strings) are written once into a multiprocessing.RawArray and
+every reader process reads all of them in order from its own position. The
+writer waits while the slowest reader is a whole buffer behind. Used by
+process_fanout to feed writer processes.
+"""
+
+import ctypes
+import multiprocessing
+import struct
+
+LENGTH = struct.Struct("<I")
+
+DEFAULT_CAPACITY = 16 * 1024 * 1024
+
+# Read position of a reader that has gone away
+DETACHED = -1
+
+
+class SharedRing(object):
+    """
+    Ring of length-prefixed records shared with child processes.
+
+    The ring must be created before the reader processes are started and
+    passed to them. Positions count bytes since the start of the stream, so
+    a record starts at position % capacity and may wrap around the end of
+    the buffer.
+    """
+    def __init__(self, readers, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.readers = readers
+        self._buffer = multiprocessing.RawArray(ctypes.c_char, capacity)
+        self._written = multiprocessing.RawValue(ctypes.c_longlong, 0)
+        self._read = multiprocessing.RawArray(ctypes.c_longlong, readers)
+        self._condition = multiprocessing.Condition()
+        self.write_blocked_count = 0
+
+    def _slowest(self):
+        positions = [position for position in self._read if position != DETACHED]
+        if not positions:
+            return self._written.value
+        return min(positions)
+
+    def _copy_in(self, position, data):
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        address = ctypes.addressof(self._buffer)
+        ctypes.memmove(address + start, data, first)
+        if first < len(data):
+            ctypes.memmove(address, data[first:], len(data) - first)
+
+    def _copy_out(self, position, count):
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        address = ctypes.addressof(self._buffer)
+        data = ctypes.string_at(address + start, first)
+        if first < count:
+            data += ctypes.string_at(address, count - first)
+        return data
+
+    def write(self, data, on_wait=None):
+        """
+        Append one record, waiting for room.
+
+        on_wait is called about every second while waiting, so the caller can
+        detach readers whose process died.
+        """
+        record = LENGTH.pack(len(data)) + data
+        if len(record) > self.capacity:
+            raise ValueError("Record of %d bytes does not fit a ring of %d bytes" % (len(record), self.capacity))
+        with self._condition:
+            position = self._written.value
+            if position + len(record) - self._slowest() > self.capacity:
+                self.write_blocked_count += 1
+                while position + len(record) - self._slowest() > self.capacity:
+                    self._condition.wait(1.0)
+                    if on_wait is not None:
+                        on_wait()
+        # only the writer touches the part of the buffer past the written position
+        self._copy_in(position, record)
+        with self._condition:
+            self._written.value = position + len(record)
+            self._condition.notify_all()
+
+    def read(self, reader):
+        "Return the next record for reader, waiting for one."
+        with self._condition:
+            position = self._read[reader]
+            while self._written.value == position:
+                self._condition.wait()
+        length = LENGTH.unpack(self._copy_out(position, LENGTH.size))[0]
+        data = self._copy_out(position + LENGTH.size, length)
+        with self._condition:
+            self._read[reader] = position + LENGTH.size + length
+            self._condition.notify_all()
+        return data
+
+    def detach(self, reader):
+        "Stop waiting for reader."
+        with self._condition:
+            self._read[reader] = DETACHED
+            self._condition.notify_all()
@@ -0,0 +1,80 @@
+# Copyright 2015 InteraXon, Inc.
+"""
+Events from several sources (headsets) in one session.
+
+When OSCListener listens on more than one port, the path of every event is
+prefixed with its source, e.g. /source5001/muse/eeg. Outputs written as is
+keep all sources in one file keyed by that prefix. SourceSplitter instead
+writes one file per source, with the prefix removed, so each file is the
+same as a recording of that headset alone.
+"""
+
+import compressed_file
+from output_handler import OutputHandler
+
+SOURCE_PREFIX = '/source'
+
+
+def source_path(source, path):
+    return SOURCE_PREFIX + str(source) + path
+
+
+def split_source(path):
+    "Returns (source, path without the prefix), or (None, path) for an event without a source."
+    if not path.startswith(SOURCE_PREFIX):
+        return None, path
+    end = path.find('/', len(SOURCE_PREFIX))
+    if end < 0:
+        return None, path
+    return path[len(SOURCE_PREFIX):end], path[end:]
+
+
+def source_file_name(file_name, source):
+    "out.csv for source 5001 is out_5001.csv, out.csv.gz is out_5001.csv.gz"
+    root, extension = compressed_file.splitext(file_name)
+    return root + '_' + str(source) + extension
+
+
+class SourceSplitter(OutputHandler):
+    """
+    Writes the events of each source with a writer of its own.
+
+    A writer_class(source_file_name(file_name, source), *writer_args) is
+    created for a source when its first event arrives. Events without a
+    source go to the writer of file_name itself. The writer filters see the
+    paths without the source prefix.
+    """
+    applies_own_filters = True
+
+    def __init__(self, writer_class, file_name, *writer_args):
+        self.writer_class = writer_class
+        self.file_name = file_name
+        self.writer_args = writer_args
+        self.writers = {}
+        self.__verbose = False
+        self.__filters = None
+
+    @property
+    def data_written(self):
+        return sum(getattr(writer, 'data_written', 0) for writer in self.writers.values())
+
+    def set_options(self, verbose, filters):
+        self.__verbose = verbose
+        self.__filters = filters
+
+    def writer(self, source):
+        writer = self.writers.get(source)
+        if writer is None:
+            file_name = self.file_name if source is None else source_file_name(self.file_name, source)
+            writer = self.writer_class(file_name, *self.writer_args)
+            writer.set_options(self.__verbose, self.__filters)
+            self.writers[source] = writer
+        return writer
+
+    def receive_msg(self, msg):
+        if "done" in msg:
+            for writer in self.writers.values():
+                writer.receive_msg(msg)
+            return
+        source, path = split_source(msg[1])
+        self.writer(source).receive_msg([msg[0], path] + list(msg[2:]))
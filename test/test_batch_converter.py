@@ -0,0 +1,146 @@
+import csv
+import gzip
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import batch_converter
+from event_batch import EventBatch
+from Muse_v2 import MuseDataCollection, MuseData, EEG
+
+
+def write_recording(file_name):
+    collection = MuseDataCollection()
+    for sample in range(10):
+        muse_data = collection.collection.add()
+        muse_data.timestamp = 100.0 + sample * 0.5
+        muse_data.datatype = MuseData.EEG
+        muse_data.Extensions[EEG.museData].values.extend([1.0, 2.0, 3.0, 4.0])
+    data_bytes = collection.SerializeToString()
+    with open(file_name, 'wb') as file_handle:
+        file_handle.write(struct.pack("<ih", len(data_bytes), 2))
+        file_handle.write(data_bytes)
+
+
+class BatchConverterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'in', 'sub'))
+        self.first = os.path.join(self.directory, 'in', 'a.muse')
+        self.second = os.path.join(self.directory, 'in', 'sub', 'b.muse')
+        write_recording(self.first)
+        write_recording(self.second)
+        open(os.path.join(self.directory, 'in', 'notes.txt'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_find_inputs_walks_directories_and_globs(self):
+        self.assertEqual([self.first, self.second],
+                         batch_converter.find_inputs([os.path.join(self.directory, 'in')]))
+        self.assertEqual([self.first],
+                         batch_converter.find_inputs([os.path.join(self.directory, 'in', '*.muse')]))
+
+    def test_output_paths_mirror_input_tree(self):
+        root = os.path.join(self.directory, 'in')
+        out = os.path.join(self.directory, 'out')
+        self.assertEqual([('mat', os.path.join(out, 'sub', 'b.mat')), ('csv', os.path.join(out, 'sub', 'b.csv'))],
+                         batch_converter.output_paths(self.second, ['mat', 'csv'], root, out))
+        self.assertEqual([('muse', os.path.join(root, 'a.converted.muse'))],
+                         batch_converter.output_paths(self.first, ['muse'], root, None))
+
+    def test_compress_applies_to_text_outputs(self):
+        root = os.path.join(self.directory, 'in')
+        self.assertEqual([('mat', os.path.join(root, 'a.mat')), ('csv', os.path.join(root, 'a.csv.gz')),
+                          ('oscreplay', os.path.join(root, 'a.osc.gz'))],
+                         batch_converter.output_paths(self.first, ['mat', 'csv', 'oscreplay'], root, None, 'gz'))
+        self.assertEqual([('csv', os.path.join(root, 'b.csv'))],
+                         batch_converter.output_paths(os.path.join(root, 'b.osc.xz'), ['csv'], root, None))
+
+    def test_is_up_to_date_compares_modification_times(self):
+        output = os.path.join(self.directory, 'a.csv')
+        self.assertFalse(batch_converter.is_up_to_date(self.first, [('csv', output)]))
+        open(output, 'w').close()
+        os.utime(self.first, (1000, 1000))
+        self.assertTrue(batch_converter.is_up_to_date(self.first, [('csv', output)]))
+        os.utime(output, (500, 500))
+        self.assertFalse(batch_converter.is_up_to_date(self.first, [('csv', output)]))
+
+    def test_summary_writer_counts_messages_and_batches(self):
+        summary = batch_converter.SummaryWriter()
+        summary.receive_msg([10.0, '/muse/batt', 'i', [1], 0])
+        summary.receive_batch(EventBatch.from_events([[12.0, '/muse/eeg', 'f', [1.0], 0],
+                                                      [11.0, '/muse/eeg', 'f', [2.0], 0]]))
+        summary.receive_msg([0, 'done'])
+        self.assertEqual(3, summary.events)
+        self.assertEqual(2.0, summary.duration())
+
+    def test_convert_writes_outputs_and_summary_row(self):
+        output = os.path.join(self.directory, 'a.csv')
+        row = batch_converter.convert((self.first, [('csv', output)],
+                                       {'capacity': 0, 'batch': False, 'filters': None,
+                                        'stream_matlab': False}))
+        self.assertEqual('converted', row['status'])
+        self.assertEqual(10, row['events'])
+        self.assertEqual('4.500', row['duration_s'])
+        with open(output) as csv_file:
+            self.assertEqual(10, len(list(csv.reader(csv_file))))
+
+    def test_run_skips_up_to_date_outputs(self):
+        out = os.path.join(self.directory, 'out')
+        summary_file = os.path.join(out, 'summary.csv')
+        args = [os.path.join(self.directory, 'in'), '-t', 'csv', '-d', out, '-p', '1', '--summary', summary_file]
+        self.assertEqual(0, batch_converter.run(args))
+        self.assertTrue(os.path.exists(os.path.join(out, 'sub', 'b.csv')))
+        self.assertEqual(0, batch_converter.run(args))
+        with open(summary_file) as csv_file:
+            statuses = [row['status'] for row in csv.DictReader(csv_file)]
+        self.assertEqual(['up to date', 'up to date'], statuses)
+
+    def test_run_finishes_when_inputs_fail(self):
+        in_dir = os.path.join(self.directory, 'in')
+        with open(os.path.join(in_dir, 'corrupt.muse'), 'wb') as file_handle:
+            file_handle.write(struct.pack("<ih", 20, 2) + '\xff' * 20)
+        gzip.open(os.path.join(in_dir, 'empty.muse.gz'), 'wb').close()
+        out = os.path.join(self.directory, 'out')
+        summary_file = os.path.join(out, 'summary.csv')
+        self.assertEqual(1, batch_converter.run([in_dir, '-t', 'csv', '-d', out, '-p', '1', '--summary', summary_file]))
+        with open(summary_file) as csv_file:
+            statuses = dict((os.path.basename(row['input']), row['status']) for row in csv.DictReader(csv_file))
+        self.assertEqual('converted', statuses['a.muse'])
+        self.assertEqual('converted', statuses['b.muse'])
+        self.assertTrue(statuses['corrupt.muse'].startswith('failed: DecodeError'))
+        self.assertTrue(statuses['empty.muse.gz'].startswith('failed: IOError: Zero sized Muse file'))
+
+    def test_failed_file_is_converted_again_by_the_next_run(self):
+        in_dir = os.path.join(self.directory, 'in')
+        with open(os.path.join(in_dir, 'corrupt.muse'), 'wb') as file_handle:
+            file_handle.write(struct.pack("<ih", 20, 2) + '\xff' * 20)
+        out = os.path.join(self.directory, 'out')
+        summary_file = os.path.join(out, 'summary.csv')
+        args = [in_dir, '-t', 'csv', 'oscbinary', '-d', out, '-p', '1', '--summary', summary_file]
+        self.assertEqual(1, batch_converter.run(args))
+        self.assertEqual(['a.csv', 'a.oscb', 'a.oscb.idx', 'sub', 'summary.csv'], sorted(os.listdir(out)))
+        self.assertEqual(1, batch_converter.run(args))
+        with open(summary_file) as csv_file:
+            statuses = dict((os.path.basename(row['input']), row['status']) for row in csv.DictReader(csv_file))
+        self.assertTrue(statuses['corrupt.muse'].startswith('failed: DecodeError'))
+        self.assertEqual('up to date', statuses['a.muse'])
+
+    def test_sibling_input_directories_are_mirrored_under_the_output_directory(self):
+        os.makedirs(os.path.join(self.directory, 'rec1'))
+        os.makedirs(os.path.join(self.directory, 'rec2'))
+        write_recording(os.path.join(self.directory, 'rec1', 'a.muse'))
+        write_recording(os.path.join(self.directory, 'rec2', 'b.muse'))
+        out = os.path.join(self.directory, 'out')
+        self.assertEqual(self.directory, batch_converter.common_directory(
+            [os.path.join(self.directory, 'rec1', 'a.muse'), os.path.join(self.directory, 'rec2', 'b.muse')]))
+        self.assertEqual(0, batch_converter.run([os.path.join(self.directory, 'rec1'), os.path.join(self.directory, 'rec2'),
+                                                 '-t', 'csv', '-d', out, '-p', '1',
+                                                 '--summary', os.path.join(out, 'summary.csv')]))
+        self.assertTrue(os.path.exists(os.path.join(out, 'rec1', 'a.csv')))
+        self.assertTrue(os.path.exists(os.path.join(out, 'rec2', 'b.csv')))
+        self.assertEqual(['a.muse'], os.listdir(os.path.join(self.directory, 'rec1')))
+        self.assertEqual(['b.muse'], os.listdir(os.path.join(self.directory, 'rec2')))
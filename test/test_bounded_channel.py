@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+
+import bounded_channel
+
+
+class BoundedChannelTest(unittest.TestCase):
+    def test_get_returns_items_in_order(self):
+        channel = bounded_channel.BoundedChannel(10)
+        for i in range(5):
+            channel.put(i)
+        self.assertEqual(5, channel.qsize())
+        self.assertEqual([0, 1, 2, 3, 4], [channel.get() for _ in range(5)])
+        self.assertTrue(channel.empty())
+
+    def test_high_water_mark_tracks_largest_backlog(self):
+        channel = bounded_channel.BoundedChannel(10)
+        for i in range(4):
+            channel.put(i)
+        channel.get()
+        channel.put(4)
+        self.assertEqual(4, channel.high_water_mark)
+
+    def test_put_blocks_until_consumer_makes_room(self):
+        channel = bounded_channel.BoundedChannel(2)
+        channel.put('a')
+        channel.put('b')
+        producer = threading.Thread(target=channel.put, args=['c'])
+        producer.daemon = True
+        producer.start()
+        producer.join(0.05)
+        self.assertTrue(producer.is_alive())
+        self.assertEqual('a', channel.get())
+        producer.join(1)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(1, channel.put_blocked_count)
+        self.assertGreater(channel.put_blocked_time, 0)
+        self.assertEqual(2, channel.high_water_mark)
+
+    def test_get_blocks_until_producer_puts(self):
+        channel = bounded_channel.BoundedChannel(2)
+        result = []
+        consumer = threading.Thread(target=lambda: result.append(channel.get()))
+        consumer.daemon = True
+        consumer.start()
+        time.sleep(0.05)
+        self.assertEqual([], result)
+        channel.put('x')
+        consumer.join(1)
+        self.assertEqual(['x'], result)
+        self.assertEqual(1, channel.get_blocked_count)
+
+    def test_zero_capacity_is_unbounded(self):
+        channel = bounded_channel.BoundedChannel(0)
+        for i in range(100):
+            channel.put(i)
+        self.assertEqual(100, channel.qsize())
+        self.assertEqual(0, channel.put_blocked_count)
+
+    def test_stats_reports_counters(self):
+        channel = bounded_channel.BoundedChannel(3)
+        channel.put(1)
+        stats = channel.stats()
+        self.assertEqual(3, stats['capacity'])
+        self.assertEqual(1, stats['queued'])
+        self.assertEqual(1, stats['high_water_mark'])
+        self.assertIn('high water mark 1/3',
+                      channel.format_stats('queue', stats))
@@ -0,0 +1,68 @@
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import compressed_file
+import input_stream
+
+
+class CompressedFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lines = ['%f /muse/eeg ffff %d.0 2.0 3.0 4.0\n' % (1000 + i * 0.004, i) for i in range(20000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, file_name):
+        path = os.path.join(self.directory, file_name)
+        file_handle = compressed_file.open_output(path)
+        for line in self.lines:
+            file_handle.write(line)
+        file_handle.close()
+        return path
+
+    def test_compression_and_splitext(self):
+        self.assertEqual('.gz', compressed_file.compression('out.csv.gz'))
+        self.assertEqual(None, compressed_file.compression('out.csv'))
+        self.assertEqual(('out', '.csv.bz2'), compressed_file.splitext('out.csv.bz2'))
+        self.assertEqual(('out', '.csv'), compressed_file.splitext('out.csv'))
+
+    def test_plain_round_trip(self):
+        path = self.write('out.osc')
+        with open(path) as file_handle:
+            self.assertEqual(self.lines, file_handle.readlines())
+
+    @mock.patch('compressed_file.BLOCK_SIZE', 4096)
+    def test_gzip_round_trip(self):
+        path = self.write('out.osc.gz')
+        self.assertEqual(''.join(self.lines), gzip.open(path).read())
+        self.assertEqual(self.lines, list(input_stream.open_input(path)))
+
+    @mock.patch('compressed_file.BLOCK_SIZE', 4096)
+    def test_bz2_round_trip(self):
+        path = self.write('out.osc.bz2')
+        self.assertEqual(''.join(self.lines), bz2.BZ2File(path).read())
+        self.assertEqual(self.lines, list(input_stream.open_input(path)))
+
+    def test_xz_round_trip(self):
+        try:
+            path = self.write('out.osc.xz')
+        except IOError:
+            raise unittest.SkipTest("neither the xz program nor backports.lzma is available")
+        self.assertEqual(self.lines, list(input_stream.open_input(path)))
+
+    def test_compressor_errors_are_raised(self):
+        writer = compressed_file.open_output(os.path.join(self.directory, 'out.csv.gz'))
+        with mock.patch.object(gzip.GzipFile, 'write', side_effect=IOError("disk full")):
+            writer.write('x' * compressed_file.BLOCK_SIZE)
+            self.assertRaises(IOError, writer.close)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+import event_batch
+
+
+class EventBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.events = [[1.0, '/muse/eeg', 'ff', [1.5, 2.5], 3],
+                       [1.1, '/muse/batt', 'ii', [90, 4000], 3],
+                       [1.2, '/muse/eeg', 'ff', [3.5, 4.5], 3],
+                       [1.3, '/muse/annotation', 's', ['marker'], 3],
+                       [1.4, '/muse/eeg', 'ff', [5.5, 6.5], 3]]
+        self.batch = event_batch.EventBatch.from_events(self.events)
+
+    def test_intern_path_is_stable(self):
+        first = event_batch.intern_path('/muse/test/intern')
+        self.assertEqual(first, event_batch.intern_path('/muse/test/intern'))
+        self.assertEqual('/muse/test/intern', event_batch.path_name(first))
+
+    def test_numeric_paths_become_matrices(self):
+        eeg, batt, annotation = self.batch.columns
+        self.assertEqual((3, 2), eeg.values.shape)
+        self.assertEqual(np.float64, eeg.values.dtype)
+        self.assertEqual(np.int64, batt.values.dtype)
+        self.assertEqual([1.0, 1.2, 1.4], eeg.timestamps.tolist())
+        self.assertFalse(annotation.is_numeric())
+        self.assertEqual([['marker']], annotation.values)
+
+    def test_iteration_restores_events_in_order(self):
+        self.assertEqual(self.events, list(self.batch))
+        self.assertEqual(5, len(self.batch))
+        self.assertEqual(1.0, self.batch.first_timestamp())
+        self.assertEqual(1.4, self.batch.last_timestamp())
+
+    def test_leading_count(self):
+        self.assertEqual(2, self.batch.leading_count(1.2, False))
+        self.assertEqual(3, self.batch.leading_count(1.2, True))
+        self.assertEqual(5, self.batch.leading_count(9.0, False))
+
+    def test_split_keeps_order_on_both_sides(self):
+        head, tail = self.batch.split(3)
+        self.assertEqual(self.events[:3], list(head))
+        self.assertEqual(self.events[3:], list(tail))
+        self.assertEqual(1.3, tail.first_timestamp())
+
+    def test_select_keeps_the_order_of_the_kept_columns(self):
+        selected = self.batch.select([True, False, True])
+        self.assertEqual([self.events[0], self.events[2], self.events[3], self.events[4]], list(selected))
+        self.assertEqual(1.4, selected.last_timestamp())
+        self.assertEqual([self.events[1]], list(self.batch.select([False, True, False])))
+        self.assertIs(self.batch, self.batch.select([True, True, True]))
+        self.assertIsNone(self.batch.select([False, False, False]))
+
+    def test_item_size_and_first_timestamp(self):
+        self.assertEqual(5, event_batch.item_size(self.batch))
+        self.assertEqual(1, event_batch.item_size(self.events[0]))
+        self.assertEqual(1.0, event_batch.first_timestamp(self.events[0]))
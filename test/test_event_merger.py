@@ -0,0 +1,98 @@
+import unittest
+import Queue
+
+import bounded_channel
+import event_batch
+import event_merger
+
+
+class FakeParser(object):
+    def __init__(self, timestamps, name='parser'):
+        self.events_queue = Queue.Queue()
+        for timestamp in timestamps:
+            self.events_queue.put([timestamp, '/muse/eeg', 's', [name], 0])
+        last = timestamps[-1] if timestamps else 0
+        self.events_queue.put([last + 0.001, 'done'])
+
+
+def merge(*parsers):
+    output = bounded_channel.BoundedChannel(0)
+    merger = event_merger.EventMerger(parsers, output)
+    merger.run()
+    events = []
+    while not output.empty():
+        events.append(output.get())
+    return merger, events
+
+
+class EventMergerTest(unittest.TestCase):
+
+    def test_single_parser_keeps_file_order(self):
+        merger, events = merge(FakeParser([3, 1, 2]))
+        self.assertEqual([3, 1, 2], [e[0] for e in events[:-1]])
+        self.assertEqual(3, merger.merged_events)
+
+    def test_interleaves_by_timestamp(self):
+        merger, events = merge(FakeParser([1, 4, 5]),
+                                    FakeParser([2, 3, 6]),
+                                    FakeParser([0, 7]))
+        self.assertEqual([0, 1, 2, 3, 4, 5, 6, 7], [e[0] for e in events[:-1]])
+        self.assertEqual(8, merger.merged_events)
+
+    def test_equal_timestamps_prefer_later_parser(self):
+        merger, events = merge(FakeParser([1], 'first'),
+                                    FakeParser([1], 'second'))
+        self.assertEqual(['second', 'first'], [e[3][0] for e in events[:-1]])
+
+    def test_ends_with_single_done_after_last_parser(self):
+        merger, events = merge(FakeParser([1, 2]), FakeParser([5]))
+        self.assertEqual('done', events[-1][1])
+        self.assertAlmostEqual(5.101, events[-1][0])
+        self.assertEqual(1, len([e for e in events if 'done' in e]))
+
+    def test_empty_parsers_still_finish(self):
+        merger, events = merge(FakeParser([]), FakeParser([]))
+        self.assertEqual(1, len(events))
+        self.assertEqual('done', events[0][1])
+        self.assertEqual(0, merger.merged_events)
+
+
+class BatchParser(object):
+    def __init__(self, batches, name='parser'):
+        self.events_queue = Queue.Queue()
+        last = 0
+        for timestamps in batches:
+            self.events_queue.put(event_batch.EventBatch.from_events(
+                [[t, '/muse/eeg', 's', [name], 0] for t in timestamps]))
+            last = timestamps[-1]
+        self.events_queue.put([last + 0.001, 'done'])
+
+
+class EventMergerBatchTest(unittest.TestCase):
+    def flatten(self, items):
+        events = []
+        for item in items:
+            if isinstance(item, event_batch.EventBatch):
+                events.extend(item)
+            else:
+                events.append(item)
+        return events
+
+    def test_single_parser_forwards_whole_batches(self):
+        merger, items = merge(BatchParser([[1, 2, 3], [4, 5]]))
+        self.assertEqual([3, 2], [len(item) for item in items[:-1]])
+        self.assertEqual(5, merger.merged_events)
+
+    def test_batches_are_split_to_interleave(self):
+        merger, items = merge(BatchParser([[1, 2, 5, 6]], 'a'),
+                                   BatchParser([[3, 4], [7]], 'b'))
+        events = self.flatten(items)
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7], [e[0] for e in events[:-1]])
+        self.assertEqual(7, merger.merged_events)
+
+    def test_batches_and_single_events_merge_with_ties(self):
+        merger, items = merge(BatchParser([[1, 2, 3]], 'batch'),
+                                   FakeParser([2], 'single'))
+        events = self.flatten(items)
+        self.assertEqual(['batch', 'single', 'batch', 'batch'],
+                         [e[3][0] for e in events[:-1]])
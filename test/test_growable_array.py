@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from growable_array import GrowableArray
+
+
+class GrowableArrayTest(unittest.TestCase):
+    def test_empty_array_views_as_an_empty_vector(self):
+        rows = GrowableArray()
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(rows.view().shape, (0,))
+
+    def test_rows_and_blocks_are_kept_in_order_across_growth(self):
+        rows = GrowableArray(capacity=2)
+        rows.append([1, 2])
+        rows.append_block(np.array([[3.0, 4.0], [5.0, 6.0], [7.0, 8.0]]))
+        rows.append((9, 10.5))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows.view().dtype, np.float64)
+        np.testing.assert_array_equal(rows.view(), [[1, 2], [3, 4], [5, 6], [7, 8], [9, 10.5]])
+
+    def test_columns_are_set_by_the_first_row(self):
+        rows = GrowableArray()
+        self.assertIsNone(rows.columns())
+        rows.append([1.0, 2.0, 3.0])
+        self.assertEqual(rows.columns(), 3)
+        self.assertRaises(ValueError, rows.append, [1.0])
+
+    def test_empty_block_is_ignored(self):
+        rows = GrowableArray()
+        rows.append_block(np.empty((0, 4)))
+        self.assertIsNone(rows.columns())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import mock
 
 import input_handler
+import liblo
+import osc_packet
 
 
 @mock.patch('time.sleep')
@@ -45,3 +47,78 @@ class InputHandlerTest(unittest.TestCase):
     def test_start_file_sleeps_with_timestamp_appropriate_time(self, sleep, display_playback, time):
         # TODO
         raise unittest.SkipTest
+
+
+class FakeServer(object):
+    "Delivers one list of packets per blocking recv, each packet a list of (path, args) with an optional timetag."
+    def __init__(self, listener, wakeups):
+        self.listener = listener
+        self.wakeups = list(wakeups)
+        self.waiting = []
+
+    def recv(self, timeout):
+        if timeout:
+            if not self.wakeups:
+                self.listener.done = True
+                return False
+            self.waiting = list(self.wakeups.pop(0))
+        if not self.waiting:
+            return False
+        timetag, messages = self.waiting.pop(0)
+        if timetag is not None:
+            self.listener.bundle_start(timetag)
+        for path, args in messages:
+            self.listener.receive_message(path, args, 'f' * len(args), None)
+        if timetag is not None:
+            self.listener.bundle_end()
+        return True
+
+
+class OSCListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = mock.MagicMock()
+
+    def receive(self, listener, wakeups):
+        server = FakeServer(listener, wakeups)
+        while not listener.done:
+            listener.receive_pending([server])
+        return [call[0][0] for call in self.queue.put.call_args_list]
+
+    @mock.patch('time.time', return_value=100.0)
+    def test_messages_are_queued_one_by_one_without_batch(self, *unused):
+        listener = input_handler.OSCListener(self.queue, 'udp:5000')
+        queued = self.receive(listener, [[(None, [('/muse/eeg', [1.0])]), (None, [('/muse/acc', [2.0])])]])
+        self.assertEqual([[100.0, '/muse/eeg', 'f', [1.0], 0], [100.0, '/muse/acc', 'f', [2.0], 0]], queued)
+
+    @mock.patch('time.time', return_value=100.0)
+    def test_batch_holds_all_messages_of_a_wakeup(self, *unused):
+        listener = input_handler.OSCListener(self.queue, 'udp:5000', batch=True)
+        queued = self.receive(listener, [[(None, [('/muse/eeg', [1.0])]), (None, [('/muse/eeg', [2.0])])],
+                                         [(None, [('/muse/acc', [3.0])])]])
+        self.assertEqual([2, 1], [len(batch) for batch in queued])
+        self.assertEqual([[100.0, '/muse/eeg', 'f', [1.0], 0], [100.0, '/muse/eeg', 'f', [2.0], 0]],
+                         [[event[0], event[1], event[2], list(event[3]), event[4]] for event in queued[0]])
+        self.assertEqual((3, 2), (listener.received_messages, listener.received_batches))
+
+    @mock.patch('time.time', return_value=100.0)
+    def test_bundle_timetags_are_used_as_timestamps(self, *unused):
+        listener = input_handler.OSCListener(self.queue, 'udp:5000')
+        timetag = osc_packet.timetag_from_unix(50.0)
+        queued = self.receive(listener, [[(timetag, [('/muse/eeg', [1.0]), ('/muse/acc', [2.0])]),
+                                          (1.0 / 2 ** 32, [('/muse/eeg', [3.0])])]])
+        self.assertEqual([50.0, 50.0, 100.0], [msg[0] for msg in queued])
+
+    def test_port_lists(self):
+        self.assertEqual([5000], input_handler.OSCListener.parse_ports('5000'))
+        self.assertEqual([5000, 5001, 5002, 5005], input_handler.OSCListener.parse_ports('5000-5002,5005'))
+        self.assertEqual(None, input_handler.OSCListener.parse_ports('udp'))
+        listener = input_handler.OSCListener(self.queue, 'udp:5000-5003')
+        self.assertEqual(([5000, 5001, 5002, 5003], liblo.UDP), (listener.ports, listener.port_type))
+        self.assertRaises(ValueError, input_handler.OSCListener, self.queue, 'udp:abc')
+        self.assertRaises(ValueError, input_handler.OSCListener, self.queue, 'tcp:5000-')
+
+    @mock.patch('time.time', return_value=100.0)
+    def test_messages_are_tagged_with_their_source(self, *unused):
+        listener = input_handler.OSCListener(self.queue, 'udp:5000-5001')
+        listener.receive_message('/muse/eeg', [1.0], 'f', None, 5001)
+        self.assertEqual([100.0, '/source5001/muse/eeg', 'f', [1.0], 0], self.queue.put.call_args[0][0])
@@ -0,0 +1,96 @@
+import gzip
+import os
+import Queue
+import shutil
+import StringIO
+import tempfile
+import threading
+import unittest
+
+import mock
+
+import input_handler
+import input_stream
+import muse_chunk_scanner
+import osc_binary
+
+
+class InputStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @mock.patch('input_stream.BLOCK_SIZE', 5)
+    def test_peek_read_and_readline_across_blocks(self):
+        stream = input_stream.InputStream(StringIO.StringIO('OSCB first line\nsecond\n\nlast'), 'pipe')
+        self.assertEqual('OSCB', input_stream.peek(stream, 4))
+        self.assertTrue(osc_binary.is_binary(stream))
+        self.assertEqual('OSCB ', stream.read(5))
+        self.assertEqual(['first line\n', 'second\n', '\n', 'last'], list(stream))
+        self.assertEqual('', stream.read())
+
+    def test_read_version_does_not_seek_a_stream(self):
+        stream = input_stream.InputStream(StringIO.StringIO('\x05\x00\x00\x00\x02\x00hello'), 'pipe')
+        self.assertEqual(2, muse_chunk_scanner.read_version(stream))
+        self.assertEqual(['hello'], [str(chunk.payload) for chunk in muse_chunk_scanner.MuseChunkScanner(stream)])
+
+    def test_plain_files_are_opened_as_files(self):
+        path = os.path.join(self.directory, 'in.osc')
+        open(path, 'w').close()
+        in_stream = input_stream.open_input(path)
+        self.assertTrue(input_stream.is_seekable(in_stream))
+        in_stream.close()
+
+    def test_named_pipe_is_streamed(self):
+        path = os.path.join(self.directory, 'pipe')
+        os.mkfifo(path)
+
+        def write():
+            with open(path, 'w') as file_handle:
+                file_handle.write('1.0 /muse/batt iiii 95 3900 3800 30\n')
+        writer = threading.Thread(target=write)
+        writer.start()
+        in_stream = input_stream.open_input(path)
+        self.assertFalse(input_stream.is_seekable(in_stream))
+        self.assertEqual(['1.0 /muse/batt iiii 95 3900 3800 30\n'], list(in_stream))
+        writer.join()
+
+    @mock.patch('input_stream.BLOCK_SIZE', 100)
+    def test_gzip_is_decompressed_ahead(self):
+        path = os.path.join(self.directory, 'in.osc.gz')
+        lines = ['%d /muse/acc fff 1.0 2.0 3.0\n' % i for i in range(1000)]
+        gzip_file = gzip.open(path, 'wb')
+        gzip_file.write(''.join(lines))
+        gzip_file.close()
+        in_stream = input_stream.open_input(path)
+        self.assertFalse(input_stream.is_seekable(in_stream))
+        self.assertEqual(lines, list(in_stream))
+
+    def test_corrupted_gzip_raises_ioerror(self):
+        path = os.path.join(self.directory, 'in.osc.gz')
+        with open(path, 'wb') as file_handle:
+            file_handle.write('not gzip data')
+        self.assertRaises(IOError, input_stream.open_input(path).read)
+
+    def test_any_decompressor_error_ends_the_stream(self):
+        path = os.path.join(self.directory, 'in.osc.gz')
+        with open(path, 'wb') as file_handle:
+            file_handle.write('\x1f\x8b\x08 anything')
+        decompressor = mock.MagicMock()
+        decompressor.decompress.side_effect = RuntimeError("unexpected")
+        with mock.patch('input_stream._decompressor', return_value=decompressor):
+            self.assertRaises(IOError, input_stream.open_input(path).read)
+
+    def test_empty_compressed_muse_file_ends_the_outputs(self):
+        path = os.path.join(self.directory, 'empty.muse.gz')
+        gzip.open(path, 'wb').close()
+        queue = Queue.Queue()
+        reader = input_handler.MuseProtoBufFileReader(queue)
+        self.assertRaises(IOError, reader.parse_files, [path], False, True, False)
+        self.assertEqual(['done'], queue.get(timeout=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
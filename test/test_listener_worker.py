@@ -0,0 +1,122 @@
+import threading
+import unittest
+
+import event_batch
+import listener_worker
+import output_handler
+
+
+class GatedListener(output_handler.OutputHandler):
+    "Records messages. The first one is held until release() is called."
+    def __init__(self):
+        self.received = []
+        self.holding = threading.Event()
+        self.gate = threading.Event()
+        self.options = None
+
+    def set_options(self, verbose, filters):
+        self.options = (verbose, filters)
+
+    def receive_msg(self, msg):
+        if not self.received:
+            self.holding.set()
+            self.gate.wait(5)
+        self.received.append(msg)
+
+    def release(self):
+        self.gate.set()
+
+
+class FailingListener(output_handler.OutputHandler):
+    "Raises IOError for every message, like a writer on a full disk."
+    def __init__(self):
+        self.calls = 0
+
+    def set_options(self, verbose, filters):
+        pass
+
+    def receive_msg(self, msg):
+        self.calls += 1
+        raise IOError("No space left on device")
+
+
+def event(timestamp, path='/muse/eeg'):
+    return [timestamp, path, 'f', [1.0], 0]
+
+
+class ListenerWorkerTest(unittest.TestCase):
+    def start_worker(self, policy, capacity=2, drop_paths=None):
+        listener = GatedListener()
+        worker = listener_worker.ListenerWorker(listener, 'test', capacity, policy, drop_paths)
+        worker.set_options(False, None)
+        worker.receive_msg(event(1.0))
+        self.assertTrue(listener.holding.wait(5))
+        return listener, worker
+
+    def test_events_are_delivered_in_order_before_done_returns(self):
+        listener, worker = self.start_worker(listener_worker.BLOCK, capacity=10)
+        self.assertEqual((False, None), listener.options)
+        worker.receive_msg(event(2.0))
+        worker.receive_batch(event_batch.EventBatch.from_events([event(3.0), event(4.0, '/muse/acc')]))
+        listener.release()
+        worker.receive_msg('done')
+        self.assertEqual([1.0, 2.0, 3.0, 4.0, 'd'], [msg[0] for msg in listener.received])
+        self.assertEqual(0.0, worker.lag())
+
+    def test_lag_is_measured_while_the_listener_is_held(self):
+        listener, worker = self.start_worker(listener_worker.BLOCK, capacity=10)
+        worker.receive_msg(event(3.5))
+        self.assertEqual(2.5, worker.lag())
+        self.assertEqual(2.5, worker.stats()['lag'])
+        listener.release()
+        worker.receive_msg('done')
+
+    def test_drop_oldest_never_blocks_the_caller(self):
+        listener, worker = self.start_worker(listener_worker.DROP_OLDEST)
+        for timestamp in [2.0, 3.0, 4.0, 5.0]:
+            worker.receive_msg(event(timestamp))
+        stats = worker.stats()
+        self.assertEqual(2, stats['dropped'])
+        self.assertEqual(0, stats['put_blocked_count'])
+        listener.release()
+        worker.receive_msg('done')
+        self.assertEqual([1.0, 4.0, 5.0], [msg[0] for msg in listener.received[:-1]])
+
+    def test_drop_paths_only_drops_matching_paths(self):
+        listener, worker = self.start_worker(listener_worker.DROP_PATHS, drop_paths=['/muse/elements'])
+        worker.receive_msg(event(2.0))
+        worker.receive_msg(event(3.0, '/muse/elements/alpha_absolute'))
+        worker.receive_msg(event(4.0, '/muse/elements/beta_absolute'))
+        worker.receive_batch(event_batch.EventBatch.from_events([event(5.0, '/muse/elements/horseshoe')]))
+        self.assertEqual(2, worker.stats()['dropped'])
+
+        # a path that may not be dropped waits for room
+        sender = threading.Thread(target=worker.receive_msg, args=[event(6.0)])
+        sender.start()
+        sender.join(0.2)
+        self.assertTrue(sender.is_alive())
+        listener.release()
+        sender.join(5)
+        worker.receive_msg('done')
+        self.assertEqual([1.0, 2.0, 3.0, 6.0], [msg[0] for msg in listener.received[:-1]])
+
+    def test_failing_listener_never_blocks_the_caller(self):
+        listener = FailingListener()
+        worker = listener_worker.ListenerWorker(listener, 'test', 2, listener_worker.BLOCK)
+        worker.set_options(False, None)
+        caller = threading.Thread(target=lambda: [worker.receive_msg(event(float(timestamp)))
+                                                  for timestamp in range(20)])
+        caller.daemon = True
+        caller.start()
+        caller.join(5)
+        self.assertFalse(caller.isAlive())
+        self.assertRaises(IOError, worker.receive_msg, 'done')
+        self.assertEqual(1, listener.calls)
+        self.assertIsInstance(worker.error, IOError)
+
+    def test_unknown_policy_is_rejected(self):
+        self.assertRaises(ValueError, listener_worker.ListenerWorker, GatedListener(), 'test', 10, 'drop-newest')
+
+
+if __name__ == '__main__':
+    unittest.main()
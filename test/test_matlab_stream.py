@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import h5py
+import hdf5storage as h5
+import numpy as np
+
+import matlab_stream
+
+
+class MatlabStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'test.mat')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rows_and_blocks_are_appended_in_order(self):
+        stream = matlab_stream.MatlabStream(self.file_name)
+        stream.append((u'IXDATA', u'raw', u'eeg', u'data'), [1.0, 2.0])
+        stream.append_block((u'IXDATA', u'raw', u'eeg', u'data'), np.array([[3.0, 4.0], [5.0, 6.0]]))
+        stream.append((u'IXDATA', u'raw', u'eeg', u'data'), [7.0, 8.0])
+        stream.finish({u'IXDATA': {u'sessionID': np.array([])}})
+
+        data = h5.read(path='/IXDATA/raw/eeg/data', filename=self.file_name)
+        np.testing.assert_array_equal(data, [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0], [7.0, 8.0]])
+        self.assertFalse(os.path.exists(self.file_name + matlab_stream.SCRATCH_SUFFIX))
+
+    def test_streamed_arrays_get_the_matlab_attributes_of_a_written_array(self):
+        stream = matlab_stream.MatlabStream(self.file_name)
+        for i in range(matlab_stream.BLOCK_ROWS + 10):
+            stream.append((u'elements', u'alpha_absolute'), [float(i), 0.5])
+        stream.finish({u'config': [u'{}']})
+
+        with h5py.File(self.file_name, 'r') as in_file:
+            dataset = in_file['elements/alpha_absolute']
+            self.assertEqual(dataset.shape, (2, matlab_stream.BLOCK_ROWS + 10))
+            self.assertEqual(dataset.attrs['MATLAB_class'], 'double')
+            self.assertEqual(list(dataset.attrs['Python.Shape']), [matlab_stream.BLOCK_ROWS + 10, 2])
+            self.assertEqual(list(in_file['elements'].attrs['Python.Fields']), [u'alpha_absolute'])
+            self.assertIn('config', in_file)
+
+    def test_finish_without_streamed_arrays_writes_the_dataset(self):
+        stream = matlab_stream.MatlabStream(self.file_name)
+        stream.finish({u'IXDATA': {u'sessionID': np.array([[1.0]])}})
+
+        self.assertEqual(h5.read(path='/IXDATA/sessionID', filename=self.file_name), [[1.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
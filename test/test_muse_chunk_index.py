@@ -0,0 +1,106 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import muse_chunk_index
+import proto_reader_v2
+from Muse_v2 import MuseDataCollection, MuseData, EEG, MuseConfig
+
+
+def write_chunk(file_handle, collection):
+    data_bytes = collection.SerializeToString()
+    file_handle.write(struct.pack("<ih", len(data_bytes), 2))
+    file_handle.write(data_bytes)
+
+
+def add_eeg(collection, timestamp):
+    muse_data = collection.collection.add()
+    muse_data.timestamp = timestamp
+    muse_data.datatype = MuseData.EEG
+    muse_data.Extensions[EEG.museData].values.extend([1.0, 2.0, 3.0, 4.0])
+
+
+def add_config(collection, timestamp):
+    muse_data = collection.collection.add()
+    muse_data.timestamp = timestamp
+    muse_data.datatype = MuseData.CONFIG
+    muse_data.Extensions[MuseConfig.museData].mac_addr = 'mac'
+
+
+class MuseChunkIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'test.muse')
+        # config chunk followed by ten one-second chunks of EEG
+        with open(self.file_name, 'wb') as file_handle:
+            collection = MuseDataCollection()
+            add_config(collection, 100.0)
+            write_chunk(file_handle, collection)
+            for second in range(10):
+                collection = MuseDataCollection()
+                for sample in range(4):
+                    add_eeg(collection, 100.0 + second + sample * 0.25)
+                write_chunk(file_handle, collection)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build_records_chunk_timestamps_and_datatypes(self):
+        index = muse_chunk_index.MuseChunkIndex.build(self.file_name)
+        self.assertEqual(11, len(index))
+        self.assertEqual(0, index.chunks[0].offset)
+        self.assertEqual([MuseData.CONFIG], index.chunks[0].datatypes)
+        self.assertEqual([MuseData.EEG], index.chunks[1].datatypes)
+        self.assertEqual((101.0, 101.75), (index.chunks[2].first, index.chunks[2].last))
+        self.assertEqual(100.0, index.first_timestamp())
+        self.assertEqual(109.75, index.last_timestamp())
+
+    def test_seek_finds_chunk_range_and_metadata_preamble(self):
+        index = muse_chunk_index.MuseChunkIndex.build(self.file_name)
+        chunk_range = index.seek(103.5, 105.5)
+        self.assertEqual([0], chunk_range.preamble)
+        self.assertEqual(index.chunks[4].offset, chunk_range.offset)
+        self.assertEqual(index.chunks[7].offset, chunk_range.stop)
+
+    def test_seek_without_bounds_covers_whole_file(self):
+        index = muse_chunk_index.MuseChunkIndex.build(self.file_name)
+        chunk_range = index.seek()
+        self.assertEqual([], chunk_range.preamble)
+        self.assertEqual(0, chunk_range.offset)
+        self.assertIsNone(chunk_range.stop)
+
+    def test_seek_past_end_reads_nothing(self):
+        index = muse_chunk_index.MuseChunkIndex.build(self.file_name)
+        self.assertIsNone(index.seek(200.0).offset)
+
+    def test_load_or_build_writes_sidecar_and_reuses_it(self):
+        index = muse_chunk_index.MuseChunkIndex.load_or_build(self.file_name)
+        self.assertTrue(os.path.exists(self.file_name + '.idx'))
+        loaded = muse_chunk_index.MuseChunkIndex.load(self.file_name)
+        self.assertEqual([chunk.to_list() for chunk in index.chunks],
+                         [chunk.to_list() for chunk in loaded.chunks])
+
+    def test_stale_sidecar_is_ignored(self):
+        muse_chunk_index.MuseChunkIndex.load_or_build(self.file_name)
+        with open(self.file_name, 'ab') as file_handle:
+            collection = MuseDataCollection()
+            add_eeg(collection, 110.0)
+            write_chunk(file_handle, collection)
+        self.assertIsNone(muse_chunk_index.MuseChunkIndex.load(self.file_name))
+        self.assertEqual(12, len(muse_chunk_index.MuseChunkIndex.load_or_build(self.file_name)))
+
+    def test_reader_replays_metadata_and_events_in_range(self):
+        index = muse_chunk_index.MuseChunkIndex.build(self.file_name)
+        reader = proto_reader_v2.MuseProtoBufReaderV2(False, 0)
+        reader.seek(index.seek(103.5, 105.5), 103.5, 105.5)
+        with open(self.file_name, 'rb') as in_stream:
+            reader.parse(in_stream)
+        events = []
+        while not reader.events_queue.empty():
+            events.append(reader.events_queue.get())
+        self.assertEqual([103.5, '/muse/config'], events[0][:2])
+        self.assertEqual([103.5 + i * 0.25 for i in range(9)],
+                         [event[0] for event in events[1:-1]])
+        self.assertEqual('done', events[-1][1])
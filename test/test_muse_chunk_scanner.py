@@ -0,0 +1,76 @@
+import os
+import shutil
+import StringIO
+import struct
+import tempfile
+import unittest
+
+import muse_chunk_scanner
+
+
+def frame(version, payload):
+    return struct.pack("<ih", len(payload), version) + payload
+
+
+class MuseChunkScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open_file(self, data):
+        path = os.path.join(self.directory, 'test.muse')
+        with open(path, 'wb') as file_handle:
+            file_handle.write(data)
+        in_stream = open(path, 'rb')
+        self.addCleanup(in_stream.close)
+        return in_stream
+
+    def scan(self, in_stream, offset=None):
+        scanner = muse_chunk_scanner.MuseChunkScanner(in_stream, offset)
+        chunks = [(chunk.offset, chunk.version, chunk.length, str(chunk.payload)) for chunk in scanner]
+        scanner.close()
+        return chunks
+
+    def test_file_is_mapped_and_chunks_are_read_in_place(self):
+        in_stream = self.open_file(frame(2, 'abc') + frame(2, 'defgh'))
+        scanner = muse_chunk_scanner.MuseChunkScanner(in_stream)
+        self.assertTrue(scanner.is_mapped())
+        chunks = list(scanner)
+        self.assertIsInstance(chunks[0].payload, buffer)
+        self.assertEqual([(0, 2, 3, 'abc'), (9, 2, 5, 'defgh')],
+                         [(c.offset, c.version, c.length, str(c.payload)) for c in chunks])
+        self.assertEqual(20, scanner.offset)
+        scanner.close()
+
+    def test_stream_fallback_yields_same_chunks(self):
+        data = frame(1, 'abc') + frame(2, '') + frame(2, 'xy')
+        mapped = self.scan(self.open_file(data))
+        streamed = self.scan(StringIO.StringIO(data))
+        self.assertEqual(mapped, streamed)
+        self.assertEqual([(0, 1, 3, 'abc'), (9, 2, 0, ''), (15, 2, 2, 'xy')], streamed)
+
+    def test_truncated_payload_is_incomplete(self):
+        data = frame(2, 'abc') + struct.pack("<ih", 10, 2) + 'short'
+        for in_stream in [self.open_file(data), StringIO.StringIO(data)]:
+            scanner = muse_chunk_scanner.MuseChunkScanner(in_stream)
+            chunks = list(scanner)
+            self.assertTrue(chunks[0].is_complete())
+            self.assertFalse(chunks[1].is_complete())
+            self.assertEqual('short', str(chunks[1].payload))
+            scanner.close()
+
+    def test_scan_starts_at_offset(self):
+        data = frame(2, 'abc') + frame(2, 'de')
+        self.assertEqual([(9, 2, 2, 'de')], self.scan(self.open_file(data), 9))
+        self.assertEqual([(9, 2, 2, 'de')], self.scan(StringIO.StringIO(data), 9))
+
+    def test_empty_file_has_no_chunks(self):
+        self.assertEqual([], self.scan(self.open_file('')))
+
+    def test_read_version_does_not_consume_stream(self):
+        in_stream = StringIO.StringIO(frame(2, 'abc'))
+        self.assertEqual(2, muse_chunk_scanner.read_version(in_stream))
+        self.assertEqual(0, in_stream.tell())
+        self.assertIsNone(muse_chunk_scanner.read_version(StringIO.StringIO('')))
@@ -0,0 +1,113 @@
+import gzip
+import os
+import Queue
+import random
+import shutil
+import tempfile
+import unittest
+
+import input_handler
+import osc_binary
+import output_handler
+
+
+def read_events(reader):
+    events = []
+    while True:
+        event = reader.events_queue.get()
+        if 'done' in event:
+            return events
+        events.append(event)
+
+
+class OSCBinaryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'capture.oscb')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, events, index=True):
+        writer = output_handler.OSCBinaryFileWriter(self.file_name, index)
+        writer.set_options(False, None)
+        for event in events:
+            writer.receive_msg(event)
+        writer.receive_msg([0, 'done'])
+        return writer
+
+    def read(self, start=None, end=None):
+        reader = input_handler.oscBinaryFileReader(capacity=0, start=start, end=end)
+        with open(self.file_name, 'rb') as file_handle:
+            self.assertTrue(osc_binary.is_binary(file_handle))
+            reader.read_file(file_handle)
+        return read_events(reader)
+
+    def test_messages_round_trip(self):
+        events = [[1400000000.123456789, '/muse/eeg', 'ffff', [1.5, 2.5, 3.5, 4.5], 0],
+                  [1400000000.2, '/muse/config', 's', ['{"preset": "14"}'], 0],
+                  [1400000000.3, '/lab/stimulus/onset', 'ihs', [7, 2 ** 40, 'tone'], 0]]
+        writer = self.write(events)
+        self.assertEqual(3, writer.data_written)
+        self.assertEqual(events, self.read())
+
+    def test_start_and_end_seek_through_the_index(self):
+        events = [[1000.0 + i * 0.1, '/muse/acc', 'fff', [float(i), 0.0, 0.0], 0] for i in range(100)]
+        self.write(events)
+        index = osc_binary.BinaryIndex.load(self.file_name)
+        self.assertEqual(10, len(index.entries))
+        self.assertEqual(events[25:61], self.read(start=2.5, end=6.0))
+
+    def test_start_without_index(self):
+        events = [[1000.0 + i * 0.1, '/muse/acc', 'fff', [float(i), 0.0, 0.0], 0] for i in range(30)]
+        self.write(events, index=False)
+        self.assertEqual(None, osc_binary.BinaryIndex.load(self.file_name))
+        self.assertEqual(events[25:], self.read(start=2.5))
+
+    def test_truncated_last_record_ends_the_file(self):
+        events = [[1000.0 + i, '/muse/eeg', 'f', [float(i)], 0] for i in range(3)]
+        self.write(events)
+        with open(self.file_name, 'r+b') as file_handle:
+            file_handle.truncate(os.path.getsize(self.file_name) - 2)
+        self.assertEqual(events[:2], self.read())
+
+    def write_corrupt_compressed(self, count):
+        "The file of count events gzipped with a wrong CRC-32 (\"incorrect data check\")."
+        events = [[1000.0 + i * 0.1, '/muse/acc', 'fff', [random.random(), random.random(), random.random()], 0]
+                  for i in range(count)]
+        self.write(events, index=False)
+        compressed_name = self.file_name + '.gz'
+        with open(self.file_name, 'rb') as file_handle:
+            data = file_handle.read()
+        with gzip.open(compressed_name, 'wb') as file_handle:
+            file_handle.write(data)
+        with open(compressed_name, 'r+b') as file_handle:
+            file_handle.seek(-8, os.SEEK_END)
+            file_handle.write('\0\0\0\0')
+        return compressed_name
+
+    def test_corrupt_compressed_file_ends_the_outputs(self):
+        # the error is met by the reader thread (a large file) or by the format check (a small one)
+        for count in [50000, 100]:
+            queue = Queue.Queue()
+            reader = input_handler.MuseOSCFileReader(queue)
+            self.assertRaises(IOError, reader.parse_files, [self.write_corrupt_compressed(count)], False, True, False)
+            outputs = []
+            while not queue.empty():
+                outputs.append(queue.get())
+            self.assertEqual(['done'], outputs[-1])
+            if count > 100:
+                self.assertTrue(len(outputs) > 1)
+                self.assertIsInstance(reader.oscfile_reader[0].error, IOError)
+
+    def test_text_files_are_not_binary(self):
+        with open(self.file_name, 'wb') as file_handle:
+            file_handle.write('1.0 /muse/eeg f 1.0\n')
+        with open(self.file_name, 'rb') as file_handle:
+            self.assertFalse(osc_binary.is_binary(file_handle))
+            self.assertEqual(0, file_handle.tell())
+            self.assertRaises(ValueError, list, osc_binary.read_records(file_handle))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import osc_codec
+import osc_packet
+
+
+class OSCCodecTest(unittest.TestCase):
+    def test_message_encoding(self):
+        self.assertEqual('/a\0\0,if\0\0\0\0\x01?\x80\0\0', osc_codec.encode_message('/a', 'if', [1, 1.0]))
+
+    def test_message_round_trip(self):
+        args = [1, 0.5, 2.25, 'text', 'bytes', 2 ** 40, True, None, 'x']
+        data = osc_codec.encode_message('/muse/elements/note', 'ifdsbhTNc', args)
+        self.assertEqual(osc_packet.message_size('/muse/elements/note', 'ifdsbhTNc', args), len(data))
+        self.assertEqual([(None, '/muse/elements/note', 'ifdsbhTNc', args)], osc_codec.decode_packet(data))
+
+    def test_unicode_paths_and_strings_are_encoded_as_utf8(self):
+        self.assertEqual(osc_codec.encode_message('/a', 's', ['b']), osc_codec.encode_message(u'/a', 's', [u'b']))
+
+    def test_bundle_round_trip(self):
+        timetag = osc_packet.timetag_from_unix(1400000000.25)
+        inner = osc_codec.encode_bundle(timetag + 1, [osc_codec.encode_message('/c', 'f', [3.0])])
+        data = osc_codec.encode_bundle(timetag, [osc_codec.encode_message('/a', 'f', [1.0]),
+                                                 osc_codec.encode_message('/b', 's', ['two']), inner])
+        self.assertEqual(osc_packet.bundle_size([12, 12, len(inner)]), len(data))
+        self.assertEqual([(timetag, '/a', 'f', [1.0]), (timetag, '/b', 's', ['two']), (timetag + 1, '/c', 'f', [3.0])],
+                         osc_codec.decode_packet(data))
+
+    def test_truncated_packets_are_rejected(self):
+        data = osc_codec.encode_message('/muse/eeg', 'ffff', [1.0, 2.0, 3.0, 4.0])
+        self.assertRaises(ValueError, osc_codec.decode_packet, data[:-2])
+        bundle = osc_codec.encode_bundle(osc_codec.IMMEDIATELY, [data])
+        self.assertRaises(ValueError, osc_codec.decode_packet, bundle[:-4])
+
+    def test_framings_reassemble_split_packets(self):
+        packets = [osc_codec.encode_message('/a', 'i', [0xc0]), '\xdb\xc0\xdd', osc_codec.encode_message('/b', '', [])]
+        for framing in (osc_codec.LengthPrefixFraming, osc_codec.SlipFraming):
+            stream = ''.join(framing.encode(packet) for packet in packets)
+            decoder = framing()
+            received = []
+            for offset in range(0, len(stream), 3):
+                received.extend(decoder.feed(stream[offset:offset + 3]))
+            self.assertEqual(packets, received)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+import osc_packet
+
+
+class OSCPacketTest(unittest.TestCase):
+    def test_string_sizes_include_the_null_and_padding(self):
+        self.assertEqual(4, osc_packet.string_size(0))
+        self.assertEqual(4, osc_packet.string_size(3))
+        self.assertEqual(8, osc_packet.string_size(4))
+        self.assertEqual(8, osc_packet.blob_size(3))
+
+    def test_message_size(self):
+        # "/muse/eeg\0\0\0" + ",ffff\0\0\0" + 4 floats
+        self.assertEqual(12 + 8 + 16, osc_packet.message_size('/muse/eeg', 'ffff', [1.0, 2.0, 3.0, 4.0]))
+        # "/muse/annotation\0\0\0\0" + ",sid\0\0\0\0" + "abc\0" + int + double
+        self.assertEqual(20 + 8 + 4 + 4 + 8, osc_packet.message_size('/muse/annotation', 'sid', ['abc', 1, 2.0]))
+
+    def test_bundle_size(self):
+        self.assertEqual(16 + 4 + 36 + 4 + 20, osc_packet.bundle_size([36, 20]))
+
+    def test_timetags_count_from_1900(self):
+        self.assertEqual(2208988800.0 + 1.5, osc_packet.timetag_from_unix(1.5))
+        self.assertEqual(1.5, osc_packet.unix_from_timetag(osc_packet.timetag_from_unix(1.5)))
+        # the 'immediately' timetag
+        self.assertEqual(None, osc_packet.unix_from_timetag(1.0 / 2 ** 32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import input_handler
+import osc_replay_ranges
+
+DATA = os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'test_data', 'raw_20sec.osc')
+
+
+def read_events(reader):
+    events = []
+    while True:
+        event = reader.events_queue.get()
+        events.append(event)
+        if 'done' in event:
+            return events
+
+
+class ByteRangesTest(unittest.TestCase):
+    def test_ranges_cover_the_file_at_line_ends(self):
+        ranges = osc_replay_ranges.byte_ranges(DATA, 100000)
+        self.assertTrue(len(ranges) > 10)
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(os.path.getsize(DATA), ranges[-1][1])
+        lines = []
+        for (start, stop), (next_start, _) in zip(ranges, ranges[1:] + [(ranges[-1][1], None)]):
+            self.assertEqual(stop, next_start)
+            lines.extend(osc_replay_ranges.read_lines(DATA, start, stop))
+        with open(DATA, 'rb') as file_handle:
+            self.assertEqual(file_handle.readlines(), lines)
+
+
+class PoolParsingTest(unittest.TestCase):
+    def test_pool_gives_the_events_of_sequential_parsing(self):
+        sequential = input_handler.oscFileReader(capacity=0)
+        with open(DATA, 'rb') as file_handle:
+            sequential.read_file(file_handle)
+
+        pool = multiprocessing.Pool(2, input_handler.init_range_worker)
+        try:
+            parallel = input_handler.oscFileReader(capacity=0)
+            parallel.set_pool(pool, 4, range_size=100000)
+            with open(DATA, 'rb') as file_handle:
+                parallel.read_file(file_handle)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(repr(read_events(sequential)), repr(read_events(parallel)))
+
+    def test_malformed_line_ends_the_events_with_done(self):
+        directory = tempfile.mkdtemp()
+        file_name = os.path.join(directory, 'bad.osc')
+        with open(file_name, 'w') as file_handle:
+            file_handle.write('1.0 /muse/batt iiii 95 3900 3800 30\n')
+            file_handle.write('2.0 /muse/batt iiii 95 not-a-number 3800 30\n')
+        pool = multiprocessing.Pool(1, input_handler.init_range_worker)
+        try:
+            for reader_pool in [None, pool]:
+                reader = input_handler.oscFileReader(capacity=0)
+                if reader_pool is not None:
+                    reader.set_pool(reader_pool, 2)
+                with open(file_name, 'rb') as file_handle:
+                    reader.read_file(file_handle)
+                self.assertEqual('done', read_events(reader)[-1][1])
+                self.assertIsInstance(reader.error, ValueError)
+        finally:
+            pool.close()
+            pool.join()
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
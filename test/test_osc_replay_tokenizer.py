@@ -0,0 +1,44 @@
+import shlex
+import unittest
+
+import input_handler
+from osc_replay_tokenizer import split_line, parse_numeric
+
+
+class SplitLineTest(unittest.TestCase):
+    def test_tokens_match_shlex(self):
+        lines = ["1417552788.637914 /muse/eeg ffff  394.795288 320.771179 157.918106 809.330322\n",
+                 "1417552788.793804 /muse/version s '{\"build_number\":44, \"type\":\"Consumer\"}'\n",
+                 "1 /muse/annotation s \"say \\\"hi\\\"\" back\\ slash\n",
+                 "a'b c'd '' \t end  \r\n"]
+        for line in lines:
+            self.assertEqual(shlex.split(line.strip()), split_line(line))
+
+    def test_unclosed_quote_is_an_error(self):
+        self.assertRaises(ValueError, split_line, "1 /muse/annotation s 'open\n")
+
+
+class ParseNumericTest(unittest.TestCase):
+    def test_numeric_values(self):
+        self.assertEqual([1.5, 2.0], parse_numeric('fd', ['1.5', '2']))
+        self.assertEqual([16, 2.5], parse_numeric('if', ['16', '2.5']))
+
+    def test_other_messages_need_the_general_parser(self):
+        self.assertEqual(None, parse_numeric('s', ["'x'"]))
+        self.assertEqual(None, parse_numeric('f', ['1.0', 'f', '2.0']))
+
+
+class ParseLineTest(unittest.TestCase):
+    def test_lines(self):
+        reader = input_handler.oscFileReader()
+        self.assertEqual([1.5, '/muse/eeg/quantization', 'iiii', [16, 16, 8, 16], 0],
+                         reader.parse_line('1.500000 /muse/eeg/quantization iiii  16 16 8 16\n'))
+        self.assertEqual([2.0, '/muse/config', 's', ['{"preset":"14"}'], 0],
+                         reader.parse_line('2.000000 /muse/config s \'{"preset":"14"}\'\n'))
+        self.assertEqual([3.0, '/muse/acc', 'fff', [1.0, 2.0, 3.0], 0],
+                         reader.parse_line('3.0 /muse/acc f 1.0 ff 2.0 3.0\n'))
+        self.assertEqual([], reader.parse_line('\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import time
+import unittest
+import Queue
+
+import input_handler
+import output_handler
+import osc_transport
+
+
+class OSCTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.receiver = osc_transport.OSCTransport()
+        self.sender = osc_transport.OSCTransport()
+        self.queue = Queue.Queue()
+        self.listener = input_handler.OSCListener(self.queue, 'udp:0', batch=False, transport=self.receiver)
+
+    def tearDown(self):
+        self.receiver.close()
+        self.sender.close()
+
+    def listen(self, protocol):
+        server = self.receiver.listen(protocol, 0, self.listener.receive_packet)
+        return server.socket.getsockname()[1]
+
+    def receive(self, count, timeout=5.0):
+        give_up_at = time.time() + timeout
+        while self.queue.qsize() < count and time.time() < give_up_at:
+            self.receiver.poll(0.01)
+            self.sender.poll(0)
+        return [self.queue.get() for _ in range(self.queue.qsize())]
+
+    def send_and_receive(self, protocol, bundle_window=None):
+        port = self.listen(protocol)
+        writer = output_handler.OSCMessageWriter('osc.%s://localhost:%d' % (protocol, port), bundle_window, self.sender)
+        writer.set_options(False, None)
+        events = [[1400000000.0 + i, '/muse/eeg', 'ffff', [float(i), 2.0, 3.0, 4.0], 0] for i in range(50)]
+        events.append([1400000000.0, '/muse/elements/note', 's', ['hello'], 0])
+        for event in events:
+            writer.receive_msg(event)
+        writer.receive_msg([1400000100.0, 'done'])
+        received = self.receive(len(events))
+        self.assertEqual([(event[1], event[2], event[3]) for event in events],
+                         [(msg[1], msg[2], msg[3]) for msg in received])
+        return events, received
+
+    def test_udp(self):
+        self.send_and_receive('udp')
+
+    def test_length_prefixed_tcp(self):
+        self.send_and_receive('tcp')
+
+    def test_slip_tcp(self):
+        self.send_and_receive('slip')
+
+    def test_bundle_timetags_become_timestamps(self):
+        events, received = self.send_and_receive('udp', bundle_window=0.0)
+        self.assertEqual([event[0] for event in events], [msg[0] for msg in received])
+
+    def test_sources_are_tagged(self):
+        for port in (0, 0):
+            server = self.receiver.listen('udp', port, self.listener.receive_packet, port)
+        client = self.sender.address('osc.udp://localhost:%d' % server.socket.getsockname()[1])
+        self.sender.send(client, self.sender.message('/muse/eeg', 'f', [1.0]))
+        self.assertEqual('/source0/muse/eeg', self.receive(1)[0][1])
+
+    def test_unreachable_tcp_receiver_fails_the_send(self):
+        port = self.listen('tcp')
+        self.receiver.close()
+        client = self.sender.address('osc.tcp://localhost:%d' % port)
+        self.sender.send(client, 'packet')
+        self.sender.flush(1.0)
+        self.assertRaises(IOError, self.sender.send, client, 'packet')
+
+    def test_malformed_packets_are_counted(self):
+        self.listener.receive_packet('/a\0\0,f\0\0', None)
+        self.assertEqual(1, self.listener.malformed_packets)
+
+
+class ParseURLTest(unittest.TestCase):
+    def test_parse_url(self):
+        self.assertEqual(('udp', 'localhost', 5001), osc_transport.parse_url('osc.udp://localhost:5001'))
+        self.assertEqual(('slip', '10.0.0.2', 7000), osc_transport.parse_url('osc.slip://10.0.0.2:7000/'))
+        self.assertRaises(ValueError, osc_transport.parse_url, 'http://localhost:80')
+
+
+if __name__ == '__main__':
+    unittest.main()
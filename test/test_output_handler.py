@@ -0,0 +1,331 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+
+import event_batch
+import osc_packet
+import output_handler
+import path_filter
+import path_router
+
+
+class RecordingListener(output_handler.OutputHandler):
+    def __init__(self):
+        self.received = []
+
+    def receive_msg(self, msg):
+        self.received.append(msg)
+
+
+class FilteredListener(RecordingListener):
+    def set_options(self, verbose, filters):
+        self.options = (verbose, filters)
+
+
+class BatchListener(RecordingListener):
+    def __init__(self):
+        RecordingListener.__init__(self)
+        self.batches = []
+
+    def receive_batch(self, batch):
+        self.batches.append(batch)
+
+
+class OutputHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = output_handler.OutputHandler(mock.MagicMock())
+        self.events = [[1.0, '/muse/eeg', 'ff', [1.0, 2.0], 0],
+                       [2.0, '/muse/acc', 'fff', [1.0, 2.0, 3.0], 0]]
+
+    def test_broadcast_message_sends_single_message(self):
+        listener = RecordingListener()
+        self.handler.add_listener(listener)
+        self.handler.broadcast_message(self.events[0])
+        self.assertEqual([self.events[0]], listener.received)
+
+    def test_broadcast_batch_falls_back_to_receive_msg(self):
+        listener = RecordingListener()
+        self.handler.add_listener(listener)
+        self.handler.broadcast_message(event_batch.EventBatch.from_events(self.events))
+        self.assertEqual(self.events, listener.received)
+
+    def test_broadcast_batch_uses_receive_batch(self):
+        listener = BatchListener()
+        self.handler.add_listener(listener)
+        batch = event_batch.EventBatch.from_events(self.events)
+        self.handler.broadcast_message(batch)
+        self.assertEqual([batch], listener.batches)
+        self.assertEqual([], listener.received)
+
+
+class WriterBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.events = [[1.0, '/muse/eeg', 'ffff', [800.5, 801.0, 802.25, 803.0], 0],
+                       [1.5, '/muse/batt', 'iiii', [95, 3900, 3800, 30], 0],
+                       [2.0, '/muse/eeg', 'ffff', [810.5, 811.0, 812.25, 813.0], 0],
+                       [2.5, '/muse/annotation', 'sssss', ['start', 'Plain String', '', '', ''], 0]]
+
+    def assertBatchMatchesMessages(self, writer_class, filters=None):
+        written = []
+        for receive in ('msg', 'batch'):
+            writer = writer_class.__new__(writer_class)
+            writer.file_handle = mock.MagicMock()
+            setattr(writer, '_%s__done_status' % writer_class.__name__, False)
+            writer.set_options(False, filters)
+            if receive == 'msg':
+                for msg in self.events:
+                    writer.receive_msg(list(msg))
+            else:
+                writer.receive_batch(event_batch.EventBatch.from_events(self.events))
+            written.append("".join(call[0][0] for call in writer.file_handle.write.call_args_list))
+        self.assertEqual(written[0], written[1])
+
+    def test_csv_batch_matches_messages(self):
+        self.assertBatchMatchesMessages(output_handler.CSVFileWriter)
+
+    def test_csv_batch_applies_filter(self):
+        self.assertBatchMatchesMessages(output_handler.CSVFileWriter, ['batt'])
+
+    def test_oscreplay_batch_matches_messages(self):
+        self.assertBatchMatchesMessages(output_handler.OSCFileWriter)
+
+
+class CSVWideFileWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'out.csv')
+        self.events = [[1.0, '/muse/eeg', 'ffff', [857.0347290039062, 801.0, 802.25, 803.0], 0],
+                       [1.5, '/muse/batt', 'iiii', [95, 3900, 3800, 30], 0],
+                       [2.0, '/muse/eeg', 'ffff', [810.5, 811.0, 812.25, 813.0], 0],
+                       [2.5, '/muse/annotation', 'ss', ['start, "now"', 'x'], 0],
+                       [3.0, '/muse/eeg', 'ffffff', [1.0, 2.0, 3.0, 4.0, 5.0, 6.0], 0]]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, batch, filters=None):
+        writer = output_handler.CSVWideFileWriter(self.file_name)
+        writer.set_options(False, filters)
+        if batch:
+            writer.receive_batch(event_batch.EventBatch.from_events(self.events))
+        else:
+            for msg in self.events:
+                writer.receive_msg(list(msg))
+        writer.receive_msg('done')
+        files = {}
+        for name in os.listdir(self.directory):
+            with open(os.path.join(self.directory, name)) as file_handle:
+                files[name] = file_handle.read()
+        shutil.rmtree(self.directory)
+        os.mkdir(self.directory)
+        return files
+
+    def test_one_file_per_path_with_a_column_per_channel(self):
+        files = self.write(False)
+        self.assertEqual(['out_muse_annotation.csv', 'out_muse_batt.csv', 'out_muse_eeg.csv', 'out_muse_eeg_6.csv'],
+                         sorted(files))
+        self.assertEqual("timestamp,eeg_0,eeg_1,eeg_2,eeg_3\n"
+                         "1.000000,857.034729004,801.0,802.25,803.0\n"
+                         "2.000000,810.5,811.0,812.25,813.0\n", files['out_muse_eeg.csv'])
+        self.assertEqual("timestamp,batt_0,batt_1,batt_2,batt_3\n1.500000,95,3900,3800,30\n", files['out_muse_batt.csv'])
+        self.assertEqual('timestamp,annotation_0,annotation_1\n2.500000,"start, ""now""","x"\n',
+                         files['out_muse_annotation.csv'])
+
+    def test_batch_matches_messages(self):
+        self.assertEqual(self.write(False), self.write(True))
+
+    def test_filters_apply_to_batches(self):
+        self.assertEqual(['out_muse_batt.csv'], sorted(self.write(True, ['batt'])))
+
+
+class PathRouterTest(unittest.TestCase):
+    def test_each_path_is_resolved_once(self):
+        resolve = mock.MagicMock(side_effect=lambda path: path.upper())
+        router = path_router.PathRouter(resolve)
+        self.assertEqual('/MUSE/EEG', router.route('/muse/eeg'))
+        self.assertEqual('/MUSE/EEG', router.route('/muse/eeg'))
+        self.assertEqual('/MUSE/ACC', router.route('/muse/acc'))
+        self.assertEqual(2, resolve.call_count)
+        self.assertEqual(2, len(router))
+
+    def test_matlab_routes(self):
+        route_path = output_handler.MatlabWriter.route_path
+        self.assertEqual((output_handler.MatlabWriter.RAW_DATA, (u'eeg', u'quantization_times', u'quantization')),
+                         route_path('/muse/eeg/quantization'))
+        self.assertEqual((output_handler.MatlabWriter.RAW_DATA, (u'battery', u'times', u'val')),
+                         route_path('/muse/batt'))
+        self.assertEqual((output_handler.MatlabWriter.CONFIG_DATA, None), route_path('/muse/config'))
+        self.assertEqual((output_handler.MatlabWriter.ANNOTATION, None), route_path('/muse/annotation'))
+        self.assertEqual((output_handler.MatlabWriter.ELEMENT, u'horseshoe'), route_path('/muse/elements/horseshoe'))
+        self.assertEqual((output_handler.MatlabWriter.ELEMENT, u'touching_forehead'),
+                         route_path('/muse/elements/touching-forehead'))
+        self.assertEqual((None, None), route_path('/muse/unknown'))
+
+
+class PathFilterTest(unittest.TestCase):
+    def test_filter_matches_any_pattern_anywhere_in_the_path(self):
+        filters = path_filter.compile_filter(['elements/alpha', 'eeg$'])
+        self.assertTrue(filters.matches('/muse/elements/alpha_absolute'))
+        self.assertTrue(filters.matches('/muse/eeg'))
+        self.assertFalse(filters.matches('/muse/eeg/quantization'))
+        self.assertFalse(filters.matches('/muse/acc'))
+
+    def test_no_patterns_match_nothing(self):
+        self.assertFalse(path_filter.compile_filter([]).matches('/muse/eeg'))
+        self.assertIsNone(path_filter.compile_filter(None))
+
+    def test_filters_are_shared_by_pattern_list(self):
+        self.assertIs(path_filter.compile_filter(['eeg', 'acc']), path_filter.compile_filter(('eeg', 'acc')))
+
+    def test_path_contains_filter_accepts_patterns_or_a_compiled_filter(self):
+        self.assertTrue(output_handler.OutputHandler.path_contains_filter(None, '/muse/eeg'))
+        self.assertTrue(output_handler.OutputHandler.path_contains_filter(['eeg'], '/muse/eeg'))
+        compiled = path_filter.compile_filter(['acc'])
+        self.assertFalse(output_handler.OutputHandler.path_contains_filter(compiled, '/muse/eeg'))
+
+    def test_start_filters_each_message_once_before_the_fan_out(self):
+        eeg = [1.0, '/muse/eeg', 'f', [1.0], 0]
+        alpha = [2.0, '/muse/elements/alpha_absolute', 'f', [0.5], 0]
+        queue = mock.MagicMock()
+        queue.get.side_effect = [event_batch.EventBatch.from_events([eeg, alpha]), eeg, [3.0, 'done']]
+        handler = output_handler.OutputHandler(queue)
+        default_listener = FilteredListener()
+        other_default_listener = FilteredListener()
+        raw_listener = FilteredListener()
+        own_filters_listener = FilteredListener()
+        own_filters_listener.applies_own_filters = True
+        handler.add_listener(default_listener)
+        handler.add_listener(other_default_listener)
+        handler.add_listener(raw_listener, ['/muse/eeg'])
+        handler.add_listener(own_filters_listener)
+        matches = path_filter.PathFilter.matches
+        with mock.patch.object(path_filter.PathFilter, 'matches', autospec=True, side_effect=matches) as verdicts:
+            handler.start(['/muse/elements'], False)
+        # two distinct filters: two columns of the batch and the single message, for each
+        self.assertEqual(6, verdicts.call_count)
+        self.assertEqual((False, None), default_listener.options)
+        self.assertEqual([alpha, [3.0, 'done']], default_listener.received)
+        self.assertEqual([alpha, [3.0, 'done']], other_default_listener.received)
+        self.assertEqual([eeg, eeg, [3.0, 'done']], raw_listener.received)
+        self.assertEqual((False, path_filter.compile_filter(['/muse/elements'])), own_filters_listener.options)
+        self.assertEqual([eeg, alpha, eeg, [3.0, 'done']], own_filters_listener.received)
+
+
+class OSCMessageWriterTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('output_handler.liblo')
+        self.liblo = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.liblo.Message.side_effect = lambda path, *args: ('message', path) + args
+        self.liblo.Bundle.side_effect = lambda timetag, *messages: ('bundle', timetag) + messages
+        self.liblo.Address.side_effect = lambda url: url
+        self.sent = []
+        self.sent_to = {}
+        self.failures = 0
+
+        def send(address, packet):
+            if self.failures:
+                self.failures -= 1
+                raise IOError("sending failed")
+            self.sent.append(packet)
+            self.sent_to.setdefault(address, []).append(packet)
+        self.liblo.send.side_effect = send
+        sleep = mock.patch('output_handler.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def writer(self, bundle_window=None, destinations='osc.udp://localhost:5001'):
+        writer = output_handler.OSCMessageWriter(destinations, bundle_window)
+        writer.set_options(False, None)
+        return writer
+
+    def test_messages_are_sent_one_by_one_without_a_bundle_window(self):
+        writer = self.writer()
+        writer.receive_msg([1.0, '/muse/eeg', 'ff', [1.0, 2.0], 0])
+        writer.receive_msg([1.1, '/muse/acc', 'f', [3.0], 0])
+        self.assertEqual([('message', '/muse/eeg', 1.0, 2.0), ('message', '/muse/acc', 3.0)], self.sent)
+
+    def test_messages_within_the_window_are_bundled(self):
+        writer = self.writer(0.05)
+        writer.receive_msg([1.0, '/muse/eeg', 'f', [1.0], 0])
+        writer.receive_msg([1.04, '/muse/acc', 'f', [2.0], 0])
+        writer.receive_msg([1.1, '/muse/eeg', 'f', [3.0], 0])
+        writer.receive_msg([1.2, 'done'])
+        offset = osc_packet.TIMETAG_EPOCH_OFFSET
+        self.assertEqual([('bundle', 1.0 + offset, ('message', '/muse/eeg', 1.0), ('message', '/muse/acc', 2.0)),
+                          ('bundle', 1.1 + offset, ('message', '/muse/eeg', 3.0))], self.sent)
+
+    def test_bundles_stay_under_the_packet_size_limit(self):
+        writer = self.writer(1.0)
+        text = 'x' * 1000
+        for i in range(3):
+            writer.receive_msg([1.0, '/muse/annotation', 's', [text], 0])
+        writer.receive_msg([1.0, 'done'])
+        self.assertEqual([2, 1], [len(bundle) - 2 for bundle in self.sent])
+
+    def test_too_long_message_is_not_sent(self):
+        writer = self.writer()
+        writer.receive_msg([1.0, '/muse/annotation', 's', ['x' * 3000], 0])
+        self.assertEqual([], self.sent)
+
+    def test_failed_packets_are_retried_in_order(self):
+        writer = self.writer()
+        self.failures = 1
+        writer.receive_msg([1.0, '/muse/eeg', 'f', [1.0], 0])
+        writer.receive_msg([1.1, '/muse/eeg', 'f', [2.0], 0])
+        self.assertEqual([], self.sent)
+        writer.receive_msg([1.2, 'done'])
+        self.assertEqual([('message', '/muse/eeg', 1.0), ('message', '/muse/eeg', 2.0)], self.sent)
+        self.assertEqual(0, writer.packets_dropped)
+
+    def test_retry_queue_is_bounded(self):
+        writer = self.writer()
+        writer.destinations[0].QUEUE_CAPACITY = 2
+        self.failures = 1000
+        for i in range(5):
+            writer.receive_msg([float(i), '/muse/eeg', 'f', [float(i)], 0])
+        self.assertEqual(3, writer.packets_dropped)
+        self.failures = 0
+        writer.receive_msg([6.0, 'done'])
+        self.assertEqual([('message', '/muse/eeg', 3.0), ('message', '/muse/eeg', 4.0)], self.sent)
+
+    def test_destination_patterns_replace_the_output_filters(self):
+        self.assertEqual(('osc.udp://localhost:5001', None),
+                         output_handler.OSCMessageWriter.parse_destination('osc.udp://localhost:5001'))
+        self.assertEqual(('osc.tcp://localhost:5002', ['/muse/eeg', 'acc']),
+                         output_handler.OSCMessageWriter.parse_destination('osc.tcp://localhost:5002#/muse/eeg,acc'))
+
+    def test_each_destination_gets_the_messages_it_filters_for(self):
+        writer = self.writer(destinations=['osc.udp://localhost:5001', 'osc.tcp://localhost:5002#acc'])
+        writer.receive_msg([1.0, '/muse/eeg', 'f', [1.0], 0])
+        writer.receive_msg([1.1, '/muse/acc', 'f', [2.0], 0])
+        writer.receive_msg([1.2, 'done'])
+        self.assertEqual([('message', '/muse/eeg', 1.0), ('message', '/muse/acc', 2.0)],
+                         self.sent_to['osc.udp://localhost:5001'])
+        self.assertEqual([('message', '/muse/acc', 2.0)], self.sent_to['osc.tcp://localhost:5002'])
+        self.assertEqual(2, self.liblo.Message.call_count)
+
+    def test_slow_destination_does_not_hold_back_the_others(self):
+        release = threading.Event()
+        fast_sent = threading.Event()
+        send = self.liblo.send.side_effect
+
+        def slow_send(address, packet):
+            if address == 'osc.tcp://localhost:5002':
+                release.wait(5)
+            send(address, packet)
+            if len(self.sent_to.get('osc.udp://localhost:5001', [])) == 3:
+                fast_sent.set()
+        self.liblo.send.side_effect = slow_send
+        writer = self.writer(destinations=['osc.udp://localhost:5001', 'osc.tcp://localhost:5002'])
+        for i in range(3):
+            writer.receive_msg([float(i), '/muse/eeg', 'f', [float(i)], 0])
+        fast_sent.wait(5)
+        self.assertEqual(3, len(self.sent_to['osc.udp://localhost:5001']))
+        self.assertNotIn('osc.tcp://localhost:5002', self.sent_to)
+        release.set()
+        writer.receive_msg([3.0, 'done'])
+        self.assertEqual(3, len(self.sent_to['osc.tcp://localhost:5002']))
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import event_batch
+import output_handler
+import process_fanout
+import shared_ring
+
+
+class LineWriter(output_handler.OutputHandler):
+    "Writes the timestamp and path of every event to a file."
+    def __init__(self, path):
+        self.file_handle = open(path, 'w')
+        self.data_written = 0
+        self.filters = None
+
+    def set_options(self, verbose, filters):
+        self.filters = filters
+
+    def receive_msg(self, msg):
+        if "done" in msg:
+            self.file_handle.close()
+            return
+        if self.path_contains_filter(self.filters, msg[1]):
+            self.file_handle.write("%s %s\n" % (msg[0], msg[1]))
+            self.data_written += 1
+
+
+class SharedRingTest(unittest.TestCase):
+    def test_every_reader_gets_every_record_across_wraparound(self):
+        ring = shared_ring.SharedRing(2, capacity=64)
+        records = ['record %d ' % i + 'x' * (i % 7) for i in range(200)]
+        received = [[], []]
+
+        def read(reader):
+            for _ in records:
+                received[reader].append(ring.read(reader))
+        readers = [threading.Thread(target=read, args=[reader]) for reader in range(2)]
+        for thread in readers:
+            thread.start()
+        for record in records:
+            ring.write(record)
+        for thread in readers:
+            thread.join(5)
+        self.assertEqual([records, records], received)
+
+    def test_record_larger_than_the_ring_is_rejected(self):
+        ring = shared_ring.SharedRing(1, capacity=16)
+        self.assertRaises(ValueError, ring.write, 'x' * 16)
+
+    def test_detached_reader_is_not_waited_for(self):
+        ring = shared_ring.SharedRing(2, capacity=32)
+        ring.detach(1)
+        for i in range(5):
+            ring.write('0123456789')
+            self.assertEqual('0123456789', ring.read(0))
+
+
+class ProcessFanoutTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_lines(self, name):
+        with open(os.path.join(self.directory, name)) as file_handle:
+            return file_handle.read().splitlines()
+
+    def test_writers_get_all_events_with_their_own_filters(self):
+        fanout = process_fanout.ProcessFanout(capacity=256 * 1024)
+        fanout.add_writer('all', LineWriter, (os.path.join(self.directory, 'all.txt'),))
+        fanout.add_writer('acc', LineWriter, (os.path.join(self.directory, 'acc.txt'),), ['acc'])
+        fanout.start_writers(False, None)
+
+        events = []
+        for i in range(3000):
+            events.append([float(i), '/muse/eeg' if i % 3 else '/muse/acc', 'f', [1.0], 0])
+        for event in events[:1000]:
+            fanout.receive_msg(event)
+        fanout.receive_batch(event_batch.EventBatch.from_events(events[1000:]))
+        fanout.receive_msg([3000.0, 'done'])
+
+        self.assertEqual(["%s %s" % (event[0], event[1]) for event in events], self.read_lines('all.txt'))
+        self.assertEqual(["%s /muse/acc" % event[0] for event in events if event[1] == '/muse/acc'],
+                         self.read_lines('acc.txt'))
+        self.assertEqual({'all': {'data_written': 3000}, 'acc': {'data_written': 1000}}, fanout.results)
+
+
+if __name__ == '__main__':
+    unittest.main()
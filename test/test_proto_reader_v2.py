@@ -0,0 +1,95 @@
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import unittest
+
+import proto_reader_v2
+from event_batch import EventBatch
+from muse_chunk_scanner import MuseChunkScanner
+from google.protobuf.message import DecodeError
+from Muse_v2 import MuseDataCollection, MuseData, EEG, Battery
+
+
+def write_recording(file_name, chunks):
+    with open(file_name, 'wb') as file_handle:
+        for chunk in range(chunks):
+            collection = MuseDataCollection()
+            for sample in range(3):
+                muse_data = collection.collection.add()
+                muse_data.timestamp = 100.0 + chunk + sample * 0.25
+                muse_data.datatype = MuseData.EEG
+                muse_data.Extensions[EEG.museData].values.extend([1.0, 2.0, 3.0, float(sample)])
+            muse_data = collection.collection.add()
+            muse_data.timestamp = 100.5 + chunk
+            muse_data.datatype = MuseData.BATTERY
+            muse_data.Extensions[Battery.museData].percent_remaining = 90
+            data_bytes = collection.SerializeToString()
+            file_handle.write(struct.pack("<ih", len(data_bytes), 2))
+            file_handle.write(data_bytes)
+
+
+def drain(reader):
+    events = []
+    while not reader.events_queue.empty():
+        item = reader.events_queue.get()
+        if isinstance(item, EventBatch):
+            events.extend(item)
+        else:
+            events.append(item)
+    return events
+
+
+class MuseProtoBufReaderV2PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'test.muse')
+        write_recording(self.file_name, 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def parse(self, batch, pool=None):
+        reader = proto_reader_v2.MuseProtoBufReaderV2(False, 0, batch)
+        if pool is not None:
+            reader.set_pool(pool, 2)
+        with open(self.file_name, 'rb') as in_stream:
+            reader.parse(in_stream)
+        return drain(reader)
+
+    def test_worker_decoder_results_can_be_pickled(self):
+        decoder = proto_reader_v2.WorkerDecoder(False, None, None)
+        with open(self.file_name, 'rb') as in_stream:
+            payload = str(next(iter(MuseChunkScanner(in_stream))).payload)
+        events = pickle.loads(pickle.dumps(decoder.decode(payload)))
+        self.assertEqual(4, len(events))
+        self.assertEqual([100.0, '/muse/eeg', 'ffff', [1.0, 2.0, 3.0, 0.0], 0], events[0])
+
+    def test_pool_decoding_matches_thread_decoding(self):
+        pool = proto_reader_v2.create_pool(1)
+        try:
+            for batch in [False, True]:
+                self.assertEqual(self.parse(batch), self.parse(batch, pool))
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_corrupt_chunk_ends_the_events_with_done(self):
+        with open(self.file_name, 'ab') as file_handle:
+            file_handle.write(struct.pack("<ih", 20, 2) + '\xff' * 20)
+        pool = proto_reader_v2.create_pool(1)
+        try:
+            for batch_pool in [None, pool]:
+                reader = proto_reader_v2.MuseProtoBufReaderV2(False, 0, False)
+                if batch_pool is not None:
+                    reader.set_pool(batch_pool, 2)
+                with open(self.file_name, 'rb') as in_stream:
+                    reader.parse(in_stream)
+                events = drain(reader)
+                self.assertEqual(21, len(events))
+                self.assertEqual('done', events[-1][1])
+                self.assertIsInstance(reader.error, DecodeError)
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,51 @@
+import os
+import unittest
+
+import source_splitter
+
+
+class RecordingWriter(object):
+    def __init__(self, file_name, suffix=''):
+        self.file_name = file_name + suffix
+        self.messages = []
+        self.data_written = 0
+        self.filters = None
+
+    def set_options(self, verbose, filters):
+        self.filters = filters
+
+    def receive_msg(self, msg):
+        self.messages.append(msg)
+        if "done" not in msg:
+            self.data_written += 1
+
+
+class SourceSplitterTest(unittest.TestCase):
+    def test_split_source(self):
+        self.assertEqual(('5001', '/muse/eeg'), source_splitter.split_source('/source5001/muse/eeg'))
+        self.assertEqual((None, '/muse/eeg'), source_splitter.split_source('/muse/eeg'))
+        self.assertEqual('/source5001/muse/eeg', source_splitter.source_path(5001, '/muse/eeg'))
+
+    def test_source_file_name(self):
+        self.assertEqual(os.path.join('out', 'rec_5001.csv'),
+                         source_splitter.source_file_name(os.path.join('out', 'rec.csv'), 5001))
+
+    def test_each_source_gets_its_own_writer(self):
+        splitter = source_splitter.SourceSplitter(RecordingWriter, 'rec.csv', '!')
+        splitter.set_options(False, ['eeg'])
+        splitter.receive_msg([1.0, '/source5000/muse/eeg', 'f', [1.0], 0])
+        splitter.receive_msg([1.1, '/source5001/muse/eeg', 'f', [2.0], 0])
+        splitter.receive_msg([1.2, '/source5000/muse/acc', 'f', [3.0], 0])
+        splitter.receive_msg([1.3, 'done'])
+
+        self.assertEqual(['5000', '5001'], sorted(splitter.writers))
+        writer = splitter.writers['5000']
+        self.assertEqual('rec_5000.csv!', writer.file_name)
+        self.assertEqual(['eeg'], writer.filters)
+        self.assertEqual([[1.0, '/muse/eeg', 'f', [1.0], 0], [1.2, '/muse/acc', 'f', [3.0], 0], [1.3, 'done']],
+                         writer.messages)
+        self.assertEqual(3, splitter.data_written)
+
+
+if __name__ == '__main__':
+    unittest.main()